@@ -1,14 +1,38 @@
 import os
 import json
+import threading
+import time
 import uuid
-import csv
-import io
+import click
 from datetime import datetime
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, send_file, stream_with_context
 from flask_cors import CORS
+from sqlalchemy import func, select
 from config import Config, IS_VERCEL
-from models import db, UploadedFile, Intent
-from logger import logger
+from engines import install_engine_events
+from models import db, UploadedFile, Intent, StepItem, INTENT_STEP_TYPES, ITEM_FILTERS, REVIEW_PENDING
+from logger import logger, SAMPLED
+from counters import reconcile_counters
+from revisions import UPLOAD_MODES
+from changes import head_seq, change_feed, prune_changes
+from claims import ReviewConflict, claim_intents, release_claims, review_with_version
+from migrations import run_migrations, schema_is_current
+from pagination import COUNT_MODES, keyset_page, page_count, windowed_page
+from reviews import BATCH_ACTIONS, batch_update_items, batch_update_filter
+from exports import EXPORT_FORMATS, EXPORT_MIMETYPES, generate_export
+from export_cache import export_cache
+from snapshots import SNAPSHOT_MIMETYPES, SnapshotBusy, build_snapshot, load_manifest
+from jobs import job_runner, JobQueueFull
+from metrics import metrics
+from search import SEARCH_FILTERS, search_query
+from similarity import similar_intents, duplicate_clusters, build_index
+from stats import STAT_DIMENSIONS, review_statistics, grouped_statistics, rebuild_statistics
+from caching import PageCache, make_etag, request_params_key, not_modified, cached_json
+from serialization import (json_response, parse_fields, rows_to_dicts, negotiate_encoding,
+                           compress_response, compress_stream)
+from storage import DUPLICATE_POLICIES, save_upload, hash_stream, open_upload, find_duplicate, release_upload
+from tasks import (DELETE_MODES, import_upload, discard_import, run_upload_job, run_export_job, run_delete_job,
+                   run_snapshot_job, delete_file_now, soft_delete_file, purge_deleted_files, run_maintenance)
 
 # 创建Flask应用（纯API模式，前端单独部署）
 app = Flask(__name__)
@@ -19,17 +43,24 @@ CORS(app, resources={
     r"/*": {
         "origins": "*",
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
+        "expose_headers": ["ETag"]
     }
 })
 
+install_engine_events(Config.ENGINE_PROFILE)
 db.init_app(app)
+job_runner.init_app(app)
+metrics.init_app(app)
+
+# 已渲染的意图分页，键为 (file_id, 文件缓存状态, 查询参数)
+page_cache = PageCache(Config.PAGE_CACHE_SIZE)
 
 # 确保必要的目录存在（仅在非Vercel环境下）
 def ensure_directories():
     if IS_VERCEL:
         # Vercel环境下只确保/tmp目录存在
-        tmp_dirs = ['/tmp/uploads', '/tmp/logs']
+        tmp_dirs = ['/tmp/uploads', '/tmp/exports', '/tmp/logs']
         for d in tmp_dirs:
             if not os.path.exists(d):
                 try:
@@ -40,6 +71,7 @@ def ensure_directories():
     
     dirs = [
         Config.UPLOAD_FOLDER,
+        Config.EXPORT_FOLDER,
         os.path.dirname(Config.LOG_FILE),
         os.path.join(os.path.dirname(Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')))
     ]
@@ -48,6 +80,34 @@ def ensure_directories():
             os.makedirs(d)
             logger.info(f"创建目录: {d}")
 
+def get_active_file(file_id):
+    """返回可见的文件记录，已软删除或尚未导入完成的文件视为不存在"""
+    file = db.session.get(UploadedFile, file_id)
+    return file if file is not None and file.is_visible else None
+
+def file_cache_state(file):
+    """文件的缓存状态：版本号加创建时间，删除后重新上传复用同一ID时缓存不会命中旧内容"""
+    return (file.version, file.created_at.isoformat()) if file else None
+
+def expected_version(data):
+    """请求体中读取意图时的版本号，未提供时返回 None（不检查版本）"""
+    version = data.get('version')
+    return None if version in (None, '') else int(version)
+
+def similarity_params(values):
+    """请求中的相似度阈值（0~1）以及是否跨文件查找（scope=all），参数不合法时抛出 ValueError"""
+    threshold = float(values.get('threshold', Config.SIMILARITY_THRESHOLD))
+    if not 0 < threshold <= 1:
+        raise ValueError('threshold 应在 0 到 1 之间')
+    scope = values.get('scope', 'file')
+    if scope not in ('file', 'all'):
+        raise ValueError('scope 参数应为 file/all')
+    return threshold, scope == 'all'
+
+def wants_async():
+    """请求是否要求交给后台任务执行（async=1）"""
+    return request.values.get('async', '').lower() in ('1', 'true')
+
 # 步骤类型定义
 STEP_TYPES = [
     {'value': 'data_cleaning', 'label': '数据清洗'},
@@ -56,10 +116,15 @@ STEP_TYPES = [
     {'value': 'action_modeling', 'label': 'Action建模'},
     {'value': 'triple_creation', 'label': '三元组创建'}
 ]
+STEP_TYPES_ETAG = make_etag('step-types', STEP_TYPES)
 
 # 初始化数据库（在应用上下文中）
 def init_db():
     with app.app_context():
+        # 迁移已是最新时表结构必然完整，一次查询即可跳过 inspect 和迁移检查
+        if schema_is_current(db.engine):
+            logger.info("数据库结构已是最新，跳过初始化检查")
+            return
         try:
             # 使用 inspect 检查表是否已存在
             from sqlalchemy import inspect
@@ -74,11 +139,69 @@ def init_db():
         except Exception as e:
             logger.warning(f"数据库初始化检查: {e}")
             # 表可能已存在，忽略错误
+        
+        # 对已有数据库执行未完成的版本迁移（如补建索引）
+        try:
+            applied = run_migrations(db.engine)
+            if applied:
+                logger.info(f"数据库迁移完成: {applied}")
+        except Exception as e:
+            logger.error(f"数据库迁移失败: {e}")
+
+# 不访问数据库的接口，延迟初始化时不会触发数据库初始化
+DB_FREE_ENDPOINTS = {'serve', 'health_check', 'get_step_types', 'get_metrics'}
+_db_ready = False
+_db_init_lock = threading.Lock()
+_maintenance_pid = None
+_maintenance_lock = threading.Lock()
+
+def start_maintenance():
+    """清理上次进程退出时中断的任务和过期的导出文件，并启动任务心跳线程（之后定期重复清理）
+
+    每个进程只执行一次；fork 出的子进程会重新执行，启动自己的心跳线程。
+    """
+    global _maintenance_pid
+    if _maintenance_pid == os.getpid():
+        return
+    with _maintenance_lock:
+        if _maintenance_pid == os.getpid():
+            return
+        _maintenance_pid = os.getpid()
+    with app.app_context():
+        try:
+            run_maintenance()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"后台维护失败: {e}")
+    job_runner.start_heartbeat(Config.JOB_HEARTBEAT_SECONDS, run_maintenance)
+
+def ensure_db():
+    """初始化目录和数据库，每个进程只执行一次"""
+    global _db_ready
+    if _db_ready:
+        return
+    with _db_init_lock:
+        if not _db_ready:
+            ensure_directories()
+            init_db()
+            start_maintenance()
+            _db_ready = True
 
-# Vercel环境下需要在模块加载时初始化
-if IS_VERCEL:
-    ensure_directories()
-    init_db()
+@app.before_request
+def lazy_init_db():
+    """延迟初始化模式下，在第一个需要数据库的请求前初始化
+
+    不经过 ensure_db 的部署（如 gunicorn 直接加载 app）也在第一个需要数据库的请求前启动后台维护。
+    """
+    if request.endpoint in DB_FREE_ENDPOINTS:
+        return
+    if Config.LAZY_DB_INIT:
+        ensure_db()
+    start_maintenance()
+
+# Vercel环境下未开启延迟初始化时，在模块加载时初始化
+if IS_VERCEL and not Config.LAZY_DB_INIT:
+    ensure_db()
 
 @app.route('/')
 def serve():
@@ -95,15 +218,29 @@ def health_check():
     """健康检查接口"""
     return jsonify({'status': 'ok', 'is_vercel': IS_VERCEL})
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 文本格式的请求与SQL指标"""
+    return metrics.response()
+
 @app.route('/api/step-types', methods=['GET'])
 def get_step_types():
     """获取所有步骤类型"""
-    logger.info("获取步骤类型列表")
-    return jsonify({'success': True, 'data': STEP_TYPES})
+    cached = not_modified(STEP_TYPES_ETAG)
+    if cached is not None:
+        return cached
+    logger.info("获取步骤类型列表", extra=SAMPLED)
+    response = jsonify({'success': True, 'data': STEP_TYPES})
+    response.set_etag(STEP_TYPES_ETAG)
+    return response
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    """上传JSON文件"""
+    """上传JSON文件
+
+    mode=merge 时与同一 source_file 的上一版本比对：内容未变的意图沿用已有的核对结果，
+    新增和内容变化的意图为待核对，响应中的 diff 为比对结果。
+    """
     try:
         if 'file' not in request.files:
             logger.warning("上传请求中没有文件")
@@ -120,72 +257,109 @@ def upload_file():
             logger.warning(f"上传的文件格式不正确: {file.filename}")
             return jsonify({'success': False, 'message': '请上传JSON文件'}), 400
         
-        # 读取并解析JSON
-        content = file.read().decode('utf-8')
-        data = json.loads(content)
+        on_duplicate = request.form.get('on_duplicate', Config.DUPLICATE_UPLOAD_POLICY)
+        if on_duplicate not in DUPLICATE_POLICIES:
+            return jsonify({'success': False, 'message': f'on_duplicate 参数应为 {"/".join(DUPLICATE_POLICIES)}'}), 400
+        upload_mode = request.form.get('mode', 'new')
+        if upload_mode not in UPLOAD_MODES:
+            return jsonify({'success': False, 'message': f'mode 参数应为 {"/".join(UPLOAD_MODES)}'}), 400
+        merge = upload_mode == 'merge'
         
-        logger.info(f"成功解析JSON文件: {file.filename}")
-        
-        # 生成唯一文件名
-        unique_filename = f"{uuid.uuid4().hex}_{file.filename}"
-        file_path = os.path.join(Config.UPLOAD_FOLDER, unique_filename)
-        
-        # 保存原始文件（在Vercel环境下保存到/tmp）
+        # 按内容哈希压缩保存原始字节，不再解析后重新序列化（在Vercel环境下保存到/tmp）
+        saved = False
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            stored_filename, content_hash, size = save_upload(file.stream, Config.INGEST_CHUNK_SIZE)
+            saved = True
         except Exception as e:
             logger.warning(f"无法保存文件到磁盘: {e}")
+            file.stream.seek(0)
+            stored_filename = f"{uuid.uuid4().hex}_{file.filename}"
+            content_hash = hash_stream(file.stream, Config.INGEST_CHUNK_SIZE)
         
-        # 提取metadata
-        metadata = data.get('metadata', {})
-        source_file = metadata.get('source_file', file.filename)
+        # 内容完全相同的文件已导入过时，不再解析和写入意图
+        duplicate = find_duplicate(content_hash)
+        if duplicate:
+            logger.info(f"检测到重复上传: {file.filename}, 与文件 {duplicate.id} 内容相同")
+            if on_duplicate == 'link':
+                return jsonify({
+                    'success': True,
+                    'message': f'文件内容与已上传的文件相同，已关联到文件 {duplicate.id}',
+                    'data': duplicate.to_dict(),
+                    'duplicate': True
+                })
+            return jsonify({
+                'success': False,
+                'message': f'文件内容与已上传的文件「{duplicate.original_filename}」（ID {duplicate.id}）相同',
+                'data': duplicate.to_dict(),
+                'duplicate': True
+            }), 409
         
-        # 创建文件记录
+        # 创建文件记录，source_file 在解析到metadata后再更新
         uploaded_file = UploadedFile(
-            filename=unique_filename,
+            filename=stored_filename,
             original_filename=file.filename,
             step_type=step_type,
-            source_file=source_file,
+            source_file=file.filename,
+            content_hash=content_hash,
+            item_table='intents' if step_type in INTENT_STEP_TYPES else 'step_items',
             total_items=0,
-            reviewed_items=0
+            reviewed_items=0,
+            importing=True
         )
+        # 文件记录先以导入中状态提交（不可见），之后条目分批提交
         db.session.add(uploaded_file)
-        db.session.flush()  # 获取ID
-        
-        # 解析意图数据
-        intent_count = 0
-        for key, value in data.items():
-            if key != 'metadata' and isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict) and 'id' in item:
-                        intent = Intent(
-                            file_id=uploaded_file.id,
-                            intent_id=item.get('id', ''),
-                            stage=key,
-                            category=item.get('category', ''),
-                            original_comment=item.get('original_comment', ''),
-                            judgement=item.get('judgement', ''),
-                            judged_by=item.get('judged_by', ''),
-                            modified_content=item.get('modified_content', ''),
-                            review_status='待核对'
-                        )
-                        db.session.add(intent)
-                        intent_count += 1
-        
-        uploaded_file.total_items = intent_count
         db.session.commit()
         
-        logger.info(f"文件上传成功: {file.filename}, 共 {intent_count} 条意图")
+        # 文件已保存时可交给后台任务解析，立即返回任务ID
+        if saved and wants_async():
+            file_data = uploaded_file.to_dict()
+            try:
+                job_id = job_runner.submit('upload', run_upload_job, uploaded_file.id, size, merge,
+                                           file_id=uploaded_file.id)
+            except JobQueueFull as e:
+                db.session.delete(uploaded_file)
+                db.session.commit()
+                release_upload(stored_filename)
+                return jsonify({'success': False, 'message': str(e)}), 429
+            logger.info(f"文件已保存，后台解析中: {file.filename}, job={job_id}")
+            return jsonify({
+                'success': True,
+                'message': '文件已上传，正在后台导入',
+                'data': {'job_id': job_id, 'file': file_data}
+            }), 202
+        
+        # 流式解析意图（或其他步骤的条目）并分批写入；磁盘不可写时直接解析上传流
+        source = open_upload(stored_filename) if saved else file.stream
+        unit = '条' if uploaded_file.stores_items else '条意图'
+        try:
+            item_count, diff = import_upload(uploaded_file, source, merge=merge)
+        except Exception:
+            if saved:
+                source.close()
+            discard_import(uploaded_file.id)
+            if saved:
+                release_upload(stored_filename)
+            raise
+        if saved:
+            source.close()
+        
+        logger.info(f"成功解析JSON文件: {file.filename}")
         
+        logger.info(f"文件上传成功: {file.filename}, 共 {item_count} {unit}")
+        
+        message = f'文件上传成功，共导入 {item_count} {unit}'
+        if diff:
+            message += f"，其中 {diff['carried_over']} 条沿用了上一版本的核对结果"
         return jsonify({
             'success': True,
-            'message': f'文件上传成功，共导入 {intent_count} 条意图',
-            'data': uploaded_file.to_dict()
+            'message': message,
+            'data': uploaded_file.to_dict(),
+            'diff': diff
         })
         
     except json.JSONDecodeError as e:
         logger.error(f"JSON解析错误: {str(e)}")
+        db.session.rollback()
         return jsonify({'success': False, 'message': f'JSON格式错误: {str(e)}'}), 400
     except Exception as e:
         logger.error(f"文件上传失败: {str(e)}")
@@ -197,78 +371,309 @@ def get_files():
     """获取所有上传的文件列表"""
     try:
         step_type = request.args.get('step_type')
-        query = UploadedFile.query
+        query = UploadedFile.query.filter(UploadedFile.visible())
         
         if step_type:
             query = query.filter_by(step_type=step_type)
         
+        # 文件数量、最大ID、最新创建时间和版本号之和任一变化都说明列表有变化；
+        # SQLite 会复用被删除的最大ID，删除最新的文件后再上传时由创建时间区分
+        state = query.with_entities(
+            func.count(UploadedFile.id), func.max(UploadedFile.id), func.max(UploadedFile.created_at),
+            func.sum(UploadedFile.version)
+        ).one()
+        etag = make_etag('files', step_type, *state)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        
         files = query.order_by(UploadedFile.created_at.desc()).all()
-        logger.info(f"获取文件列表，共 {len(files)} 个文件")
+        logger.info("获取文件列表，共 %d 个文件", len(files), extra=SAMPLED)
         
-        return jsonify({
+        response = json_response({
             'success': True,
             'data': [f.to_dict() for f in files]
         })
+        response.set_etag(etag)
+        return compress_response(response)
     except Exception as e:
         logger.error(f"获取文件列表失败: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/files/<int:file_id>', methods=['DELETE'])
 def delete_file(file_id):
-    """删除上传的文件"""
+    """删除上传的文件
+
+    mode=hard（默认）在请求中用批量 DELETE 删除；mode=soft（或 async=1）立即隐藏文件，
+    由后台任务分块清理数据和上传文件，返回202和任务ID。
+    """
     try:
-        file = UploadedFile.query.get(file_id)
+        file = get_active_file(file_id)
         if not file:
             return jsonify({'success': False, 'message': '文件不存在'}), 404
         
-        # 删除物理文件
-        file_path = os.path.join(Config.UPLOAD_FOLDER, file.filename)
-        if os.path.exists(file_path):
+        mode = request.args.get('mode', 'soft' if wants_async() else 'hard')
+        if mode not in DELETE_MODES:
+            return jsonify({'success': False, 'message': f'mode 参数应为 {"/".join(DELETE_MODES)}'}), 400
+        filename, original_filename = file.filename, file.original_filename
+        
+        if mode == 'soft':
+            soft_delete_file(file)
+            db.session.commit()
             try:
-                os.remove(file_path)
-            except Exception as e:
-                logger.warning(f"无法删除文件: {e}")
+                job_id = job_runner.submit('delete', run_delete_job, file_id, file_id=file_id)
+            except JobQueueFull:
+                # 文件已隐藏，可稍后运行 flask --app app purge-deleted-files 清理
+                logger.warning(f"后台任务已满，文件 {file_id} 暂未清理")
+                job_id = None
+            logger.info(f"软删除文件: {original_filename}, job={job_id}")
+            return jsonify({'success': True, 'message': '已删除，正在后台清理', 'data': {'job_id': job_id}}), 202
         
-        db.session.delete(file)
+        deleted = delete_file_now(file_id)
         db.session.commit()
         
-        logger.info(f"删除文件成功: {file.original_filename}")
+        # 没有其他文件记录引用时删除物理文件
+        release_upload(filename)
+        export_cache.discard(file_id)
+        
+        logger.info(f"删除文件成功: {original_filename}, 共 {deleted} 条")
         return jsonify({'success': True, 'message': '删除成功'})
     except Exception as e:
         logger.error(f"删除文件失败: {str(e)}")
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/files/reconcile', methods=['POST'])
+def reconcile_files():
+    """重新统计所有文件的意图数量和已核对数量（用于修复计数）"""
+    try:
+        fixed = reconcile_counters()
+        logger.info(f"文件计数校正完成，修正 {fixed} 个文件")
+        return jsonify({'success': True, 'message': f'校正完成，修正 {fixed} 个文件', 'data': {'fixed': fixed}})
+    except Exception as e:
+        logger.error(f"文件计数校正失败: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/intents', methods=['GET'])
 def get_intents():
-    """获取意图列表（分页）"""
+    """获取意图列表（分页）
+
+    默认按 page/per_page 分页；传入 cursor 参数（首页可传空值）或 mode=cursor 时
+    使用基于ID的游标分页，深页与首页开销相同。count 参数控制总数获取方式：
+    exact（默认）、cached（使用文件记录的 total_items）、none（不统计）。
+    响应带有基于文件版本号的ETag，文件未变化时直接返回304或缓存的页面。
+    fields 参数（逗号分隔）只返回部分字段，列表视图可以不取大段文本列；
+    响应按 Accept-Encoding 压缩。
+    """
     try:
         file_id = request.args.get('file_id', type=int)
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
+        cursor = request.args.get('cursor')
+        count_mode = request.args.get('count', 'exact')
         
         if not file_id:
             return jsonify({'success': False, 'message': '请指定文件ID'}), 400
+        if count_mode not in COUNT_MODES:
+            return jsonify({'success': False, 'message': f'count 参数应为 {"/".join(COUNT_MODES)}'}), 400
+        try:
+            fields = parse_fields(request.args.get('fields'), Intent.FIELDS)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         
-        query = Intent.query.filter_by(file_id=file_id)
-        pagination = query.order_by(Intent.id).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # 只读取文件记录的版本号，未变化时不查询意图
+        file = db.session.get(UploadedFile, file_id)
+        if file is not None and not file.is_visible:
+            return jsonify({'success': False, 'message': '文件不存在'}), 404
+        cache_key = (file_id, file_cache_state(file), request_params_key())
+        etag = make_etag('intents', *cache_key)
+        cached = not_modified(etag)
+        if cached is None:
+            body = page_cache.get(cache_key)
+            cached = cached_json(body, etag) if body is not None else None
+        if cached is not None:
+            return compress_response(cached)
         
-        logger.info(f"获取意图列表: file_id={file_id}, page={page}, per_page={per_page}")
+        # 只查询需要的列，行元组直接转为字典，不构造ORM对象
+        query = db.session.query(*[getattr(Intent, field) for field in fields]).filter(Intent.file_id == file_id)
         
-        return jsonify({
+        if count_mode == 'exact':
+            total = query.order_by(None).count()
+        elif count_mode == 'cached':
+            total = file.total_items if file else 0
+        else:
+            total = None
+        
+        if cursor is not None or request.args.get('mode') == 'cursor':
+            try:
+                items, next_cursor, prev_cursor = keyset_page(query, Intent.id, cursor, max(per_page, 1))
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            
+            logger.info("获取意图列表(游标): file_id=%s, per_page=%s", file_id, per_page, extra=SAMPLED)
+            
+            data = {
+                'items': rows_to_dicts(items, fields),
+                'total': total,
+                'pages': page_count(total, per_page),
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor,
+                'per_page': per_page
+            }
+        else:
+            pagination = query.order_by(Intent.id).paginate(
+                page=page, per_page=per_page, error_out=False, count=False
+            )
+            
+            logger.info("获取意图列表: file_id=%s, page=%s, per_page=%s", file_id, page, per_page, extra=SAMPLED)
+            
+            data = {
+                'items': rows_to_dicts(pagination.items, fields),
+                'total': total,
+                'pages': page_count(total, per_page),
+                'current_page': page,
+                'per_page': per_page
+            }
+        
+        response = json_response({'success': True, 'data': data})
+        page_cache.set(cache_key, response.get_data())
+        response.set_etag(etag)
+        return compress_response(response)
+    except Exception as e:
+        logger.error(f"获取意图列表失败: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/items', methods=['GET'])
+def get_items():
+    """获取非意图步骤文件的通用条目列表（游标分页）
+
+    可按 stage/item_type/subject/predicate/object 筛选，count 参数同意图列表，默认为 cached。
+    """
+    try:
+        file_id = request.args.get('file_id', type=int)
+        per_page = request.args.get('per_page', 10, type=int)
+        cursor = request.args.get('cursor')
+        count_mode = request.args.get('count', 'cached')
+        
+        if not file_id:
+            return jsonify({'success': False, 'message': '请指定文件ID'}), 400
+        if count_mode not in COUNT_MODES:
+            return jsonify({'success': False, 'message': f'count 参数应为 {"/".join(COUNT_MODES)}'}), 400
+        
+        file = db.session.get(UploadedFile, file_id)
+        if file is not None and not file.is_visible:
+            return jsonify({'success': False, 'message': '文件不存在'}), 404
+        cache_key = ('items', file_id, file_cache_state(file), request_params_key())
+        etag = make_etag(*cache_key)
+        cached = not_modified(etag)
+        if cached is None:
+            body = page_cache.get(cache_key)
+            cached = cached_json(body, etag) if body is not None else None
+        if cached is not None:
+            return cached
+        
+        query = StepItem.query.filter_by(file_id=file_id)
+        filters = {field: request.args.get(field) for field in ITEM_FILTERS if request.args.get(field)}
+        for field, value in filters.items():
+            query = query.filter(getattr(StepItem, field) == value)
+        
+        if count_mode == 'exact':
+            total = query.order_by(None).count()
+        elif count_mode == 'cached' and not filters:
+            total = file.total_items if file else 0
+        else:
+            total = None
+        
+        try:
+            items, next_cursor, prev_cursor = keyset_page(query, StepItem.id, cursor, max(per_page, 1))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        logger.info("获取条目列表: file_id=%s, filters=%s", file_id, filters, extra=SAMPLED)
+        
+        response = jsonify({
             'success': True,
             'data': {
-                'items': [i.to_dict() for i in pagination.items],
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'current_page': page,
+                'items': [i.to_dict() for i in items],
+                'total': total,
+                'pages': page_count(total, per_page),
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor,
                 'per_page': per_page
             }
         })
+        page_cache.set(cache_key, response.get_data())
+        response.set_etag(etag)
+        return response
     except Exception as e:
-        logger.error(f"获取意图列表失败: {str(e)}")
+        logger.error(f"获取条目列表失败: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/items/<int:item_id>', methods=['GET'])
+def get_item(item_id):
+    """获取单条通用条目"""
+    try:
+        item = db.session.get(StepItem, item_id)
+        if not item:
+            return jsonify({'success': False, 'message': '条目不存在'}), 404
+        return jsonify({'success': True, 'data': item.to_dict()})
+    except Exception as e:
+        logger.error(f"获取条目详情失败: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/intents/search', methods=['GET'])
+def search_intents():
+    """按关键词搜索意图（原始内容和修改后内容），可组合 file_id/stage/category/judgement/review_status/judged_by 筛选
+
+    使用游标分页（cursor/per_page），count 参数默认为 none，需要总数时传 exact。
+    fields 参数与意图列表相同。不指定 file_id 搜索少于3个字符的关键词时，每次请求最多扫描
+    SEARCH_SCAN_ROWS 个意图ID，不足一页时也返回 next_cursor，继续翻页接着扫描。
+    """
+    try:
+        keyword = request.args.get('q', '')
+        per_page = request.args.get('per_page', 10, type=int)
+        cursor = request.args.get('cursor')
+        count_mode = request.args.get('count', 'none')
+        filters = {field: request.args.get(field) for field in SEARCH_FILTERS}
+        
+        if count_mode not in ('exact', 'none'):
+            return jsonify({'success': False, 'message': 'count 参数应为 exact/none'}), 400
+        if filters['file_id'] is not None:
+            filters['file_id'] = request.args.get('file_id', type=int)
+        try:
+            fields = parse_fields(request.args.get('fields'), Intent.FIELDS)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        query, key_column, span = search_query(keyword, filters)
+        total = query.order_by(None).count() if count_mode == 'exact' else None
+        query = query.with_entities(*[getattr(Intent, field) for field in fields])
+        try:
+            if span:
+                key_max = db.session.scalar(select(func.max(Intent.id)))
+                items, next_cursor, prev_cursor = windowed_page(query, key_column, cursor, max(per_page, 1),
+                                                                span, key_max, key_name='id')
+            else:
+                items, next_cursor, prev_cursor = keyset_page(query, key_column, cursor, max(per_page, 1),
+                                                              key_name='id')
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        logger.info("搜索意图: q=%s, filters=%s", keyword, {k: v for k, v in filters.items() if v}, extra=SAMPLED)
+        
+        return compress_response(json_response({
+            'success': True,
+            'data': {
+                'items': rows_to_dicts(items, fields),
+                'total': total,
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor,
+                'per_page': per_page
+            }
+        }))
+    except Exception as e:
+        logger.error(f"搜索意图失败: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/intents/<int:intent_id>', methods=['GET'])
@@ -279,7 +684,7 @@ def get_intent(intent_id):
         if not intent:
             return jsonify({'success': False, 'message': '意图不存在'}), 404
         
-        logger.info(f"获取意图详情: {intent_id}")
+        logger.info("获取意图详情: %s", intent_id, extra=SAMPLED)
         return jsonify({'success': True, 'data': intent.to_dict()})
     except Exception as e:
         logger.error(f"获取意图详情失败: {str(e)}")
@@ -287,29 +692,34 @@ def get_intent(intent_id):
 
 @app.route('/api/intents/<int:intent_id>/review', methods=['POST'])
 def review_intent(intent_id):
-    """核对意图"""
+    """核对意图
+
+    请求体可带 version（读取意图时的版本号），意图已被其他人修改或正被其他人领取时
+    返回409和当前的意图，不会静默覆盖。
+    """
     try:
-        intent = Intent.query.get(intent_id)
-        if not intent:
-            return jsonify({'success': False, 'message': '意图不存在'}), 404
-        
-        data = request.json
-        intent.judgement = data.get('judgement', '')
-        intent.judged_by = data.get('judged_by', 'user1')
-        intent.modified_content = data.get('modified_content', '')
-        intent.judge_date = datetime.now()
-        intent.review_status = '已核对'
+        data = request.get_json(silent=True) or {}
+        try:
+            version = expected_version(data)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'version 应为整数'}), 400
         
-        # 更新文件的已核对数量
-        file = intent.file
-        file.reviewed_items = Intent.query.filter_by(
-            file_id=file.id
-        ).filter(Intent.review_status != '待核对').count()
+        intent = review_with_version(intent_id, '已核对', {
+            'judgement': data.get('judgement', ''),
+            'modified_content': data.get('modified_content', ''),
+        }, data.get('judged_by', 'user1'), version)
+        if intent is None:
+            return jsonify({'success': False, 'message': '意图不存在'}), 404
         
         db.session.commit()
         
-        logger.info(f"意图核对成功: {intent_id}, judgement={intent.judgement}")
+        logger.info("意图核对成功: %s, judgement=%s", intent_id, intent.judgement)
         return jsonify({'success': True, 'message': '核对成功', 'data': intent.to_dict()})
+    except ReviewConflict as e:
+        current = e.intent.to_dict()
+        db.session.rollback()
+        logger.warning("意图核对冲突: %s, %s", intent_id, e)
+        return jsonify({'success': False, 'message': str(e), 'data': current}), 409
     except Exception as e:
         logger.error(f"意图核对失败: {str(e)}")
         db.session.rollback()
@@ -317,139 +727,606 @@ def review_intent(intent_id):
 
 @app.route('/api/intents/<int:intent_id>/pass', methods=['POST'])
 def pass_intent(intent_id):
-    """直接通过意图"""
+    """直接通过意图（可带 version，冲突处理与核对相同）"""
     try:
-        intent = Intent.query.get(intent_id)
-        if not intent:
-            return jsonify({'success': False, 'message': '意图不存在'}), 404
-        
-        intent.judgement = '通过'
-        intent.judged_by = request.json.get('judged_by', 'user1') if request.json else 'user1'
-        intent.judge_date = datetime.now()
-        intent.review_status = '直接通过'
+        data = request.get_json(silent=True) or {}
+        try:
+            version = expected_version(data)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'version 应为整数'}), 400
         
-        # 更新文件的已核对数量
-        file = intent.file
-        file.reviewed_items = Intent.query.filter_by(
-            file_id=file.id
-        ).filter(Intent.review_status != '待核对').count()
+        intent = review_with_version(intent_id, '直接通过', {'judgement': '通过'},
+                                     data.get('judged_by', 'user1'), version)
+        if intent is None:
+            return jsonify({'success': False, 'message': '意图不存在'}), 404
         
         db.session.commit()
         
-        logger.info(f"意图直接通过: {intent_id}")
+        logger.info("意图直接通过: %s", intent_id)
         return jsonify({'success': True, 'message': '已通过', 'data': intent.to_dict()})
+    except ReviewConflict as e:
+        current = e.intent.to_dict()
+        db.session.rollback()
+        logger.warning("意图直接通过冲突: %s, %s", intent_id, e)
+        return jsonify({'success': False, 'message': str(e), 'data': current}), 409
     except Exception as e:
         logger.error(f"意图直接通过失败: {str(e)}")
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/files/<int:file_id>/claim', methods=['POST'])
+def claim_file_intents(file_id):
+    """为核对人领取一批待核对的意图
+
+    请求体: {"reviewer": "...", "limit": 20, "lease_seconds": 600}
+    返回按ID排序的意图（包括本人仍在租约内的意图，会一并续期）。租约到期前
+    其他人领取不到这些意图，也不能核对它们；核对后领取自动释放。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        reviewer = (data.get('reviewer') or '').strip()
+        try:
+            limit = int(data.get('limit', 20))
+            lease_seconds = int(data.get('lease_seconds', Config.CLAIM_LEASE_SECONDS))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'limit 和 lease_seconds 应为整数'}), 400
+        
+        if not reviewer:
+            return jsonify({'success': False, 'message': '请指定核对人 reviewer'}), 400
+        if limit < 1 or lease_seconds < 1:
+            return jsonify({'success': False, 'message': 'limit 和 lease_seconds 应大于0'}), 400
+        file = get_active_file(file_id)
+        if not file:
+            return jsonify({'success': False, 'message': '文件不存在'}), 404
+        if file.stores_items:
+            return jsonify({'success': False, 'message': '该文件不是意图文件'}), 400
+        
+        intents = claim_intents(file_id, reviewer, min(limit, Config.CLAIM_MAX_BATCH), lease_seconds)
+        db.session.commit()
+        
+        logger.info("领取意图: file_id=%s, reviewer=%s, count=%s", file_id, reviewer, len(intents))
+        return jsonify({'success': True, 'data': {'items': [i.to_dict() for i in intents]}})
+    except Exception as e:
+        logger.error(f"领取意图失败: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/files/<int:file_id>/release', methods=['POST'])
+def release_file_intents(file_id):
+    """释放核对人领取的意图
+
+    请求体: {"reviewer": "...", "ids": [1, 2]}，不传 ids 时释放该核对人在文件中领取的全部意图。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        reviewer = (data.get('reviewer') or '').strip()
+        if not reviewer:
+            return jsonify({'success': False, 'message': '请指定核对人 reviewer'}), 400
+        try:
+            ids = [int(i) for i in data.get('ids') or []]
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'ids 应为整数列表'}), 400
+        
+        released = release_claims(file_id, reviewer, ids)
+        db.session.commit()
+        
+        logger.info("释放领取: file_id=%s, reviewer=%s, count=%s", file_id, reviewer, released)
+        return jsonify({'success': True, 'data': {'released': released}})
+    except Exception as e:
+        logger.error(f"释放领取失败: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/files/<int:file_id>/duplicates', methods=['GET'])
+def get_duplicate_clusters(file_id):
+    """文件中近似重复的意图簇
+
+    参数: threshold 相似度阈值（默认 SIMILARITY_THRESHOLD），scope=file 只在文件内查找，
+    scope=all 时簇中也包括其他文件里的相似意图；page/per_page 按簇分页，簇按大小从大到小排列。
+    """
+    try:
+        try:
+            threshold, across_files = similarity_params(request.args)
+            page = max(int(request.args.get('page', 1)), 1)
+            per_page = min(max(int(request.args.get('per_page', 20)), 1), 100)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'参数错误: {str(e)}'}), 400
+        file = get_active_file(file_id)
+        if not file:
+            return jsonify({'success': False, 'message': '文件不存在'}), 404
+        if file.stores_items:
+            return jsonify({'success': False, 'message': '该文件不是意图文件'}), 400
+        
+        clusters = duplicate_clusters(file_id, threshold, across_files, Config.SIMILARITY_MAX_BUCKET)
+        page_clusters = clusters[(page - 1) * per_page:page * per_page]
+        ids = [intent_id for members in page_clusters for intent_id in members]
+        found = {i.id: i.to_dict() for i in Intent.query.filter(Intent.id.in_(ids))} if ids else {}
+        
+        logger.info("获取近似重复意图: file_id=%s, clusters=%s", file_id, len(clusters), extra=SAMPLED)
+        return jsonify({
+            'success': True,
+            'data': {
+                'clusters': [
+                    {'size': len(members), 'items': [found[i] for i in members if i in found]}
+                    for members in page_clusters
+                ],
+                'total': len(clusters),
+                'duplicate_items': sum(len(members) for members in clusters),
+                'page': page,
+                'per_page': per_page,
+                'threshold': threshold
+            }
+        })
+    except Exception as e:
+        logger.error(f"获取近似重复意图失败: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/intents/<int:intent_id>/similar', methods=['GET'])
+def get_similar_intents(intent_id):
+    """与意图近似重复的意图（参数同 duplicates），按相似度从高到低排列，similarity 为相似度"""
+    try:
+        try:
+            threshold, across_files = similarity_params(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'参数错误: {str(e)}'}), 400
+        intent = db.session.get(Intent, intent_id)
+        if not intent or not get_active_file(intent.file_id):
+            return jsonify({'success': False, 'message': '意图不存在'}), 404
+        
+        scored = similar_intents(intent_id, threshold, None if across_files else intent.file_id)
+        found = {i.id: i for i in Intent.query.filter(Intent.id.in_([cid for cid, _ in scored]))} if scored else {}
+        items = [dict(found[cid].to_dict(), similarity=score) for cid, score in scored if cid in found]
+        
+        logger.info("获取相似意图: %s, count=%s", intent_id, len(items), extra=SAMPLED)
+        return jsonify({'success': True, 'data': {'items': items, 'threshold': threshold}})
+    except Exception as e:
+        logger.error(f"获取相似意图失败: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/intents/<int:intent_id>/similar/review', methods=['POST'])
+def review_similar_intents(intent_id):
+    """把同一个核对结果应用到意图及与它近似重复的全部意图上，在单个事务中完成
+
+    请求体: {"action": "review"|"pass", "judged_by": "...", "judgement": "...", "modified_content": "...",
+             "threshold": 0.6, "scope": "file"|"all", "include_reviewed": false}
+    默认只处理待核对的相似意图，不覆盖已有的核对结果；include_reviewed 为 true 时一并覆盖。
+    正被其他人领取的意图会跳过，ID 返回在 conflicts 中。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        action = data.get('action', 'review')
+        if action not in BATCH_ACTIONS:
+            return jsonify({'success': False, 'message': f'不支持的操作: {action}'}), 400
+        try:
+            threshold, across_files = similarity_params(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'message': f'参数错误: {str(e)}'}), 400
+        intent = db.session.get(Intent, intent_id)
+        if not intent or not get_active_file(intent.file_id):
+            return jsonify({'success': False, 'message': '意图不存在'}), 404
+        
+        ids = [cid for cid, _ in similar_intents(intent_id, threshold, None if across_files else intent.file_id,
+                                                 limit=None)]
+        if ids and not data.get('include_reviewed'):
+            ids = db.session.execute(
+                select(Intent.id).where(Intent.id.in_(ids), Intent.review_status == REVIEW_PENDING)
+            ).scalars().all()
+        item = {'judgement': data.get('judgement', ''), 'modified_content': data.get('modified_content', '')}
+        ids = [intent_id, *ids]
+        updated, conflicts = batch_update_items(action, [dict(item, id=i) for i in ids],
+                                                data.get('judged_by', 'user1'))
+        db.session.commit()
+        
+        logger.info("相似意图批量核对成功: %s, action=%s, updated=%s, conflicts=%s",
+                    intent_id, action, updated, len(conflicts))
+        message = f'已将核对结果应用到 {updated} 条意图'
+        if conflicts:
+            message += f'，{len(conflicts)} 条正被其他人核对，已跳过'
+        skipped = set(conflicts)
+        return jsonify({
+            'success': True,
+            'message': message,
+            'data': {'updated': updated, 'ids': sorted(i for i in ids if i not in skipped), 'conflicts': conflicts}
+        })
+    except Exception as e:
+        logger.error(f"相似意图批量核对失败: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/intents/batch', methods=['POST'])
+def batch_review_intents():
+    """批量核对/通过意图，一次请求在单个事务中完成
+
+    请求体: {"action": "review"|"pass", "judged_by": "...",
+             "items": [{"id": 1, "judgement": "...", "modified_content": "..."}]}
+    或按条件: {"action": "pass", "filter": {"file_id": 1, "stage": "...", "category": "Fact",
+             "review_status": "待核对"}}，review 时可附带统一的 judgement/modified_content。
+    按条件时默认只处理待核对的意图，"include_reviewed": true 时才覆盖已有的核对结果。
+    正被其他人领取（且未过期）的意图会跳过，ID 返回在 conflicts 中。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        action = data.get('action', 'review')
+        judged_by = data.get('judged_by', 'user1')
+        items = data.get('items')
+        filters = data.get('filter')
+        
+        if action not in BATCH_ACTIONS:
+            return jsonify({'success': False, 'message': f'不支持的操作: {action}'}), 400
+        if bool(items) == bool(filters):
+            return jsonify({'success': False, 'message': '请提供 items 或 filter 其中之一'}), 400
+        
+        if items:
+            if not all(isinstance(item, dict) and 'id' in item for item in items):
+                return jsonify({'success': False, 'message': 'items 中每一项都需要包含 id'}), 400
+            updated, conflicts = batch_update_items(action, items, judged_by)
+        else:
+            file_id = filters.get('file_id')
+            if not file_id:
+                return jsonify({'success': False, 'message': '请指定文件ID'}), 400
+            updated, conflicts = batch_update_filter(
+                action, file_id, filters, judged_by,
+                judgement=data.get('judgement', ''),
+                modified_content=data.get('modified_content', ''),
+                include_reviewed=bool(data.get('include_reviewed'))
+            )
+        
+        db.session.commit()
+        
+        logger.info("批量核对成功: action=%s, updated=%s, conflicts=%s", action, updated, len(conflicts))
+        message = f'批量处理完成，共更新 {updated} 条意图'
+        if conflicts:
+            message += f'，{len(conflicts)} 条正被其他人核对，已跳过'
+        return jsonify({
+            'success': True,
+            'message': message,
+            'data': {'updated': updated, 'conflicts': conflicts}
+        })
+    except (TypeError, ValueError) as e:
+        logger.error(f"批量核对参数错误: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'参数错误: {str(e)}'}), 400
+    except Exception as e:
+        logger.error(f"批量核对失败: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def send_export_artefact(artefact, mimetype, download_name):
+    """发送缓存的导出文件：If-None-Match 命中时返回304，带 Range 时返回未压缩内容的对应片段，
+    否则客户端接受 gzip 时直接发送预先压缩好的文件
+
+    内容（包括JSON中的 exported_at）是生成缓存时的结果：X-Export-Cache 标明本次是 hit 还是 miss，
+    Last-Modified 为生成时间。send_file 在返回前已打开文件，之后文件被其他进程淘汰也能完整发送；
+    打开前已被淘汰时抛出 FileNotFoundError。
+    """
+    response = not_modified(artefact.etag)
+    if response is None:
+        use_gzip = request.range is None and request.accept_encodings['gzip']
+        path, etag = (artefact.gzip_path, f'{artefact.etag}-gzip') if use_gzip else (artefact.path, artefact.etag)
+        response = send_file(path, mimetype=mimetype.split(';')[0], as_attachment=True,
+                             download_name=download_name, etag=etag, conditional=True, max_age=0,
+                             last_modified=export_cache.built_at(artefact))
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+    response.headers['X-Export-Cache'] = 'hit' if artefact.hit else 'miss'
+    return response
+
 @app.route('/api/files/<int:file_id>/export', methods=['GET'])
 def export_file(file_id):
-    """导出核对后的文件（支持JSON和CSV格式）"""
+    """导出核对后的文件（支持JSON、CSV和NDJSON格式）
+
+    导出按文件版本缓存在磁盘上，文件没有变化时重复导出直接返回缓存的内容；
+    关闭缓存（EXPORT_CACHE_MB=0）或磁盘不可写时流式输出。
+    """
     try:
-        file = UploadedFile.query.get(file_id)
+        file = get_active_file(file_id)
         if not file:
             return jsonify({'success': False, 'message': '文件不存在'}), 404
         
         export_format = request.args.get('format', 'json').lower()
-        intents = Intent.query.filter_by(file_id=file_id).order_by(Intent.id).all()
+        if export_format not in EXPORT_FORMATS:
+            export_format = 'json'
         
-        if export_format == 'csv':
-            # 导出为CSV格式
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # 写入表头
-            writer.writerow([
-                '意图ID', '阶段', '类别', '原始内容', 
-                '核对结果', '核对人', '修改后内容', '核对时间', '核对状态'
-            ])
-            
-            # 写入数据
-            for intent in intents:
-                writer.writerow([
-                    intent.intent_id,
-                    intent.stage,
-                    intent.category,
-                    intent.original_comment,
-                    intent.judgement,
-                    intent.judged_by,
-                    intent.modified_content,
-                    intent.judge_date.strftime('%Y-%m-%d %H:%M:%S') if intent.judge_date else '',
-                    intent.review_status
-                ])
-            
-            # 生成文件名 - 使用ASCII安全的文件名
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            ascii_filename = f"intent_review_{file_id}_{timestamp}.csv"
-            
-            logger.info(f"导出CSV文件: {file_id}")
-            
-            # 添加BOM以支持Excel正确识别UTF-8编码
-            csv_content = '\ufeff' + output.getvalue()
-            
-            # 返回CSV文件
-            output.seek(0)
-            response = Response(
-                csv_content,
-                mimetype='text/csv; charset=utf-8',
-            )
-            response.headers['Content-Disposition'] = f'attachment; filename={ascii_filename}'
-            response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-            return response
-        else:
-            # 导出为JSON格式
-            # 按阶段分组
-            stages = {}
-            for intent in intents:
-                if intent.stage not in stages:
-                    stages[intent.stage] = []
-                stages[intent.stage].append({
-                    'id': intent.intent_id,
-                    'category': intent.category,
-                    'original_comment': intent.original_comment,
-                    'judgement': intent.judgement,
-                    'judged_by': intent.judged_by,
-                    'modified_content': intent.modified_content,
-                    'judge_date': intent.judge_date.strftime('%Y-%m-%d %H:%M:%S') if intent.judge_date else ''
-                })
-            
-            # 构建输出数据
-            output_data = {
-                'metadata': {
-                    'source_file': file.source_file,
-                    'created_at': file.created_at.strftime('%Y-%m-%d'),
-                    'exported_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'total_items': file.total_items,
-                    'reviewed_items': file.reviewed_items,
-                    'judgement_options': ['通过', '需修改', '删除', '待定']
-                }
-            }
-            output_data.update(stages)
-            
-            # 生成文件名 - 使用ASCII安全的文件名
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            ascii_filename = f"intent_review_{file_id}_{timestamp}.json"
-            
-            logger.info(f"导出JSON文件: {file_id}")
-            
-            # 返回JSON文件下载
-            json_output = json.dumps(output_data, ensure_ascii=False, indent=2)
-            response = Response(
-                json_output,
-                mimetype='application/json; charset=utf-8',
-            )
-            response.headers['Content-Disposition'] = f'attachment; filename={ascii_filename}'
-            response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return response
+        if wants_async():
+            job_id = job_runner.submit('export', run_export_job, file_id, export_format, file_id=file_id)
+            logger.info("后台导出文件: %s, job=%s", file_id, job_id)
+            return jsonify({'success': True, 'message': '正在后台导出', 'data': {'job_id': job_id}}), 202
+        
+        mimetype = EXPORT_MIMETYPES[export_format]
+        
+        # 生成文件名 - 使用ASCII安全的文件名
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        ascii_filename = f"intent_review_{file_id}_{timestamp}.{export_format}"
+        
+        logger.info("导出%s文件: %s", export_format.upper(), file_id)
+        
+        # 文件没有变化时直接返回缓存的导出（支持 ETag 和 Range），缓存不可用时退回流式生成
+        # 取到缓存后、打开文件前可能被其他进程淘汰，这时重新取一次（会重新生成），仍失败时流式生成
+        if export_cache.enabled:
+            for attempt in range(2):
+                try:
+                    artefact = export_cache.get(
+                        file, export_format, lambda: generate_export(file, export_format, Config.EXPORT_BATCH_SIZE)
+                    )
+                    return send_export_artefact(artefact, mimetype, ascii_filename)
+                except FileNotFoundError as e:
+                    logger.warning("导出缓存在发送前已被删除: %s", e)
+                except OSError as e:
+                    logger.warning("导出缓存不可用: %s", e)
+                    break
+        
+        body = generate_export(file, export_format, Config.EXPORT_BATCH_SIZE)
+        # 边读边写，stream_with_context 保证生成器中仍可使用数据库会话；客户端支持时边生成边压缩
+        encoding = negotiate_encoding()
+        if encoding:
+            body = compress_stream(body, encoding)
+        response = Response(stream_with_context(body), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename={ascii_filename}'
+        response.headers['Content-Type'] = mimetype
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'message': str(e)}), 429
     except Exception as e:
         logger.error(f"导出文件失败: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/snapshots', methods=['GET'])
+def get_snapshots():
+    """分析快照的清单：分段列表（按生成顺序）和下一次增量快照的起点"""
+    try:
+        manifest = load_manifest(Config.SNAPSHOT_FOLDER)
+        for segment in manifest['segments']:
+            segment['download_url'] = f"/api/snapshots/{segment['name']}"
+        return jsonify({'success': True, 'data': manifest})
+    except Exception as e:
+        logger.error(f"获取分析快照失败: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/snapshots', methods=['POST'])
+def create_snapshot():
+    """后台生成分析快照：全部意图与所属文件信息的列式文件（安装 pyarrow 时为 Parquet）
+
+    mode=full（默认）重新生成全部数据；mode=incremental 只追加上次快照之后新增或核对内容有变化的意图。
+    """
+    try:
+        mode = request.values.get('mode', 'full')
+        if mode not in ('full', 'incremental'):
+            return jsonify({'success': False, 'message': 'mode 参数应为 full/incremental'}), 400
+        job_id = job_runner.submit('snapshot', run_snapshot_job, mode == 'incremental')
+        logger.info(f"后台生成分析快照: mode={mode}, job={job_id}")
+        return jsonify({'success': True, 'message': '正在后台生成快照', 'data': {'job_id': job_id}}), 202
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'message': str(e)}), 429
+    except Exception as e:
+        logger.error(f"生成分析快照失败: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/snapshots/<name>', methods=['GET'])
+def download_snapshot(name):
+    """下载清单中的快照分段（支持 Range）"""
+    segments = {s['name']: s for s in load_manifest(Config.SNAPSHOT_FOLDER)['segments']}
+    segment = segments.get(name)
+    path = os.path.join(Config.SNAPSHOT_FOLDER, name)
+    if segment is None or not os.path.exists(path):
+        return jsonify({'success': False, 'message': '快照不存在'}), 404
+    return send_file(path, mimetype=SNAPSHOT_MIMETYPES[segment['format']], as_attachment=True,
+                     download_name=name, conditional=True)
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """核对统计（基于汇总表，不扫描意图表）
+
+    默认返回按文件、阶段、类别、核对结果、核对状态、核对人的分项统计；
+    传入 group_by（如 stage,judgement）时返回该维度组合的分组计数。
+    file_id 为空时统计全部文件。
+    """
+    try:
+        file_id = request.args.get('file_id', type=int)
+        group_by = [g for g in request.args.get('group_by', '').split(',') if g]
+        
+        invalid = [g for g in group_by if g not in STAT_DIMENSIONS]
+        if invalid:
+            return jsonify({'success': False, 'message': f'不支持的分组维度: {",".join(invalid)}'}), 400
+        
+        if group_by:
+            data = grouped_statistics(group_by, file_id)
+        else:
+            data = review_statistics(file_id)
+        
+        logger.info("获取核对统计: file_id=%s, group_by=%s", file_id, group_by, extra=SAMPLED)
+        return jsonify({'success': True, 'data': data})
+    except Exception as e:
+        logger.error(f"获取核对统计失败: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/stats/rebuild', methods=['POST'])
+def rebuild_stats():
+    """从意图表重建统计汇总表（用于修复）"""
+    try:
+        rebuild_statistics()
+        logger.info("统计汇总表重建完成")
+        return jsonify({'success': True, 'message': '重建完成'})
+    except Exception as e:
+        logger.error(f"统计汇总表重建失败: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# 单次返回的变更条数上限
+CHANGE_FEED_MAX = 5000
+
+def change_feed_params():
+    """变更接口的公共参数: (since, file_id, limit)，since 未提供时为 None"""
+    since = request.args.get('since', request.headers.get('Last-Event-ID'))
+    since = int(since) if since not in (None, '') else None
+    if since is not None and since < 0:
+        raise ValueError('since 不能为负数')
+    limit = min(max(request.args.get('limit', 500, type=int), 1), CHANGE_FEED_MAX)
+    return since, request.args.get('file_id', type=int), limit
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """获取 since 之后变化的意图和文件，客户端据此更新本地数据而不是重新拉取整页
+
+    不传 since 时只返回当前最新序号（next），客户端加载完整数据后从该序号开始同步。
+    可用 file_id 只获取某个文件的变更。
+    """
+    try:
+        try:
+            since, file_id, limit = change_feed_params()
+        except ValueError:
+            return jsonify({'success': False, 'message': 'since 应为非负整数'}), 400
+        
+        if since is None:
+            data = {'files': [], 'intents': [], 'deleted_files': [], 'next': head_seq(),
+                    'has_more': False, 'reset': False}
+        else:
+            data = change_feed(since, file_id, limit)
+        
+        logger.info("获取变更: since=%s, file_id=%s, next=%s", since, file_id, data['next'], extra=SAMPLED)
+        return jsonify({'success': True, 'data': data})
+    except Exception as e:
+        logger.error(f"获取变更失败: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# 推送连接数的限制：每个连接在整个持续时间内占用一个处理线程（同步 worker 下即整个 worker），
+# 需要更多连接时应使用多线程或异步 worker 并调大 CHANGE_STREAM_MAX
+change_stream_slots = threading.BoundedSemaphore(max(Config.CHANGE_STREAM_MAX, 1))
+
+@app.route('/api/changes/stream', methods=['GET'])
+def stream_changes():
+    """以 Server-Sent Events 推送变更（事件名 changes，数据与 /api/changes 相同）
+
+    服务端每隔 CHANGE_POLL_SECONDS 查询一次变更日志，连接保持 CHANGE_STREAM_SECONDS 秒后关闭，
+    浏览器的 EventSource 会带上 Last-Event-ID 自动重连，不会漏掉变更。
+    同时推送的连接超过 CHANGE_STREAM_MAX 时返回503，客户端应改为轮询 /api/changes。
+    """
+    try:
+        since, file_id, limit = change_feed_params()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'since 应为非负整数'}), 400
+    if Config.CHANGE_STREAM_MAX <= 0 or not change_stream_slots.acquire(blocking=False):
+        response = jsonify({'success': False, 'message': '推送连接已满，请改用 /api/changes 轮询'})
+        response.headers['Retry-After'] = str(Config.CHANGE_STREAM_SECONDS)
+        return response, 503
+    try:
+        if since is None:
+            since = head_seq()
+            db.session.close()
+    except Exception:
+        change_stream_slots.release()
+        raise
+    
+    def generate(since):
+        deadline = time.monotonic() + Config.CHANGE_STREAM_SECONDS
+        last_sent = time.monotonic()
+        yield f'retry: 3000\nid: {since}\n\n'
+        while time.monotonic() < deadline:
+            try:
+                data = change_feed(since, file_id, limit)
+            finally:
+                # 两次轮询之间不持有事务和数据库连接
+                db.session.close()
+            if data['next'] != since or data['reset']:
+                since = data['next']
+                last_sent = time.monotonic()
+                yield f"id: {since}\nevent: changes\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            elif time.monotonic() - last_sent >= 15:
+                # 注释行作为心跳，防止代理因空闲关闭连接
+                last_sent = time.monotonic()
+                yield ': ping\n\n'
+            if not data['has_more']:
+                time.sleep(Config.CHANGE_POLL_SECONDS)
+    
+    logger.info("开始推送变更: since=%s, file_id=%s", since, file_id)
+    response = Response(stream_with_context(generate(since)), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # 连接到期或客户端断开、响应关闭时释放名额
+    response.call_on_close(change_stream_slots.release)
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询后台任务状态和进度"""
+    try:
+        job = job_runner.get(job_id)
+        if not job:
+            return jsonify({'success': False, 'message': '任务不存在'}), 404
+        return jsonify({'success': True, 'data': job})
+    except Exception as e:
+        logger.error(f"获取任务状态失败: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """下载后台导出任务生成的文件"""
+    job = job_runner.get(job_id)
+    if not job or job['kind'] != 'export' or job['status'] != 'succeeded':
+        return jsonify({'success': False, 'message': '导出结果不存在或任务未完成'}), 404
+    path = os.path.join(Config.EXPORT_FOLDER, job['result']['filename'])
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'message': '导出文件已被清理'}), 404
+    mimetype = EXPORT_MIMETYPES[job['result']['format']].split(';')[0]
+    return send_file(path, mimetype=mimetype,
+                     as_attachment=True, download_name=job['result']['filename'])
+
+@app.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """重新统计所有文件的意图数量和已核对数量"""
+    fixed = reconcile_counters()
+    print(f"校正完成，修正 {fixed} 个文件")
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """从意图表重建统计汇总表"""
+    rebuild_statistics()
+    print("统计汇总表重建完成")
+
+@app.cli.command('purge-deleted-files')
+def purge_deleted_files_command():
+    """清理已软删除但尚未清理完成的文件"""
+    purged = purge_deleted_files()
+    print(f"清理完成，共 {purged} 个文件")
+
+@app.cli.command('prune-changes')
+def prune_changes_command():
+    """清理变更日志，只保留最近 CHANGE_LOG_RETENTION 条"""
+    pruned = prune_changes(Config.CHANGE_LOG_RETENTION)
+    db.session.commit()
+    print(f"清理完成，共删除 {pruned} 条变更")
+
+@app.cli.command('build-similarity-index')
+@click.option('--rebuild', is_flag=True, help='清空后为所有文件重建')
+def build_similarity_index_command(rebuild):
+    """为还没有分桶的意图文件建立近似重复检测的分桶（如迁移前上传的文件）"""
+    indexed = build_index(rebuild=rebuild, batch_size=Config.INGEST_BATCH_SIZE)
+    print(f"分桶建立完成，共 {indexed} 个文件")
+
+@app.cli.command('snapshot')
+@click.option('--incremental', is_flag=True, help='只追加上次快照之后有变化的意图')
+def snapshot_command(incremental):
+    """生成全部意图的分析快照（列式文件），保存在 SNAPSHOT_FOLDER"""
+    try:
+        segment = build_snapshot(Config.SNAPSHOT_FOLDER, incremental=incremental,
+                                 batch_size=Config.SNAPSHOT_BATCH_SIZE)
+    except SnapshotBusy as e:
+        raise click.ClickException(str(e))
+    print(f"快照生成完成: {segment['name']}（{segment['mode']}），共 {segment['rows']} 条")
+
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """执行未完成的数据库迁移"""
+    with app.app_context():
+        db.create_all()
+        applied = run_migrations(db.engine)
+    print(f"迁移完成: {applied}" if applied else "数据库已是最新版本")
+
 # 本地开发或Railway部署时运行
 if __name__ == '__main__':
-    ensure_directories()
-    init_db()
+    ensure_db()
     # 从环境变量获取端口，默认5001
     port = int(os.environ.get('PORT', 5001))
     debug = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
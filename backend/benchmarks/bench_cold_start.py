@@ -0,0 +1,112 @@
+"""Vercel 入口 api/index.py 的冷启动耗时
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_cold_start.py --runs 10 -o /tmp/cold_start.json
+    python benchmarks/bench_cold_start.py --compare /tmp/cold_start.json
+    python benchmarks/bench_cold_start.py --top 15    # 列出导入最慢的模块
+
+每次在全新的子进程中（VERCEL=1）导入入口模块，分别测量导入耗时、
+第一个不访问数据库的请求和第一个访问数据库的请求（含延迟初始化）的耗时。
+结果格式与 bench_suite.py 相同，可用 --compare 对比基线。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_suite import compare, summarize
+
+# 子进程中执行：导入入口并发出两个请求，输出各阶段毫秒数
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, 'api')
+import index
+imported = time.perf_counter()
+client = index.app.test_client()
+assert client.get('/api/health').status_code == 200
+health = time.perf_counter()
+assert client.get('/api/files').status_code == 200
+files = time.perf_counter()
+print(json.dumps({
+    'import': (imported - start) * 1000,
+    'first request (no db)': (health - imported) * 1000,
+    'first request (db)': (files - health) * 1000,
+}))
+'''
+
+
+def child_env(database_url):
+    return dict(os.environ, VERCEL='1', DATABASE_URL=database_url)
+
+
+def run_once(database_url):
+    proc = subprocess.run([sys.executable, '-c', CHILD], env=child_env(database_url), cwd=BACKEND_DIR,
+                          capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(database_url, top):
+    """用 -X importtime 列出累计导入耗时最长的模块"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import sys; sys.path.insert(0, "api"); import index'],
+                          env=child_env(database_url), cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, module = [part.strip() for part in line.replace('import time:', '|').split('|')]
+        rows.append((int(cumulative_us), int(self_us), module))
+    rows.sort(reverse=True)
+    print(f"{'module':<40}{'self ms':>10}{'total ms':>10}")
+    for cumulative_us, self_us, module in rows[:top]:
+        print(f"{module:<40}{self_us / 1000:>10.1f}{cumulative_us / 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--database-url', help='默认使用临时 SQLite 文件')
+    parser.add_argument('--top', type=int, default=0, help='列出导入最慢的N个模块后退出')
+    parser.add_argument('-o', '--output', help='结果文件（JSON）')
+    parser.add_argument('--compare', help='基线结果文件，对比后有退化时退出码为1')
+    parser.add_argument('--threshold', type=float, default=0.2, help='耗时增加超过该比例视为退化')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help='忽略小于该毫秒数的变化')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_cold_start_') as work_dir:
+        database_url = args.database_url or f"sqlite:///{os.path.join(work_dir, 'cold.db')}"
+        if args.top:
+            slowest_imports(database_url, args.top)
+            return
+        # 先运行一次建好表结构，之后测量的是已有数据库上的冷启动
+        run_once(database_url)
+        runs = [run_once(database_url) for _ in range(args.runs)]
+
+    results = {name: summarize([run[name] for run in runs]) for name in runs[0]}
+    report = {'params': {'runs': args.runs}, 'results': {'vercel': results}}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} 个阶段退化超过 {args.threshold:.0%}")
+            sys.exit(1)
+        print("没有发现退化")
+    else:
+        print(f"{'stage':<26}{'median':>10}{'p95':>10}")
+        for name, value in results.items():
+            print(f"{name:<26}{value['median_ms']:>10.2f}{value['p95_ms']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""多个进程并发核对时的吞吐量，对比 SQLite 引擎配置方案
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_concurrency.py --workers 8 --duration 10
+
+对每个 ENGINE_PROFILE（default 为原来的回滚日志模式，tuned 为 WAL 等调优设置）
+新建一个 SQLite 数据库，启动多个工作进程（相当于多个 gunicorn worker）同时提交核对并穿插列表查询，
+统计每秒成功的请求数、失败数（如 database is locked）和延迟。
+传入 --database-url 时改为测试指定的数据库（如本地 Postgres）。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_suite import summarize
+
+
+def setup(args):
+    """建表并写入一个文件的意图，输出意图ID范围"""
+    import logging
+    from app import app, init_db
+    from models import db, UploadedFile, Intent, REVIEW_PENDING
+    from ingest import bulk_insert
+
+    logging.getLogger('ontology_review').setLevel(logging.WARNING)
+    init_db()
+    with app.app_context():
+        f = UploadedFile(filename='bench.json', original_filename='bench.json',
+                         step_type='atomic_intent', total_items=args.intents, reviewed_items=0)
+        db.session.add(f)
+        db.session.flush()
+        rows = (
+            {
+                'file_id': f.id,
+                'intent_id': f'INT-{i}',
+                'stage': f'Stage_{i % 4}',
+                'category': 'Fact',
+                'original_comment': '招聘需求主要来源于客户的 RMS 系统或飞书在线表格。',
+                'judgement': '',
+                'judged_by': '',
+                'modified_content': '',
+                'review_status': REVIEW_PENDING
+            }
+            for i in range(args.intents)
+        )
+        bulk_insert(Intent.__table__, rows, batch_size=5000)
+        db.session.commit()
+        first, last = db.session.query(db.func.min(Intent.id), db.func.max(Intent.id)).one()
+        print(json.dumps({'file_id': f.id, 'first': first, 'last': last}))
+
+
+def worker(args):
+    """在开始时间到达后持续提交核对，每 --read-every 次核对穿插一次列表查询"""
+    import logging
+    from app import app
+
+    logging.getLogger('ontology_review').setLevel(logging.CRITICAL)
+    client = app.test_client()
+    intent_ids = range(args.first + args.index, args.last + 1, args.workers)
+    ok, failed, latencies, errors = 0, 0, [], {}
+
+    time.sleep(max(0, args.start_at - time.time()))
+    deadline = time.time() + args.duration
+    for n, intent_id in enumerate(intent_ids):
+        if time.time() >= deadline:
+            break
+        if args.read_every and n % args.read_every == 0:
+            request = lambda: client.get(f'/api/intents?file_id={args.file_id}&page=1&per_page=20&count=cached')
+        else:
+            request = lambda: client.post(f'/api/intents/{intent_id}/review',
+                                          json={'judgement': '需修改', 'modified_content': 'bench'})
+        start = time.perf_counter()
+        response = request()
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code == 200:
+            ok += 1
+        else:
+            failed += 1
+            message = (response.json or {}).get('message', str(response.status_code))[:80]
+            errors[message] = errors.get(message, 0) + 1
+    print(json.dumps({'ok': ok, 'failed': failed, 'latencies': latencies, 'errors': errors}))
+
+
+def run_profile(profile, database_url, args):
+    env = dict(os.environ, DATABASE_URL=database_url, ENGINE_PROFILE=profile, PAGE_CACHE_SIZE='0')
+    env.pop('VERCEL', None)
+    script = os.path.abspath(__file__)
+    common = ['--intents', str(args.intents), '--workers', str(args.workers),
+              '--duration', str(args.duration), '--read-every', str(args.read_every)]
+
+    proc = subprocess.run([sys.executable, script, '--role', 'setup'] + common, env=env,
+                          cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    info = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # 所有工作进程导入完成后同时开始
+    start_at = time.time() + 3
+    procs = [
+        subprocess.Popen([sys.executable, script, '--role', 'worker', '--index', str(i),
+                          '--file-id', str(info['file_id']), '--first', str(info['first']),
+                          '--last', str(info['last']), '--start-at', str(start_at)] + common,
+                         env=env, cwd=BACKEND_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for i in range(args.workers)
+    ]
+    results = []
+    for p in procs:
+        out, err = p.communicate()
+        if p.returncode != 0:
+            raise RuntimeError(err[-2000:])
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    ok = sum(r['ok'] for r in results)
+    failed = sum(r['failed'] for r in results)
+    errors = {}
+    for r in results:
+        for message, count in r['errors'].items():
+            errors[message] = errors.get(message, 0) + count
+    latency = summarize([ms for r in results for ms in r['latencies']])
+    return {
+        'ok_per_sec': round(ok / args.duration, 1),
+        'ok': ok,
+        'failed': failed,
+        'errors': errors,
+        'median_ms': latency['median_ms'],
+        'p95_ms': latency['p95_ms'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help='每个方案的测试秒数')
+    parser.add_argument('--intents', type=int, default=50000)
+    parser.add_argument('--read-every', type=int, default=4, help='每N次请求中有一次列表查询，0表示只核对')
+    parser.add_argument('--profiles', default='default,tuned')
+    parser.add_argument('--database-url')
+    parser.add_argument('-o', '--output', help='结果文件（JSON）')
+    parser.add_argument('--role', choices=('setup', 'worker'), help=argparse.SUPPRESS)
+    parser.add_argument('--index', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--file-id', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--first', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--last', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role == 'setup':
+        return setup(args)
+    if args.role == 'worker':
+        return worker(args)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench_concurrency_') as work_dir:
+        for profile in args.profiles.split(','):
+            url = args.database_url or f"sqlite:///{os.path.join(work_dir, f'{profile}.db')}"
+            print(f"[{profile}] {args.workers} 个进程运行 {args.duration}s...", file=sys.stderr)
+            results[profile] = run_profile(profile, url, args)
+
+    print(f"{'profile':<10}{'ok/s':>10}{'failed':>10}{'median':>10}{'p95':>10}")
+    for profile, r in results.items():
+        print(f"{profile:<10}{r['ok_per_sec']:>10.1f}{r['failed']:>10}{r['median_ms']:>10.2f}{r['p95_ms']:>10.2f}")
+        for message, count in r['errors'].items():
+            print(f"{'':<10}{count} x {message}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'params': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
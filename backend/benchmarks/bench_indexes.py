@@ -0,0 +1,127 @@
+"""intents 索引迁移前后的接口延迟对比
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_indexes.py --files 20 --per-file 5000
+
+在临时 SQLite 数据库中生成数据，先删除索引模拟迁移前的旧库，
+测量列表/导出/核对/短关键词搜索接口的延迟，再执行迁移后重新测量。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def check(resp):
+    if resp.status_code >= 400:
+        raise RuntimeError(f"请求失败: {resp.status_code} {resp.get_data(as_text=True)[:200]}")
+    return resp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--per-file', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_indexes_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    # 关闭导出的磁盘缓存，重复测量导出时每次都真正生成，而不是读取第一次的缓存
+    os.environ['EXPORT_CACHE_MB'] = '0'
+
+    import logging
+    from sqlalchemy import text
+    from config import Config
+    # 日志、上传和导出等目录在导入 app 之前改到临时目录，不写入 backend 下的 logs、uploads 等目录
+    Config.LOG_FILE = os.path.join(tmp_dir, 'logs', 'app.log')
+    Config.UPLOAD_FOLDER = os.path.join(tmp_dir, 'uploads')
+    Config.EXPORT_FOLDER = os.path.join(tmp_dir, 'exports')
+    Config.EXPORT_CACHE_FOLDER = os.path.join(tmp_dir, 'export_cache')
+    Config.SNAPSHOT_FOLDER = os.path.join(tmp_dir, 'snapshots')
+    from app import app
+    from models import db, UploadedFile, Intent, REVIEW_PENDING
+    from ingest import bulk_insert
+    from migrations import run_migrations
+
+    logging.getLogger('ontology_review').setLevel(logging.WARNING)
+    client = app.test_client()
+
+    with app.app_context():
+        db.create_all()
+        # 模拟迁移前的旧库：没有索引
+        for index in Intent.__table__.indexes:
+            db.session.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+        file_ids = []
+        for n in range(args.files):
+            f = UploadedFile(filename=f'bench_{n}.json', original_filename=f'bench_{n}.json',
+                             step_type='atomic_intent', total_items=args.per_file, reviewed_items=0)
+            db.session.add(f)
+            db.session.flush()
+            file_ids.append(f.id)
+        # 各文件的意图交错写入，模拟多个文件并行导入后的物理分布
+        rows = (
+            {
+                'file_id': file_ids[i % args.files],
+                'intent_id': f'INT-{i}',
+                'stage': f'Stage_{i % 7}',
+                'category': 'Fact',
+                'original_comment': '招聘需求主要来源于客户的 RMS 系统或飞书在线表格。' * 2,
+                'judgement': '',
+                'judged_by': '',
+                'modified_content': '',
+                'review_status': REVIEW_PENDING
+            }
+            for i in range(args.files * args.per_file)
+        )
+        bulk_insert(Intent.__table__, rows, batch_size=5000)
+        db.session.commit()
+        target = file_ids[args.files // 2]
+        pending = [row[0] for row in db.session.execute(
+            text('SELECT id FROM intents WHERE file_id = :f ORDER BY id'), {'f': target}
+        )]
+
+    deep_page = args.per_file // 20
+    review_ids = iter(pending)
+
+    def scenarios():
+        return {
+            'list page 1': measure(lambda: client.get(f'/api/intents?file_id={target}&page=1&per_page=20'), args.repeat),
+            f'list page {deep_page}': measure(lambda: client.get(f'/api/intents?file_id={target}&page={deep_page}&per_page=20'), args.repeat),
+            'export csv': measure(lambda: client.get(f'/api/files/{target}/export?format=csv').get_data(), args.repeat),
+            'export json': measure(lambda: client.get(f'/api/files/{target}/export?format=json').get_data(), args.repeat),
+            'pass intent': measure(lambda: client.post(f'/api/intents/{next(review_ids)}/pass', json={}), args.repeat),
+            # 2个字符的关键词用不上 trigram 索引，只能在指定文件的意图中逐条匹配（没有匹配项时最慢）
+            'search 2 chars': measure(lambda: check(client.get(f'/api/intents/search?file_id={target}&q=面试&per_page=20')),
+                                      args.repeat),
+            # 不指定文件时每次请求最多扫描 SEARCH_SCAN_ROWS 个ID
+            'search 2 all': measure(lambda: check(client.get('/api/intents/search?q=面试&per_page=20')), args.repeat),
+        }
+
+    before = scenarios()
+    with app.app_context():
+        run_migrations(db.engine)
+    after = scenarios()
+
+    print(f"rows={args.files * args.per_file} files={args.files} (median of {args.repeat}, ms)")
+    print(f"{'scenario':<16}{'before':>10}{'after':>10}{'speedup':>10}")
+    for name in before:
+        print(f"{name:<16}{before[name]:>10.2f}{after[name]:>10.2f}{before[name] / after[name]:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
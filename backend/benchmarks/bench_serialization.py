@@ -0,0 +1,115 @@
+"""意图列表的序列化耗时和响应大小：ORM to_dict + jsonify 与行元组 + 快速JSON编码、字段投影、压缩的对比
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_serialization.py --intents 20000 --per-page 200
+
+在临时 SQLite 数据库中写入生成的数据，对同一页意图分别测量：
+  - 查询并序列化的耗时（不经过HTTP，排除路由等固定开销）
+  - 响应体大小（未压缩、gzip，安装了 brotli 时还有 br）
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_suite import summarize
+from generate_dataset import write_dataset
+
+# 列表视图不需要的大段文本列
+LIGHT_FIELDS = 'intent_id,stage,category,judgement,review_status,version'
+
+
+def run(args, work_dir):
+    import logging
+    from config import Config
+    from flask import jsonify
+    from app import app, init_db
+    from models import db, Intent
+    from serialization import dumps, parse_fields, rows_to_dicts, brotli, orjson
+
+    logging.getLogger('ontology_review').setLevel(logging.WARNING)
+    Config.UPLOAD_FOLDER = os.path.join(work_dir, 'uploads')
+    init_db()
+    client = app.test_client()
+
+    buf = io.StringIO()
+    write_dataset(buf, args.stages, args.intents, seed=0, reviewed_ratio=0.5)
+    response = client.post('/api/upload', data={'file': (io.BytesIO(buf.getvalue().encode('utf-8')), 'bench.json')},
+                           content_type='multipart/form-data')
+    file_id = response.json['data']['id']
+
+    def page_query():
+        return Intent.query.filter_by(file_id=file_id).order_by(Intent.id).limit(args.per_page)
+
+    def orm_jsonify():
+        return jsonify({'success': True, 'data': {'items': [i.to_dict() for i in page_query()]}}).get_data()
+
+    def rows_dumps(fields):
+        def build():
+            rows = db.session.query(*[getattr(Intent, f) for f in fields]) \
+                .filter(Intent.file_id == file_id).order_by(Intent.id).limit(args.per_page).all()
+            return dumps({'success': True, 'data': {'items': rows_to_dicts(rows, fields)}})
+        return build
+
+    variants = {
+        'orm + jsonify': orm_jsonify,
+        'rows + dumps': rows_dumps(Intent.FIELDS),
+        'rows + dumps (fields)': rows_dumps(parse_fields(LIGHT_FIELDS, Intent.FIELDS)),
+    }
+
+    results = {}
+    with app.test_request_context():
+        for name, build in variants.items():
+            body = build()
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                build()
+                samples.append((time.perf_counter() - start) * 1000)
+                # 每次都重新查询，避免会话中的对象被复用
+                db.session.expire_all()
+            sizes = {'raw': len(body), 'gzip': len(zlib.compress(body, Config.GZIP_LEVEL, wbits=31))}
+            if brotli is not None:
+                sizes['br'] = len(brotli.compress(body, quality=Config.BROTLI_QUALITY))
+            results[name] = dict(summarize(samples), bytes=sizes)
+    return {'orjson': orjson is not None, 'brotli': brotli is not None, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--intents', type=int, default=5000)
+    parser.add_argument('--stages', type=int, default=4)
+    parser.add_argument('--per-page', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('-o', '--output', help='结果文件（JSON）')
+    args = parser.parse_args()
+
+    # 数据库和上传文件都放在临时目录中
+    with tempfile.TemporaryDirectory(prefix='bench_serialization_') as work_dir:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+        os.environ['PAGE_CACHE_SIZE'] = '0'
+        os.environ.pop('VERCEL', None)
+        report = run(args, work_dir)
+
+    print(f"orjson: {'是' if report['orjson'] else '否'}, brotli: {'是' if report['brotli'] else '否'}")
+    encodings = list(next(iter(report['results'].values()))['bytes'])
+    print(f"{'variant':<26}{'median':>10}{'p95':>10}" + ''.join(f'{e + " KB":>12}' for e in encodings))
+    for name, r in report['results'].items():
+        print(f"{name:<26}{r['median_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+              + ''.join(f"{r['bytes'][e] / 1024:>12.1f}" for e in encodings))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(dict(report, params=vars(args)), f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""近似重复检测随意图数量的耗时变化：上传（含建立分桶）和查找重复簇
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_similarity.py --sizes 3000 10000 30000
+
+每个规模在新的临时 SQLite 数据库中上传一个文件（按 generate_dataset 的模板生成，
+模板数量有限，意图之间大量近似重复，是查找重复簇的最坏情况），分别测量上传耗时、
+建立分桶的耗时和 GET /api/files/<id>/duplicates 的耗时。耗时应与意图数量大致成正比。
+"""
+import argparse
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+
+def run_size(intents, repeat):
+    """在当前进程中测量一个规模，输出一行 JSON"""
+    import json
+    import logging
+
+    sys.path.insert(0, BACKEND_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    from config import Config
+    # 上传和日志写入临时目录，不写入仓库中的目录
+    tmp_dir = os.path.dirname(os.environ['DATABASE_URL'].replace('sqlite:///', ''))
+    Config.UPLOAD_FOLDER = os.path.join(tmp_dir, 'uploads')
+    Config.LOG_FILE = os.path.join(tmp_dir, 'logs', 'app.log')
+    from generate_dataset import write_dataset
+    from app import app, ensure_db
+    from jobs import job_runner
+
+    logging.getLogger('ontology_review').setLevel(logging.WARNING)
+    ensure_db()
+    client = app.test_client()
+    fp = io.StringIO()
+    write_dataset(fp, 8, intents, seed=1)
+    content = fp.getvalue().encode('utf-8')
+
+    start = time.perf_counter()
+    resp = client.post('/api/upload', data={'file': (io.BytesIO(content), 'bench.json')},
+                       content_type='multipart/form-data')
+    upload_seconds = time.perf_counter() - start
+    file_id = resp.get_json()['data']['id']
+    # 分桶由后台任务建立时等待其完成
+    start = time.perf_counter()
+    if job_runner.executor is not None:
+        job_runner.executor.shutdown(wait=True)
+    index_seconds = time.perf_counter() - start
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = client.get(f'/api/files/{file_id}/duplicates').get_json()['data']
+        samples.append(time.perf_counter() - start)
+    print(json.dumps({
+        'intents': intents,
+        'upload': upload_seconds,
+        'index_wait': index_seconds,
+        'duplicates': min(samples),
+        'clusters': data['total'],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3000, 10000, 30000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--run-size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size:
+        run_size(args.run_size, args.repeat)
+        return
+
+    import json
+    print(f"{'intents':>8}{'upload s':>10}{'index s':>10}{'dups s':>10}{'clusters':>10}")
+    for size in args.sizes:
+        tmp_dir = tempfile.mkdtemp(prefix='bench_similarity_')
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}",
+                   PAGE_CACHE_SIZE='0', EXPORT_CACHE_MB='0')
+        out = subprocess.run([sys.executable, __file__, '--run-size', str(size), '--repeat', str(args.repeat)],
+                             env=env, cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{r['intents']:>8}{r['upload']:>10.2f}{r['index_wait']:>10.2f}{r['duplicates']:>10.2f}{r['clusters']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""主要接口的基准测试，结果写入JSON文件并可与基线对比
+
+用法（在 backend 目录下）:
+    # 生成基线
+    python benchmarks/bench_suite.py --intents 100000 -o benchmarks/baseline.json
+    # 修改代码后对比，耗时增加超过阈值的场景记为退化，退出码为1
+    python benchmarks/bench_suite.py --intents 100000 -o /tmp/current.json --compare benchmarks/baseline.json
+
+默认只测试临时 SQLite 数据库；传入 --postgres-url（或设置环境变量 BENCH_POSTGRES_URL）时
+同时测试本地 Postgres，无法连接时跳过。每个数据库在独立子进程中运行，
+因为 Config 在导入时读取 DATABASE_URL。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from generate_dataset import write_dataset
+
+
+def summarize(samples):
+    """毫秒样本的汇总值"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(len(ordered) * 0.95)) - 1)]
+    return {
+        'median_ms': round(statistics.median(ordered), 3),
+        'p95_ms': round(p95, 3),
+        'samples': len(ordered)
+    }
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def run_scenarios(args, work_dir):
+    """在当前进程的数据库上执行所有场景，返回 {场景名: 汇总值}"""
+    import logging
+    from config import Config
+    from app import app, init_db
+    from pagination import encode_cursor
+    from models import db, Intent
+
+    logging.getLogger('ontology_review').setLevel(logging.WARNING)
+    # 上传文件写到临时目录，不污染 backend/uploads
+    Config.UPLOAD_FOLDER = os.path.join(work_dir, 'uploads')
+    Config.EXPORT_FOLDER = os.path.join(work_dir, 'exports')
+    init_db()
+    client = app.test_client()
+
+    dataset = os.path.join(work_dir, 'dataset.json')
+    with open(dataset, 'w', encoding='utf-8') as f:
+        write_dataset(f, args.stages, args.intents, seed=args.seed)
+
+    def check(response):
+        if response.status_code >= 400:
+            raise RuntimeError(f'{response.request.path}: {response.status_code} {response.get_data(as_text=True)[:200]}')
+        return response
+
+    results = {}
+
+    # 上传：每次在文件末尾追加一个空白字符，避免被判为重复上传
+    samples, file_ids = [], []
+    for _ in range(max(args.repeat, 2)):
+        with open(dataset, 'a', encoding='utf-8') as f:
+            f.write(' ')
+        with open(dataset, 'rb') as f:
+            ms, r = timed(lambda: check(client.post(
+                '/api/upload', data={'file': (f, 'bench.json')}, content_type='multipart/form-data'
+            )))
+        samples.append(ms)
+        file_ids.append(r.json['data']['id'])
+    results['upload'] = summarize(samples)
+    target = file_ids[0]
+
+    per_page = 20
+    last_page = max(1, -(-args.intents // per_page))
+    with app.app_context():
+        deep_key = db.session.query(Intent.id).filter_by(file_id=target).order_by(Intent.id) \
+            .offset(max(0, args.intents - per_page - 1)).limit(1).scalar()
+        pending = [row[0] for row in db.session.query(Intent.id).filter_by(file_id=target)
+                   .order_by(Intent.id).limit(args.burst * 2)]
+    deep_cursor = encode_cursor('a', deep_key)
+
+    scenarios = {
+        'list first page': lambda: check(client.get(f'/api/intents?file_id={target}&page=1&per_page={per_page}')),
+        'list last page (offset)': lambda: check(client.get(
+            f'/api/intents?file_id={target}&page={last_page}&per_page={per_page}')),
+        'list last page (cursor)': lambda: check(client.get(
+            f'/api/intents?file_id={target}&cursor={deep_cursor}&per_page={per_page}&count=cached')),
+        'export csv': lambda: check(client.get(f'/api/files/{target}/export?format=csv')).get_data(),
+        'export json': lambda: check(client.get(f'/api/files/{target}/export?format=json')).get_data(),
+    }
+    for name, fn in scenarios.items():
+        # 第一次请求用于预热（缓存、连接），不计入结果
+        fn()
+        results[name] = summarize([timed(fn)[0] for _ in range(args.repeat)])
+
+    # 连续核对/通过：每个样本为一次请求
+    reviews, passes = pending[:args.burst], pending[args.burst:]
+    results['review burst'] = summarize([timed(lambda: check(client.post(
+        f'/api/intents/{intent_id}/review', json={'judgement': '需修改', 'modified_content': 'bench'}
+    )))[0] for intent_id in reviews])
+    results['pass burst'] = summarize([timed(lambda: check(client.post(
+        f'/api/intents/{intent_id}/pass', json={}
+    )))[0] for intent_id in passes])
+
+    results['delete file'] = summarize([timed(lambda: check(client.delete(f'/api/files/{file_id}')))[0]
+                                        for file_id in file_ids[1:]])
+    return results
+
+
+def run_backend(name, database_url, args):
+    """在子进程中对指定数据库运行所有场景，失败时返回 None"""
+    # 关闭意图分页的进程内缓存和导出的磁盘缓存，测量的是每次真实查询数据库、生成导出的耗时
+    env = dict(os.environ, DATABASE_URL=database_url, PAGE_CACHE_SIZE='0', EXPORT_CACHE_MB='0')
+    env.pop('VERCEL', None)
+    cmd = [sys.executable, os.path.abspath(__file__), '--worker',
+           '--intents', str(args.intents), '--stages', str(args.stages),
+           '--repeat', str(args.repeat), '--burst', str(args.burst), '--seed', str(args.seed)]
+    print(f"[{name}] 运行中...", file=sys.stderr)
+    proc = subprocess.run(cmd, env=env, cwd=BACKEND_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"[{name}] 失败，已跳过:\n{proc.stderr[-2000:]}", file=sys.stderr)
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(current, baseline, threshold, min_delta_ms):
+    """对比两次结果，返回退化的场景列表 [(数据库, 场景, 基线ms, 当前ms)]"""
+    regressions = []
+    print(f"{'backend':<10}{'scenario':<26}{'baseline':>10}{'current':>10}{'change':>9}")
+    for backend, scenarios in current['results'].items():
+        base_scenarios = baseline.get('results', {}).get(backend)
+        if not base_scenarios:
+            continue
+        for name, value in scenarios.items():
+            if name not in base_scenarios:
+                continue
+            before, after = base_scenarios[name]['median_ms'], value['median_ms']
+            change = (after - before) / before if before else 0.0
+            regressed = change > threshold and after - before > min_delta_ms
+            flag = '  <-- 退化' if regressed else ''
+            print(f"{backend:<10}{name:<26}{before:>10.2f}{after:>10.2f}{change:>+8.0%}{flag}")
+            if regressed:
+                regressions.append((backend, name, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--intents', type=int, default=10000)
+    parser.add_argument('--stages', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--burst', type=int, default=50, help='连续核对/通过的请求数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--postgres-url', default=os.environ.get('BENCH_POSTGRES_URL'))
+    parser.add_argument('-o', '--output', help='结果文件（JSON）')
+    parser.add_argument('--compare', help='基线结果文件，对比后有退化时退出码为1')
+    parser.add_argument('--threshold', type=float, default=0.2, help='耗时增加超过该比例视为退化')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='忽略小于该毫秒数的变化')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with tempfile.TemporaryDirectory(prefix='bench_suite_') as work_dir:
+            print(json.dumps(run_scenarios(args, work_dir)))
+        return
+
+    backends = {}
+    with tempfile.TemporaryDirectory(prefix='bench_suite_') as work_dir:
+        backends['sqlite'] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+        if args.postgres_url:
+            backends['postgres'] = args.postgres_url
+        results = {}
+        for name, url in backends.items():
+            result = run_backend(name, url, args)
+            if result is not None:
+                results[name] = result
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {'intents': args.intents, 'stages': args.stages, 'repeat': args.repeat,
+                   'burst': args.burst, 'seed': args.seed},
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params') != report['params']:
+            print(f"注意：基线参数 {baseline.get('params')} 与本次不同", file=sys.stderr)
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} 个场景退化超过 {args.threshold:.0%}")
+            sys.exit(1)
+        print("没有发现退化")
+    else:
+        print(f"{'backend':<10}{'scenario':<26}{'median':>10}{'p95':>10}")
+        for backend, scenarios in results.items():
+            for name, value in scenarios.items():
+                print(f"{backend:<10}{name:<26}{value['median_ms']:>10.2f}{value['p95_ms']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""按 sample_data.json 的结构生成任意规模的测试数据
+
+用法（在 backend 目录下）:
+    python benchmarks/generate_dataset.py --stages 8 --intents 100000 -o /tmp/intents_100k.json
+
+阶段名和意图内容以 sample_data.json 为模板循环生成，相同参数和种子生成的文件逐字节相同。
+逐条写出，生成百万条意图时内存占用也与规模无关。
+"""
+import argparse
+import json
+import os
+import random
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                           'sample_data.json')
+
+
+def load_templates(sample_path=SAMPLE_PATH):
+    """读取样例文件，返回 (metadata, 阶段名列表, 意图模板列表)"""
+    with open(sample_path, encoding='utf-8') as f:
+        sample = json.load(f)
+    metadata = sample.pop('metadata', {})
+    stages = list(sample)
+    templates = [item for items in sample.values() for item in items]
+    return metadata, stages, templates
+
+
+def stage_names(count, sample_stages):
+    """前几个阶段沿用样例中的名称，超出部分按相同格式编号"""
+    names = []
+    for i in range(count):
+        if i < len(sample_stages):
+            names.append(sample_stages[i])
+        else:
+            base = sample_stages[i % len(sample_stages)].split('_', 2)[-1]
+            names.append(f'Stage_{i + 1}_{base}')
+    return names
+
+
+def write_dataset(fp, stages, intents, seed=0, reviewed_ratio=0.0, sample_path=SAMPLE_PATH):
+    """把 intents 条意图平均分配到 stages 个阶段写入文本文件对象 fp"""
+    metadata, sample_stages, templates = load_templates(sample_path)
+    rng = random.Random(seed)
+    judgements = metadata.get('judgement_options') or ['通过']
+    metadata = dict(metadata, total_items=intents, created_at='2024-12-23')
+
+    fp.write('{\n  "metadata": ')
+    fp.write(json.dumps(metadata, ensure_ascii=False))
+    per_stage, extra = divmod(intents, stages)
+    for s, name in enumerate(stage_names(stages, sample_stages)):
+        count = per_stage + (1 if s < extra else 0)
+        fp.write(f',\n  {json.dumps(name, ensure_ascii=False)}: [')
+        for n in range(count):
+            template = templates[rng.randrange(len(templates))]
+            item = {
+                'id': f'INT-S{s + 1}-{n + 1:06d}',
+                'category': template['category'],
+                'original_comment': f"{template['original_comment']}（#{n + 1}）",
+                'judgement': '',
+                'judged_by': '',
+                'modified_content': '',
+                'judge_date': ''
+            }
+            if reviewed_ratio and rng.random() < reviewed_ratio:
+                item['judgement'] = rng.choice(judgements)
+                item['judged_by'] = 'bench'
+            fp.write(('\n    ' if n == 0 else ',\n    ') + json.dumps(item, ensure_ascii=False))
+        fp.write('\n  ]' if count else ']')
+    fp.write('\n}\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stages', type=int, default=4)
+    parser.add_argument('--intents', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--reviewed-ratio', type=float, default=0.0, help='预先填写核对结果的意图比例')
+    parser.add_argument('-o', '--output', required=True)
+    args = parser.parse_args()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        write_dataset(f, args.stages, args.intents, args.seed, args.reviewed_ratio)
+    print(f"已生成 {args.output}: {args.stages} 个阶段, {args.intents} 条意图, "
+          f"{os.path.getsize(args.output) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+
+class PageCache:
+    """线程安全的有界LRU缓存，保存已渲染的响应体"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+def make_etag(*parts):
+    """根据版本信息生成强ETag的值"""
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+def request_params_key():
+    """把查询参数规范化为缓存键的一部分（与参数顺序无关）"""
+    return '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+
+
+# 压缩后的响应在 ETag 后加上编码后缀（见 serialization.compress_response）
+_ENCODING_SUFFIXES = ('', '-gzip', '-br')
+
+
+def not_modified(etag):
+    """客户端的 If-None-Match 命中时（含压缩后的ETag）返回304响应，否则返回 None"""
+    for suffix in _ENCODING_SUFFIXES:
+        if request.if_none_match.contains(etag + suffix):
+            response = Response(status=304)
+            response.set_etag(etag + suffix)
+            response.vary.add('Accept-Encoding')
+            return response
+    return None
+
+
+def cached_json(body, etag):
+    """用已渲染的JSON响应体构造带ETag的响应"""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
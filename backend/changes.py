@@ -0,0 +1,122 @@
+from sqlalchemy import delete, func, select
+
+from models import db, Change, Intent, UploadedFile
+
+# Postgres 上并发事务取得的 seq 与提交顺序不一致：seq 较小的事务可能晚提交，
+# 按 seq 读取的客户端会越过它而漏掉变更。因此 Postgres 上以写入事务的 txid 作为位置，
+# 只返回 txid 早于当前所有进行中事务（快照的 xmin）的变更，这些事务都已结束，
+# 之后不会再出现位置更小的变更；同一事务的变更总是一起返回。SQLite 同一时间只有一个写事务，
+# seq 的顺序即提交顺序，直接以 seq 作为位置。
+_PG_HORIZON = func.txid_snapshot_xmin(func.txid_current_snapshot())
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def change_position():
+    """变更日志中作为客户端位置（since/next）的列"""
+    return Change.txid if _is_postgres() else Change.seq
+
+
+def head_seq():
+    """当前最新的位置，没有变更时为0（Postgres 上为已全部结束的事务中最大的 txid）"""
+    if _is_postgres():
+        return db.session.scalar(select(_PG_HORIZON - 1))
+    return db.session.scalar(select(func.max(Change.seq))) or 0
+
+
+def cursor_expired(since):
+    """since 之后的变更是否可能已被 prune_changes 清理"""
+    if _is_postgres():
+        # 清理时留下 op 为 prune 的标记行，位置为清理到的 txid，清理后它总是位置最小的一行
+        oldest = db.session.execute(select(Change.op, Change.txid).order_by(Change.txid).limit(1)).first()
+        return oldest is not None and oldest.op == 'prune' and since < oldest.txid
+    oldest = db.session.scalar(select(func.min(Change.seq)))
+    return bool(oldest) and since + 1 < oldest
+
+
+def _feed_rows(since, file_id, limit):
+    """位置在 since 之后的变更行 [(位置, entity, entity_id)] 及是否还有更多"""
+    position = change_position()
+    stmt = select(position, Change.entity, Change.entity_id).where(position > since, Change.op != 'prune')
+    if _is_postgres():
+        stmt = stmt.where(position < _PG_HORIZON)
+    if file_id:
+        stmt = stmt.where(Change.file_id == file_id)
+    rows = db.session.execute(stmt.order_by(position, Change.seq).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if has_more and _is_postgres():
+        # 位置是事务ID，不能停在事务中间：去掉最后一个可能不完整的事务，
+        # 一个事务的变更就超过 limit 时整体返回
+        last = rows[-1][0]
+        complete = [row for row in rows if row[0] != last]
+        if complete:
+            rows = complete
+        else:
+            rows = db.session.execute(stmt.where(position == last).order_by(Change.seq)).all()
+    return rows, has_more
+
+
+def change_feed(since, file_id=None, limit=500):
+    """返回位置大于 since 的变更，同一行多次变化只返回一次当前状态
+
+    结果中 next 为本次看到的最后一个位置，客户端下次以它作为 since；
+    has_more 表示还有未返回的变更。since 早于已清理的日志或晚于最新位置
+    （如数据库被重建）时返回 reset=True，客户端需要重新获取完整数据。
+    """
+    head = head_seq()
+    if since > head or cursor_expired(since):
+        return {'files': [], 'intents': [], 'deleted_files': [], 'next': head, 'has_more': False, 'reset': True}
+
+    rows, has_more = _feed_rows(since, file_id, limit)
+
+    changed = {'intent': {}, 'file': {}}
+    for seq, entity, entity_id in rows:
+        changed[entity][entity_id] = seq
+
+    files, deleted_files = [], []
+    if changed['file']:
+        found = {f.id: f for f in UploadedFile.query.filter(UploadedFile.id.in_(changed['file']))}
+        for entity_id in changed['file']:
+            file = found.get(entity_id)
+            if file is None or not file.is_visible:
+                deleted_files.append(entity_id)
+            else:
+                files.append(file.to_dict())
+
+    intents = []
+    if changed['intent']:
+        query = Intent.query.join(UploadedFile, UploadedFile.id == Intent.file_id).filter(
+            Intent.id.in_(changed['intent']), UploadedFile.visible()
+        )
+        intents = [intent.to_dict() for intent in query.order_by(Intent.id)]
+
+    return {
+        'files': files,
+        'intents': intents,
+        'deleted_files': deleted_files,
+        'next': rows[-1][0] if rows else since,
+        'has_more': has_more,
+        'reset': False
+    }
+
+
+def prune_changes(keep):
+    """只保留最近 keep 条变更，返回删除的行数"""
+    if not _is_postgres():
+        cutoff = head_seq() - keep
+        if cutoff <= 0:
+            return 0
+        return db.session.execute(delete(Change).where(Change.seq <= cutoff)).rowcount
+    # 按 txid 整个事务地清理，并记录清理到的位置，供 cursor_expired 判断
+    cutoff = db.session.scalar(
+        select(Change.txid).where(Change.op != 'prune', Change.txid < _PG_HORIZON)
+        .order_by(Change.txid.desc()).offset(keep).limit(1)
+    )
+    if cutoff is None:
+        return 0
+    deleted = db.session.execute(delete(Change).where(Change.txid <= cutoff)).rowcount
+    db.session.add(Change(entity='prune', entity_id=0, file_id=0, op='prune', txid=cutoff))
+    return deleted
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, select, update
+
+from models import db, Intent, REVIEW_PENDING
+from counters import set_review_status
+
+
+class ReviewConflict(Exception):
+    """意图已被其他人核对（版本号不一致）或正被其他人领取"""
+
+    def __init__(self, message, intent):
+        super().__init__(message)
+        self.intent = intent
+
+
+def claimable(reviewer, now):
+    """未被领取、领取已过期或由本人领取的意图"""
+    return or_(
+        Intent.claimed_by.is_(None),
+        Intent.claim_expires_at.is_(None),
+        Intent.claim_expires_at < now,
+        Intent.claimed_by == reviewer,
+    )
+
+
+def claim_intents(file_id, reviewer, limit, lease_seconds):
+    """为核对人领取文件中最多 limit 条待核对的意图，返回领取到的意图列表
+
+    用一条 UPDATE ... WHERE id IN (SELECT ... LIMIT n) 完成领取：Postgres 上子查询带
+    FOR UPDATE SKIP LOCKED，并发领取的请求跳过彼此锁定的行而不是排队等待；
+    SQLite 的写操作本身是串行的，同一条语句即可保证不会重复领取（该方言会忽略 FOR UPDATE）。
+    本人尚未到期的领取会一并续期并计入 limit。
+    领取不改变导出内容，不增加文件版本号（否则各级缓存会随领取不断失效），
+    领取字段的变化由变更日志的触发器记录，其他核对人通过变更推送得知。
+    """
+    now = datetime.now()
+    candidates = (
+        select(Intent.id)
+        .where(Intent.file_id == file_id, Intent.review_status == REVIEW_PENDING, claimable(reviewer, now))
+        .order_by(Intent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = db.session.scalars(
+        update(Intent)
+        .where(Intent.id.in_(candidates))
+        .values(claimed_by=reviewer, claim_expires_at=now + timedelta(seconds=lease_seconds))
+        .returning(Intent)
+        .execution_options(synchronize_session=False)
+    ).all()
+    return sorted(claimed, key=lambda intent: intent.id)
+
+
+def release_claims(file_id, reviewer, ids=None):
+    """释放核对人在文件中领取的意图（ids 为空时释放全部），返回释放的数量，与领取一样不增加文件版本号"""
+    conditions = [Intent.file_id == file_id, Intent.claimed_by == reviewer]
+    if ids:
+        conditions.append(Intent.id.in_(ids))
+    released = db.session.execute(
+        update(Intent)
+        .where(*conditions)
+        .values(claimed_by=None, claim_expires_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return released
+
+
+def review_with_version(intent_id, status, values, reviewer, expected_version=None):
+    """写入单条意图的核对结果，返回更新后的意图，意图不存在时返回 None
+
+    检查与写入在同一条带条件的 UPDATE 中完成：传入 expected_version 时要求行版本号一致，
+    并且意图不能正被其他人领取。条件不满足时抛出 ReviewConflict（附带当前的意图），
+    不会出现先读后写导致后提交的结果静默覆盖前一个的情况。写入后版本号加一并释放领取。
+    """
+    now = datetime.now()
+    conditions = [Intent.id == intent_id, claimable(reviewer, now)]
+    if expected_version is not None:
+        conditions.append(Intent.version == expected_version)
+    updated = db.session.execute(
+        update(Intent)
+        .where(*conditions)
+        .values(**values, judged_by=reviewer, judge_date=now, version=Intent.version + 1,
+                claimed_by=None, claim_expires_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    intent = db.session.get(Intent, intent_id, populate_existing=True)
+    if intent is None:
+        return None
+    if not updated:
+        if expected_version is not None and intent.version != expected_version:
+            raise ReviewConflict('意图已被其他人修改，请刷新后重试', intent)
+        raise ReviewConflict(f'意图正由 {intent.claimed_by} 核对', intent)
+
+    # 状态从待核对变为已核对/直接通过时，文件的已核对数量加一
+    set_review_status(intent, status)
+    return intent
+
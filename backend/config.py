@@ -1,5 +1,7 @@
 import os
 
+from engines import engine_options
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # 检查是否在Vercel环境中
@@ -27,14 +29,93 @@ class Config:
     # Vercel环境使用/tmp目录
     if IS_VERCEL:
         UPLOAD_FOLDER = '/tmp/uploads'
+        EXPORT_FOLDER = '/tmp/exports'
         LOG_FILE = '/tmp/logs/app.log'
     else:
         UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+        EXPORT_FOLDER = os.path.join(BASE_DIR, 'exports')
         LOG_FILE = os.path.join(BASE_DIR, 'logs', 'app.log')
     
+    # 导出缓存：与上传目录放在同一位置，总大小上限（MB，0表示关闭缓存），以及等待其他请求生成导出的最长秒数
+    EXPORT_CACHE_FOLDER = os.path.join(os.path.dirname(UPLOAD_FOLDER), 'export_cache')
+    EXPORT_CACHE_MB = int(os.environ.get('EXPORT_CACHE_MB', '512'))
+    EXPORT_CACHE_BUILD_TIMEOUT = int(os.environ.get('EXPORT_CACHE_BUILD_TIMEOUT', '600'))
+    
+    # 分析快照（全部意图的列式文件）的目录，以及每批读取和写入的行数（决定内存占用）
+    SNAPSHOT_FOLDER = os.path.join(os.path.dirname(EXPORT_FOLDER), 'snapshots')
+    SNAPSHOT_BATCH_SIZE = int(os.environ.get('SNAPSHOT_BATCH_SIZE', '10000'))
+    
+    # 延迟初始化：启动时不连接数据库，第一个需要数据库的请求到来时再建表和检查迁移（Vercel冷启动默认开启）
+    LAZY_DB_INIT = os.environ.get('LAZY_DB_INIT', '1' if IS_VERCEL else '0') == '1'
+    
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,  # 检查连接是否有效
-        'pool_recycle': 300,    # 5分钟后回收连接
-    }
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    # 按数据库类型调优连接池和连接参数（SQLite 的 PRAGMA 在 engines.install_engine_events 中设置），
+    # ENGINE_PROFILE=default 时恢复原来统一的设置
+    ENGINE_PROFILE = os.environ.get('ENGINE_PROFILE', 'tuned')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, ENGINE_PROFILE)
+    # 上传大小上限（MB），流式导入后内存占用与文件大小无关，可按需调大
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_UPLOAD_MB', '256')) * 1024 * 1024
+    
+    # 内容完全相同的文件重复上传时的处理方式：reject 拒绝（409），link 返回已有文件
+    DUPLICATE_UPLOAD_POLICY = os.environ.get('DUPLICATE_UPLOAD_POLICY', 'reject')
+    
+    # 流式导入：每批插入的意图条数、每次读取的字节数
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', '1000'))
+    INGEST_CHUNK_SIZE = 64 * 1024
+    
+    # 后台任务：并发执行数（Vercel无法在响应后继续执行，设为0表示同步执行）与排队上限
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '0' if IS_VERCEL else '2'))
+    JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', '8'))
+    # 进程每隔 JOB_HEARTBEAT_SECONDS 更新本进程任务的心跳；超过 JOB_STALE_SECONDS 没有心跳的任务视为进程已退出，标记为失败
+    JOB_HEARTBEAT_SECONDS = int(os.environ.get('JOB_HEARTBEAT_SECONDS', '30'))
+    JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', '120'))
+    # 后台导出生成的文件在 EXPORT_FOLDER 中保留的秒数，0 表示不清理
+    EXPORT_TTL_SECONDS = int(os.environ.get('EXPORT_TTL_SECONDS', '3600'))
+    
+    # 软删除后后台清理时每次删除的行数（每块单独提交，避免长时间持有写锁）
+    DELETE_CHUNK_SIZE = int(os.environ.get('DELETE_CHUNK_SIZE', '5000'))
+    
+    # 核对人领取意图的默认租约秒数，以及单次最多领取的条数
+    CLAIM_LEASE_SECONDS = int(os.environ.get('CLAIM_LEASE_SECONDS', '600'))
+    CLAIM_MAX_BATCH = int(os.environ.get('CLAIM_MAX_BATCH', '100'))
+    
+    # 变更日志保留的条数（prune-changes 命令清理更早的变更）
+    CHANGE_LOG_RETENTION = int(os.environ.get('CHANGE_LOG_RETENTION', '100000'))
+    # 变更推送（SSE）轮询变更日志的间隔秒数，以及单个连接的最长秒数（到期后客户端自动重连）。
+    # 每个连接占用一个处理线程，每个进程同时最多 CHANGE_STREAM_MAX 个连接，超出时返回503，客户端改为轮询 /api/changes
+    CHANGE_POLL_SECONDS = float(os.environ.get('CHANGE_POLL_SECONDS', '1'))
+    CHANGE_STREAM_SECONDS = int(os.environ.get('CHANGE_STREAM_SECONDS', '20'))
+    CHANGE_STREAM_MAX = int(os.environ.get('CHANGE_STREAM_MAX', '4'))
+    
+    # 近似重复检测：上传时是否为意图建立 MinHash 分桶，以及默认的相似度阈值（字符片段的 Jaccard 相似度）
+    SIMILARITY_INDEX = os.environ.get('SIMILARITY_INDEX', '1') == '1'
+    SIMILARITY_THRESHOLD = float(os.environ.get('SIMILARITY_THRESHOLD', '0.6'))
+    # 查找近似重复簇时每个分桶最多处理的意图条数
+    SIMILARITY_MAX_BUCKET = int(os.environ.get('SIMILARITY_MAX_BUCKET', '1000'))
+    
+    # 列表和导出响应的压缩：小于该字节数的响应不压缩，gzip 压缩级别和 brotli 质量（安装 brotli 时使用）
+    COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+    GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+    BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+    
+    # 不指定 file_id 搜索少于3个字符的关键词时（用不上 trigram 索引），每次请求最多扫描的意图ID跨度，
+    # 范围内不足一页时返回已找到的结果和继续扫描的游标
+    SEARCH_SCAN_ROWS = int(os.environ.get('SEARCH_SCAN_ROWS', '50000'))
+    
+    # 意图分页响应的进程内LRU缓存条数，0表示关闭
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', '256'))
+    
+    # 日志：text 为原有的文本格式，json 为每行一个JSON对象
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    # 日志文件轮转：LOG_ROTATE_WHEN 为空时按大小轮转，否则按时间轮转（如 midnight、H）
+    LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_MB', '10')) * 1024 * 1024
+    LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN', '')
+    LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', '5'))
+    # 高频读接口（意图列表、详情、搜索等）的日志采样比例，1 表示全部记录，0 表示不记录
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1'))
+    
+    # 处理时间超过该值（毫秒）的请求记录慢请求日志（含SQL明细），0表示关闭
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', '0'))
+    
+    # 流式导出：每次从数据库游标读取的行数
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
@@ -0,0 +1,82 @@
+from sqlalchemy import bindparam, case, func, select, update
+
+from models import db, UploadedFile, Intent, REVIEW_PENDING, StepItem
+
+
+def touch_file(file_id, reviewed_delta=0):
+    """记录文件内容发生变化：版本号加一，并原子地增减已核对数量，不读取当前值"""
+    values = {'version': func.coalesce(UploadedFile.version, 0) + 1}
+    if reviewed_delta:
+        values['reviewed_items'] = func.coalesce(UploadedFile.reviewed_items, 0) + reviewed_delta
+    db.session.execute(
+        update(UploadedFile)
+        .where(UploadedFile.id == file_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def set_review_status(intent, status):
+    """修改意图的核对状态并递增文件版本，只有进出待核对状态时才更新文件计数
+
+    状态切换通过带条件的 UPDATE 完成，并发请求同时核对同一条意图时
+    只有一个能命中，计数不会被重复累加。
+    """
+    if status == REVIEW_PENDING:
+        condition = Intent.review_status != REVIEW_PENDING
+        delta = -1
+    else:
+        condition = Intent.review_status == REVIEW_PENDING
+        delta = 1
+    result = db.session.execute(
+        update(Intent)
+        .where(Intent.id == intent.id, condition)
+        .values(review_status=status)
+        .execution_options(synchronize_session=False)
+    )
+    intent.review_status = status
+    touch_file(intent.file_id, delta if result.rowcount else 0)
+
+
+def reconcile_counters():
+    """用 GROUP BY 重新计算所有文件的 total_items/reviewed_items，返回修正的文件数"""
+    rows = db.session.execute(
+        select(
+            Intent.file_id,
+            func.count(Intent.id),
+            func.sum(case(
+                (Intent.review_status != REVIEW_PENDING, 1),
+                else_=0
+            ))
+        ).group_by(Intent.file_id)
+    ).all()
+    actual = {file_id: (total, reviewed or 0) for file_id, total, reviewed in rows}
+    # 非意图步骤的文件只有条目数，没有核对数
+    for file_id, total in db.session.execute(
+        select(StepItem.file_id, func.count(StepItem.id)).group_by(StepItem.file_id)
+    ):
+        actual[file_id] = (total, 0)
+
+    fixes = []
+    for file_id, total, reviewed in db.session.execute(
+        select(UploadedFile.id, UploadedFile.total_items, UploadedFile.reviewed_items)
+    ):
+        expected = actual.get(file_id, (0, 0))
+        if (total, reviewed) != expected:
+            fixes.append({
+                'b_id': file_id,
+                'b_total': expected[0],
+                'b_reviewed': expected[1]
+            })
+
+    if fixes:
+        table = UploadedFile.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.id == bindparam('b_id'))
+            .values(total_items=bindparam('b_total'), reviewed_items=bindparam('b_reviewed'),
+                    version=func.coalesce(table.c.version, 0) + 1),
+            fixes
+        )
+    db.session.commit()
+    return len(fixes)
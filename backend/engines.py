@@ -0,0 +1,95 @@
+import os
+import sqlite3
+from urllib.parse import urlsplit
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 引擎配置方案：tuned 按数据库类型调优，default 为原来统一的连接池设置（用于对比测试）
+ENGINE_PROFILES = ('tuned', 'default')
+
+# Supabase 事务模式连接池（pgbouncer/Supavisor）的端口
+PGBOUNCER_PORTS = (6543,)
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, str(default)))
+
+
+def sqlite_pragmas():
+    """每个 SQLite 连接建立时执行的 PRAGMA
+
+    WAL 下读写互不阻塞，synchronous=NORMAL 在 WAL 下只在检查点时 fsync，
+    busy_timeout 让写冲突时等待而不是立即报 database is locked。
+    """
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'mmap_size': _env_int('SQLITE_MMAP_SIZE_MB', 256) * 1024 * 1024,
+        # 负数表示以KiB为单位
+        'cache_size': -_env_int('SQLITE_CACHE_SIZE_MB', 64) * 1024,
+        'temp_store': 'MEMORY',
+    }
+
+
+def is_pgbouncer(uri):
+    """是否通过事务模式连接池连接 Postgres（PG_PGBOUNCER 可显式指定）"""
+    flag = os.environ.get('PG_PGBOUNCER')
+    if flag is not None:
+        return flag == '1'
+    try:
+        return urlsplit(uri).port in PGBOUNCER_PORTS
+    except ValueError:
+        return False
+
+
+def engine_options(uri, profile='tuned'):
+    """按数据库类型生成 SQLALCHEMY_ENGINE_OPTIONS"""
+    if profile == 'default':
+        return {
+            'pool_pre_ping': True,  # 检查连接是否有效
+            'pool_recycle': 300,    # 5分钟后回收连接
+        }
+
+    if uri.startswith('sqlite'):
+        # 本地文件无需检查连接是否断开；timeout 为驱动层等待写锁的秒数
+        options = {}
+        if ':memory:' not in uri:
+            options['connect_args'] = {'timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000}
+        return options
+
+    options = {
+        'pool_size': _env_int('PG_POOL_SIZE', 5),
+        'max_overflow': _env_int('PG_MAX_OVERFLOW', 10),
+        'pool_timeout': _env_int('PG_POOL_TIMEOUT', 10),
+        # 在 Supabase 回收空闲连接之前主动回收，默认不再每次取连接都 ping 一次
+        'pool_recycle': _env_int('PG_POOL_RECYCLE', 280),
+        'pool_pre_ping': os.environ.get('PG_POOL_PRE_PING', '0') == '1',
+        # 优先复用最近用过的连接，多余的空闲连接会自然过期
+        'pool_use_lifo': True,
+    }
+    connect_args = {'connect_timeout': _env_int('PG_CONNECT_TIMEOUT', 10)}
+    if not is_pgbouncer(uri):
+        # 事务模式连接池不支持启动参数，超时需在数据库角色上设置（ALTER ROLE ... SET statement_timeout）
+        connect_args['options'] = (
+            f"-c statement_timeout={_env_int('PG_STATEMENT_TIMEOUT_MS', 30000)} "
+            f"-c idle_in_transaction_session_timeout={_env_int('PG_IDLE_TX_TIMEOUT_MS', 60000)}"
+        )
+    options['connect_args'] = connect_args
+    return options
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas().items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+
+def install_engine_events(profile='tuned'):
+    """注册连接建立时的事件，tuned 方案下为 SQLite 连接设置 PRAGMA"""
+    if profile == 'tuned' and not event.contains(Engine, 'connect', _apply_sqlite_pragmas):
+        event.listen(Engine, 'connect', _apply_sqlite_pragmas)
@@ -0,0 +1,165 @@
+import os
+import time
+import uuid
+import zlib
+from collections import namedtuple
+
+from caching import make_etag
+from config import Config
+from logger import logger
+from storage import remove_upload
+
+# 缓存的导出文件：未压缩内容、gzip压缩后的内容、未压缩内容的ETag，以及本次是否直接命中已有的缓存
+Artefact = namedtuple('Artefact', ['path', 'gzip_path', 'etag', 'hit'])
+
+
+class ExportCache:
+    """导出内容的磁盘缓存，按 (文件ID, 格式, 文件版本) 保存渲染好的导出文件
+
+    文件有核对等变化时版本号递增，旧版本的导出不会再命中，生成新版本时一并删除。
+    总大小超过上限时按最近访问时间（文件的 mtime，命中时更新）淘汰最久未用的导出。
+    同一导出只由一个请求生成（用锁文件，多进程部署时同样有效），其他请求等待生成完成后直接读取。
+    访问时间只记录在 gzip 文件上，未压缩文件的 mtime 保持为生成时间（见 built_at）。
+    """
+
+    def __init__(self, folder, max_bytes, build_timeout=600):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.build_timeout = build_timeout
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, file, export_format, build):
+        """返回文件当前版本的导出，不存在时调用 build() 得到内容块的生成器并写入缓存"""
+        state = (file.version, file.created_at.isoformat())
+        etag = make_etag('export', file.id, export_format, *state)
+        name = f'{file.id}_{etag[:20]}.{export_format}'
+        artefact = Artefact(os.path.join(self.folder, name), os.path.join(self.folder, name + '.gz'), etag, True)
+        if self._ready(artefact):
+            self._touch(artefact)
+            return artefact
+
+        os.makedirs(self.folder, exist_ok=True)
+        lock_path = os.path.join(self.folder, f'.{name}.lock')
+        if not self._acquire(lock_path, artefact):
+            # 等待期间已由其他请求生成
+            self._touch(artefact)
+            return artefact
+        try:
+            if self._ready(artefact):
+                return artefact
+            start = time.perf_counter()
+            size = self._write(artefact, build())
+            logger.info(f"生成导出缓存: {name}, {size} 字节, 耗时 {time.perf_counter() - start:.2f}s")
+        finally:
+            remove_upload(lock_path)
+        self._remove_versions(file.id, export_format, keep=name)
+        self._evict(keep=name)
+        return artefact._replace(hit=False)
+
+    def discard(self, file_id):
+        """删除文件的全部导出缓存（删除文件时调用）"""
+        for entry in self._entries():
+            if entry.name.startswith(f'{file_id}_'):
+                remove_upload(entry.path)
+
+    @staticmethod
+    def _ready(artefact):
+        # gzip 文件最后写入，存在时两个文件都已完整
+        return os.path.exists(artefact.gzip_path)
+
+    @staticmethod
+    def built_at(artefact):
+        """导出生成的时间（即内容中 exported_at 的时间），作为响应的 Last-Modified"""
+        return os.path.getmtime(artefact.path)
+
+    @staticmethod
+    def _touch(artefact):
+        # _evict 按一组文件中最新的 mtime 判断访问时间，只更新 gzip 文件即可
+        try:
+            os.utime(artefact.gzip_path)
+        except OSError:
+            pass
+
+    def _acquire(self, lock_path, artefact):
+        """取得生成锁时返回 True；等待期间导出已被其他请求生成时返回 False"""
+        deadline = time.monotonic() + self.build_timeout
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                pass
+            if self._ready(artefact):
+                return False
+            try:
+                if time.time() - os.path.getmtime(lock_path) > self.build_timeout:
+                    # 生成进程异常退出时遗留的锁
+                    remove_upload(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError('等待导出生成超时')
+            time.sleep(0.1)
+
+    def _write(self, artefact, chunks):
+        """边生成边写入未压缩和gzip压缩的临时文件，完成后改名，返回未压缩的字节数"""
+        suffix = f'.tmp-{uuid.uuid4().hex}'
+        tmp_path, tmp_gzip_path = artefact.path + suffix, artefact.gzip_path + suffix
+        compressor = zlib.compressobj(Config.GZIP_LEVEL, zlib.DEFLATED, 31)
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as raw, open(tmp_gzip_path, 'wb') as gz:
+                for chunk in chunks:
+                    data = chunk.encode('utf-8')
+                    raw.write(data)
+                    gz.write(compressor.compress(data))
+                    size += len(data)
+                gz.write(compressor.flush())
+            os.replace(tmp_path, artefact.path)
+            os.replace(tmp_gzip_path, artefact.gzip_path)
+        except BaseException:
+            remove_upload(tmp_path)
+            remove_upload(tmp_gzip_path)
+            raise
+        return size
+
+    def _entries(self):
+        try:
+            with os.scandir(self.folder) as entries:
+                return [e for e in entries if e.is_file() and not e.name.startswith('.') and '.tmp-' not in e.name]
+        except FileNotFoundError:
+            return []
+
+    def _remove_versions(self, file_id, export_format, keep):
+        """删除同一文件、同一格式的旧版本导出"""
+        for entry in self._entries():
+            stem = entry.name[:-3] if entry.name.endswith('.gz') else entry.name
+            if stem != keep and stem.startswith(f'{file_id}_') and stem.endswith(f'.{export_format}'):
+                remove_upload(entry.path)
+
+    def _evict(self, keep):
+        """总大小超过上限时，从最久未访问的导出开始删除（不删除刚生成的 keep）"""
+        groups = {}
+        for entry in self._entries():
+            stat = entry.stat()
+            stem = entry.name[:-3] if entry.name.endswith('.gz') else entry.name
+            size, mtime, paths = groups.get(stem, (0, 0, []))
+            groups[stem] = (size + stat.st_size, max(mtime, stat.st_mtime), paths + [entry.path])
+        total = sum(size for size, _, _ in groups.values())
+        for stem, (size, _, paths) in sorted(groups.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            if stem == keep:
+                continue
+            for path in paths:
+                remove_upload(path)
+            total -= size
+            logger.info(f"淘汰导出缓存: {stem}")
+
+
+export_cache = ExportCache(Config.EXPORT_CACHE_FOLDER, Config.EXPORT_CACHE_MB * 1024 * 1024,
+                           Config.EXPORT_CACHE_BUILD_TIMEOUT)
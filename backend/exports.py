@@ -0,0 +1,216 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from models import db, Intent, StepItem, format_datetime
+from serialization import dumps, dumps_indent
+
+EXPORT_FORMATS = ('json', 'csv', 'ndjson')
+
+EXPORT_MIMETYPES = {
+    'json': 'application/json; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+CSV_HEADER = [
+    '意图ID', '阶段', '类别', '原始内容',
+    '核对结果', '核对人', '修改后内容', '核对时间', '核对状态'
+]
+
+ITEM_CSV_HEADER = ['条目ID', '阶段', '类型', '主语', '谓语', '宾语', '内容']
+
+# 导出时读取的列，顺序与 _row_to_item 一致
+_EXPORT_COLUMNS = (
+    Intent.intent_id, Intent.stage, Intent.category, Intent.original_comment,
+    Intent.judgement, Intent.judged_by, Intent.modified_content,
+    Intent.judge_date, Intent.review_status
+)
+
+
+def iter_row_batches(file_id, batch_size=1000, stage=None, on_rows=None):
+    """通过服务端游标（yield_per）按批读取意图行，内存中最多保留一批
+
+    on_rows(n) 在每批读取后以该批行数调用，可用于上报进度。
+    """
+    stmt = select(*_EXPORT_COLUMNS).where(Intent.file_id == file_id)
+    if stage is not None:
+        stmt = stmt.where(Intent.stage == stage)
+    return _iter_batches(stmt.order_by(Intent.id), batch_size, on_rows)
+
+
+def iter_item_batches(file_id, batch_size=1000, stage=None, on_rows=None):
+    """按批读取通用条目行，用法同 iter_row_batches"""
+    stmt = select(
+        StepItem.item_id, StepItem.stage, StepItem.item_type,
+        StepItem.subject, StepItem.predicate, StepItem.object, StepItem.data
+    ).where(StepItem.file_id == file_id)
+    if stage is not None:
+        stmt = stmt.where(StepItem.stage == stage)
+    return _iter_batches(stmt.order_by(StepItem.id), batch_size, on_rows)
+
+
+def _iter_batches(stmt, batch_size, on_rows):
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    try:
+        for batch in result.partitions():
+            if on_rows:
+                on_rows(len(batch))
+            yield batch
+    finally:
+        result.close()
+
+
+def _row_to_item(row):
+    return {
+        'id': row.intent_id,
+        'category': row.category,
+        'original_comment': row.original_comment,
+        'judgement': row.judgement,
+        'judged_by': row.judged_by,
+        'modified_content': row.modified_content,
+        'judge_date': format_datetime(row.judge_date)
+    }
+
+
+def export_metadata(file):
+    metadata = {
+        'source_file': file.source_file,
+        'created_at': file.created_at.strftime('%Y-%m-%d'),
+        'exported_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'total_items': file.total_items,
+        'reviewed_items': file.reviewed_items,
+        'judgement_options': ['通过', '需修改', '删除', '待定']
+    }
+    if file.stores_items:
+        metadata['step_type'] = file.step_type
+        del metadata['judgement_options']
+    return metadata
+
+
+def _indent(text, prefix):
+    return text.replace('\n', '\n' + prefix)
+
+
+def generate_csv(file_id, batch_size=1000, on_rows=None):
+    """逐批生成CSV内容，开头带BOM以便Excel识别UTF-8编码"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    output.write('\ufeff')
+    writer.writerow(CSV_HEADER)
+    for batch in iter_row_batches(file_id, batch_size, on_rows=on_rows):
+        for row in batch:
+            writer.writerow([
+                row.intent_id,
+                row.stage,
+                row.category,
+                row.original_comment,
+                row.judgement,
+                row.judged_by,
+                row.modified_content,
+                format_datetime(row.judge_date),
+                row.review_status
+            ])
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate()
+    yield output.getvalue()
+
+
+def generate_json(file, batch_size=1000, on_rows=None):
+    """按阶段逐个生成JSON内容，输出与一次性 json.dumps(indent=2) 的结果一致"""
+    yield '{\n  "metadata": '
+    yield _indent(json.dumps(export_metadata(file), ensure_ascii=False, indent=2), '  ')
+
+    for stage in _stages(Intent, file.id):
+        yield f',\n  {json.dumps(stage, ensure_ascii=False)}: ['
+        first = True
+        for batch in iter_row_batches(file.id, batch_size, stage=stage, on_rows=on_rows):
+            parts = []
+            for row in batch:
+                item = dumps_indent(_row_to_item(row))
+                parts.append(('\n    ' if first else ',\n    ') + _indent(item, '    '))
+                first = False
+            yield ''.join(parts)
+        yield '\n  ]'
+    yield '\n}'
+
+
+def generate_ndjson(file_id, batch_size=1000, on_rows=None):
+    """每行一条意图记录，便于下游逐行处理"""
+    for batch in iter_row_batches(file_id, batch_size, on_rows=on_rows):
+        lines = []
+        for row in batch:
+            item = _row_to_item(row)
+            item['stage'] = row.stage
+            item['review_status'] = row.review_status
+            lines.append(dumps(item).decode('utf-8'))
+        lines.append('')
+        yield '\n'.join(lines)
+
+
+def _stages(model, file_id):
+    """文件中的阶段，按首次出现的顺序"""
+    return db.session.execute(
+        select(model.stage)
+        .where(model.file_id == file_id)
+        .group_by(model.stage)
+        .order_by(func.min(model.id))
+    ).scalars().all()
+
+
+def generate_items_csv(file_id, batch_size=1000, on_rows=None):
+    """通用条目的CSV，内容列为原始条目的JSON"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    output.write('\ufeff')
+    writer.writerow(ITEM_CSV_HEADER)
+    for batch in iter_item_batches(file_id, batch_size, on_rows=on_rows):
+        writer.writerows(batch)
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate()
+    yield output.getvalue()
+
+
+def generate_items_json(file, batch_size=1000, on_rows=None):
+    """按上传时的结构输出通用条目，条目直接使用保存的JSON文本，不再重新序列化"""
+    yield '{\n  "metadata": '
+    yield _indent(json.dumps(export_metadata(file), ensure_ascii=False, indent=2), '  ')
+    for stage in _stages(StepItem, file.id):
+        yield f',\n  {json.dumps(stage, ensure_ascii=False)}: ['
+        first = True
+        for batch in iter_item_batches(file.id, batch_size, stage=stage, on_rows=on_rows):
+            parts = []
+            for row in batch:
+                parts.append(('\n    ' if first else ',\n    ') + row.data)
+                first = False
+            yield ''.join(parts)
+        yield '\n  ]'
+    yield '\n}'
+
+
+def generate_items_ndjson(file_id, batch_size=1000, on_rows=None):
+    """每行一条通用条目：{"stage": 阶段, "data": 原始条目}"""
+    for batch in iter_item_batches(file_id, batch_size, on_rows=on_rows):
+        lines = [f'{{"stage": {json.dumps(row.stage, ensure_ascii=False)}, "data": {row.data}}}' for row in batch]
+        lines.append('')
+        yield '\n'.join(lines)
+
+
+def generate_export(file, export_format, batch_size=1000, on_rows=None):
+    """按格式返回导出内容的生成器"""
+    if file.stores_items:
+        if export_format == 'csv':
+            return generate_items_csv(file.id, batch_size, on_rows)
+        if export_format == 'ndjson':
+            return generate_items_ndjson(file.id, batch_size, on_rows)
+        return generate_items_json(file, batch_size, on_rows)
+    if export_format == 'csv':
+        return generate_csv(file.id, batch_size, on_rows)
+    if export_format == 'ndjson':
+        return generate_ndjson(file.id, batch_size, on_rows)
+    return generate_json(file, batch_size, on_rows)
@@ -0,0 +1,231 @@
+import codecs
+import hashlib
+import json
+
+from models import db, Intent, StepItem, ITEM_KEY_LENGTH
+
+# 顶层键之间、数组元素之间允许出现的空白字符
+_WHITESPACE = ' \t\r\n'
+
+
+class JsonStream:
+    """增量JSON读取器：按块读取文件，逐个解析顶层对象中的值和数组元素
+
+    缓冲区只保留尚未消费的部分，因此内存占用取决于单个元素的大小，
+    与整个文件的大小无关。
+    """
+
+    def __init__(self, fp, chunk_size=64 * 1024, max_value_size=16 * 1024 * 1024):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.max_value_size = max_value_size
+        self.decoder = json.JSONDecoder()
+        # utf-8-sig 可以兼容带BOM的文件
+        self.text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self):
+        """读取下一块数据，到达文件末尾时返回False"""
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        self.bytes_read += len(chunk)
+        if not chunk:
+            self.eof = True
+            self.buf = self.buf[self.pos:] + self.text_decoder.decode(b'', final=True)
+        else:
+            self.buf = self.buf[self.pos:] + self.text_decoder.decode(chunk)
+        self.pos = 0
+        return True
+
+    def _error(self, msg):
+        return json.JSONDecodeError(msg, self.buf, self.pos)
+
+    def peek(self):
+        """跳过空白，返回下一个字符（文件结束时返回空字符串）"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise self._error(f"Expecting '{ch}'")
+        self.pos += 1
+
+    def value(self):
+        """解析一个完整的JSON值，数据不足时继续读取"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # 单个值过大或格式错误时不再无限读取，避免内存失控
+                if len(self.buf) - self.pos > self.max_value_size or not self._fill():
+                    raise
+                continue
+            # 数字等标量可能恰好被块边界截断，需要读到更多数据再确认
+            if end == len(self.buf) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+    def _next_separator(self, close):
+        ch = self.peek()
+        if ch == ',':
+            self.pos += 1
+            return False
+        if ch == close:
+            self.pos += 1
+            return True
+        raise self._error(f"Expecting ',' or '{close}'")
+
+    def iter_top_level(self):
+        """遍历顶层对象，产出 (key, value, is_item)
+
+        顶层值为数组时，逐个产出其元素（is_item=True），不会把整个数组载入内存；
+        其他值整体产出（is_item=False）。
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise self._error('Expecting property name')
+            self.expect(':')
+            if self.peek() == '[':
+                self.pos += 1
+                if self.peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self.value(), True
+                        if self._next_separator(']'):
+                            break
+            else:
+                yield key, self.value(), False
+            if self._next_separator('}'):
+                break
+        if self.peek() != '':
+            raise self._error('Extra data')
+
+
+def iter_intent_rows(stream, file_id, metadata):
+    """从JSON流中提取意图行，metadata会被就地填充"""
+    for key, value, is_item in stream.iter_top_level():
+        if key == 'metadata':
+            if isinstance(value, dict):
+                metadata.update(value)
+            continue
+        if not is_item or not isinstance(value, dict) or 'id' not in value:
+            continue
+        comment = value.get('original_comment', '')
+        yield {
+            'file_id': file_id,
+            'intent_id': value.get('id', ''),
+            'stage': key,
+            'category': value.get('category', ''),
+            'original_comment': comment,
+            'comment_hash': comment_hash(comment),
+            'judgement': value.get('judgement', ''),
+            'judged_by': value.get('judged_by', ''),
+            'modified_content': value.get('modified_content', ''),
+            'review_status': '待核对'
+        }
+
+
+def comment_hash(comment):
+    """原始内容的 md5（与 Postgres 的 md5(text) 结果相同），非字符串时按JSON文本计算"""
+    if not isinstance(comment, str):
+        comment = json.dumps(comment, ensure_ascii=False)
+    return hashlib.md5(comment.encode('utf-8')).hexdigest()
+
+
+def _item_key(value):
+    """把条目字段转为可建索引的字符串，过长时截断"""
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False)
+    return value[:ITEM_KEY_LENGTH]
+
+
+def iter_item_rows(stream, file_id, metadata):
+    """从JSON流中提取通用条目行，原始条目完整保存在 data 中，metadata会被就地填充"""
+    for key, value, is_item in stream.iter_top_level():
+        if key == 'metadata':
+            if isinstance(value, dict):
+                metadata.update(value)
+            continue
+        if not is_item:
+            continue
+        fields = value if isinstance(value, dict) else {}
+        yield {
+            'file_id': file_id,
+            'item_id': _item_key(fields.get('id', '')),
+            'stage': key,
+            'item_type': _item_key(fields.get('type', fields.get('category', ''))),
+            'subject': _item_key(fields.get('subject')),
+            'predicate': _item_key(fields.get('predicate')),
+            'object': _item_key(fields.get('object')),
+            'data': json.dumps(value, ensure_ascii=False)
+        }
+
+
+def bulk_insert(table, rows, batch_size=1000, on_batch=None):
+    """按固定批次通过 executemany 批量插入，返回插入行数
+
+    on_batch(count) 在每批写入后调用，可用于上报进度。
+    """
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(table.insert(), batch)
+            count += len(batch)
+            batch = []
+            if on_batch:
+                on_batch(count)
+    if batch:
+        db.session.execute(table.insert(), batch)
+        count += len(batch)
+        if on_batch:
+            on_batch(count)
+    return count
+
+
+def ingest_intents(fp, file_id, batch_size=1000, chunk_size=64 * 1024, on_progress=None):
+    """流式解析意图文件并批量写入，返回 (意图数量, metadata)
+
+    on_progress(bytes_read) 在每批写入后调用。
+    """
+    return _ingest(Intent.__table__, iter_intent_rows, fp, file_id, batch_size, chunk_size, on_progress)
+
+
+def ingest_items(fp, file_id, batch_size=1000, chunk_size=64 * 1024, on_progress=None):
+    """流式解析非意图步骤的文件并批量写入 step_items，返回 (条目数量, metadata)"""
+    return _ingest(StepItem.__table__, iter_item_rows, fp, file_id, batch_size, chunk_size, on_progress)
+
+
+def _ingest(table, iter_rows, fp, file_id, batch_size, chunk_size, on_progress):
+    metadata = {}
+    stream = JsonStream(fp, chunk_size=chunk_size)
+    count = bulk_insert(
+        table,
+        iter_rows(stream, file_id, metadata),
+        batch_size=batch_size,
+        on_batch=(lambda _: on_progress(stream.bytes_read)) if on_progress else None
+    )
+    return count, metadata
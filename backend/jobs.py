@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import update
+
+from models import db, Job
+from logger import logger
+
+
+class JobQueueFull(Exception):
+    """排队中的任务已达上限"""
+
+
+class JobContext:
+    """传给任务函数的上下文，用于上报进度"""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.job_id = job_id
+
+    def update(self, progress, total=None):
+        if total is None and self.job_id in self.runner.progress:
+            total = self.runner.progress[self.job_id][1]
+        self.runner.progress[self.job_id] = (progress, total)
+
+
+class JobRunner:
+    """本地后台任务执行器：有界线程池 + jobs 表
+
+    进度保存在内存中，只在状态变化时写入数据库，避免与任务本身的写事务争用锁。
+    workers 为0时（如Vercel无法在响应后继续执行）任务在提交时同步执行。
+    本进程排队中和运行中的任务由心跳线程定期更新 heartbeat_at，进程退出后心跳停止，
+    其他进程（或重启后的进程）据此把这些任务标记为失败（见 tasks.fail_stale_jobs）。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.executor = None
+        self.slots = None
+        self.progress = {}
+        self.active = set()
+        self.heartbeat_thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        workers = app.config.get('JOB_WORKERS', 2)
+        if workers > 0:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        # 运行中与排队中的任务总数上限，超出时拒绝提交
+        self.slots = threading.BoundedSemaphore(max(workers, 1) + app.config.get('JOB_MAX_PENDING', 8))
+
+    def submit(self, kind, fn, *args, file_id=None, total=0):
+        """创建任务记录并交给线程池执行，返回任务ID
+
+        fn 的第一个参数为 JobContext，返回值（可JSON序列化）作为任务结果。
+        """
+        if not self.slots.acquire(blocking=False):
+            raise JobQueueFull('后台任务过多，请稍后重试')
+        try:
+            job = Job(id=uuid.uuid4().hex, kind=kind, status='pending', file_id=file_id, total=total,
+                      heartbeat_at=datetime.now())
+            db.session.add(job)
+            db.session.commit()
+            job_id = job.id
+        except Exception:
+            self.slots.release()
+            raise
+        self.active.add(job_id)
+
+        if self.executor is None:
+            self._run(job_id, fn, args)
+        else:
+            self.executor.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def _run(self, job_id, fn, args):
+        with self.app.app_context():
+            try:
+                now = datetime.now()
+                self._set_status(job_id, 'running', started_at=now, heartbeat_at=now)
+                result = fn(JobContext(self, job_id), *args)
+                self._set_status(
+                    job_id, 'succeeded',
+                    result=json.dumps(result, ensure_ascii=False) if result is not None else '',
+                    finished_at=datetime.now()
+                )
+                logger.info(f"后台任务完成: {job_id}")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"后台任务失败: {job_id}, {str(e)}")
+                self._set_status(job_id, 'failed', message=str(e), finished_at=datetime.now())
+            finally:
+                self.progress.pop(job_id, None)
+                self.active.discard(job_id)
+                self.slots.release()
+                db.session.remove()
+
+    def _set_status(self, job_id, status, **values):
+        job = db.session.get(Job, job_id)
+        job.status = status
+        for key, value in values.items():
+            setattr(job, key, value)
+        if job_id in self.progress:
+            job.progress, total = self.progress[job_id]
+            if total is not None:
+                job.total = total
+        db.session.commit()
+
+    def start_heartbeat(self, interval, on_tick=None):
+        """启动心跳线程（每个进程一个）：每隔 interval 秒更新本进程任务的心跳，然后调用 on_tick()
+
+        fork 出的子进程（如 gunicorn --preload 的 worker）中父进程的线程不再运行，会重新启动。
+        """
+        if (self.heartbeat_thread is not None and self.heartbeat_thread.is_alive()) or interval <= 0:
+            return
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, args=(interval, on_tick),
+                                                 name='job-heartbeat', daemon=True)
+        self.heartbeat_thread.start()
+
+    def _heartbeat_loop(self, interval, on_tick):
+        while True:
+            time.sleep(interval)
+            with self.app.app_context():
+                try:
+                    self.heartbeat()
+                    if on_tick:
+                        on_tick()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning(f"任务心跳失败: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    def heartbeat(self):
+        """更新本进程排队中和运行中任务的心跳时间"""
+        job_ids = list(self.active)
+        if job_ids:
+            db.session.execute(update(Job).where(Job.id.in_(job_ids)).values(heartbeat_at=datetime.now()))
+            db.session.commit()
+
+    def get(self, job_id):
+        """返回任务信息，进度优先使用内存中的最新值"""
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return None
+        data = job.to_dict()
+        if job_id in self.progress:
+            progress, total = self.progress[job_id]
+            data['progress'] = progress
+            if total is not None:
+                data['total'] = total
+            data['percent'] = round(progress * 100 / data['total'], 1) if data['total'] else None
+        return data
+
+
+job_runner = JobRunner()
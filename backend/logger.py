@@ -1,44 +1,131 @@
+import atexit
+import json
 import logging
 import os
+import queue
+import random
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON，便于日志平台检索"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """对标记为 sampled 的高频日志按比例采样，其余日志不受影响
+
+    作为 logger 的过滤器在调用线程中执行，被丢弃的日志不会进入队列。
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False) or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """只把日志记录放入队列，消息拼接和异常堆栈的格式化都交给监听线程
+
+    标准 QueueHandler.prepare 在调用线程中格式化整条日志；这里的队列只在进程内使用，
+    记录不需要序列化，原样放入即可。日志参数在记录之后不应再被修改。
+    """
+
+    def prepare(self, record):
+        return record
+
+
+# 高频读接口的日志传入 extra=SAMPLED 参与采样
+SAMPLED = {'sampled': True}
+
+
+def create_file_handler(config):
+    """按配置创建按大小或按时间轮转的文件handler"""
+    if config.LOG_ROTATE_WHEN:
+        return TimedRotatingFileHandler(
+            config.LOG_FILE, when=config.LOG_ROTATE_WHEN,
+            backupCount=config.LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    return RotatingFileHandler(
+        config.LOG_FILE, maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT, encoding='utf-8'
+    )
+
 
 def setup_logger():
-    """设置日志记录器"""
+    """设置日志记录器
+
+    请求线程只把日志记录放入队列（不做格式化），由后台监听线程负责格式化输出和写文件。
+    高频路径上的日志使用 %s 占位符传参，被级别或采样过滤掉的日志不会拼接字符串。
+    """
+    from config import Config
+
     # 创建logger
     logger = logging.getLogger('ontology_review')
     logger.setLevel(logging.DEBUG)
     
+    # 避免重复添加handler
+    if logger.handlers:
+        return logger
+    
     # 检查是否在Vercel环境中
     is_vercel = os.environ.get('VERCEL') == '1'
     
+    # 创建格式化器
+    if Config.LOG_FORMAT == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+    
     # 创建控制台handler（总是需要）
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    
-    # 创建格式化器
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
     console_handler.setFormatter(formatter)
+    handlers = [console_handler]
+    
+    # 只在非Vercel环境下添加文件handler
+    file_error = None
+    if not is_vercel:
+        try:
+            log_dir = os.path.dirname(Config.LOG_FILE)
+            if log_dir and not os.path.exists(log_dir):
+                os.makedirs(log_dir)
+            file_handler = create_file_handler(Config)
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+        except Exception as e:
+            file_error = e
+    
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # 进程退出时写完队列中剩余的日志
+    atexit.register(listener.stop)
+    
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    logger.addFilter(SamplingFilter(Config.LOG_SAMPLE_RATE))
     
-    # 添加handler到logger
-    if not logger.handlers:  # 避免重复添加handler
-        logger.addHandler(console_handler)
-        
-        # 只在非Vercel环境下添加文件handler
-        if not is_vercel:
-            try:
-                from config import Config
-                log_dir = os.path.dirname(Config.LOG_FILE)
-                if log_dir and not os.path.exists(log_dir):
-                    os.makedirs(log_dir)
-                file_handler = logging.FileHandler(Config.LOG_FILE, encoding='utf-8')
-                file_handler.setLevel(logging.DEBUG)
-                file_handler.setFormatter(formatter)
-                logger.addHandler(file_handler)
-            except Exception as e:
-                logger.warning(f"无法创建文件日志: {e}")
+    if file_error is not None:
+        logger.warning(f"无法创建文件日志: {file_error}")
     
     return logger
 
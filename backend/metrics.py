@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from logger import logger
+
+# 请求耗时与SQL耗时直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 每个请求SQL条数直方图的桶上限
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+# 慢请求日志中列出的最耗时SQL条数
+SLOW_LOG_TOP_QUERIES = 5
+
+
+class Histogram:
+    """累计直方图，输出格式与 Prometheus histogram 一致"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+def _labels(names, values):
+    return ','.join(f'{n}="{v}"' for n, v in zip(names, values))
+
+
+class Metrics:
+    """进程内的请求与SQL指标，以 Prometheus 文本格式导出
+
+    按 (endpoint, method) 统计耗时、响应大小和SQL次数/耗时，按状态码计数。
+    SQL通过 Engine 事件记录到当前请求上，不在请求中的查询（如后台任务）不计入。
+    """
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.sql_time = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.sql_count = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.responses = defaultdict(int)
+        self.response_bytes = defaultdict(int)
+        self.slow_request_ms = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slow_request_ms = app.config.get('SLOW_REQUEST_MS', 0)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = []
+
+    def _after_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        queries = g.pop('metrics_queries', [])
+        sql_time = sum(duration for _, duration in queries)
+        endpoint = request.endpoint or 'unknown'
+        key = (endpoint, request.method)
+        # 流式响应的大小未知，不计入
+        size = response.calculate_content_length()
+
+        with self.lock:
+            self.latency[key].observe(elapsed)
+            self.sql_time[key].observe(sql_time)
+            self.sql_count[key].observe(len(queries))
+            self.responses[key + (response.status_code,)] += 1
+            if size is not None:
+                self.response_bytes[key] += size
+
+        if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+            slowest = sorted(queries, key=lambda q: q[1], reverse=True)[:SLOW_LOG_TOP_QUERIES]
+            breakdown = '; '.join(f'{duration * 1000:.1f}ms {" ".join(statement.split())[:200]}'
+                                  for statement, duration in slowest)
+            logger.warning(
+                f"慢请求: {request.method} {request.full_path.rstrip('?')} {response.status_code}, "
+                f"耗时 {elapsed * 1000:.1f}ms, SQL {len(queries)} 条共 {sql_time * 1000:.1f}ms"
+                + (f", 最慢: {breakdown}" if breakdown else '')
+            )
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'metrics_queries' in g:
+            conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('metrics_query_start')
+        if starts and has_request_context() and 'metrics_queries' in g:
+            g.metrics_queries.append((statement, time.perf_counter() - starts.pop()))
+
+    def render(self):
+        """生成 Prometheus 文本格式的指标"""
+        lines = []
+        names = ('endpoint', 'method')
+        with self.lock:
+            self._render_histogram(lines, 'http_request_duration_seconds',
+                                   '请求处理耗时', names, self.latency)
+            lines.append('# HELP http_responses_total 按状态码统计的响应数')
+            lines.append('# TYPE http_responses_total counter')
+            for key, count in sorted(self.responses.items()):
+                lines.append(f'http_responses_total{{{_labels(names + ("status",), key)}}} {count}')
+            lines.append('# HELP http_response_size_bytes_total 响应体字节数（不含流式响应）')
+            lines.append('# TYPE http_response_size_bytes_total counter')
+            for key, size in sorted(self.response_bytes.items()):
+                lines.append(f'http_response_size_bytes_total{{{_labels(names, key)}}} {size}')
+            self._render_histogram(lines, 'db_queries_per_request',
+                                   '每个请求执行的SQL条数', names, self.sql_count)
+            self._render_histogram(lines, 'db_query_duration_seconds_per_request',
+                                   '每个请求的SQL总耗时', names, self.sql_time)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histogram(lines, name, help_text, names, histograms):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for key, hist in sorted(histograms.items()):
+            labels = _labels(names, key)
+            for upper, count in zip(hist.buckets, hist.counts):
+                lines.append(f'{name}_bucket{{{labels},le="{upper}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.total}')
+            lines.append(f'{name}_sum{{{labels}}} {hist.sum}')
+            lines.append(f'{name}_count{{{labels}}} {hist.total}')
+
+    def response(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+metrics = Metrics()
@@ -0,0 +1,419 @@
+import hashlib
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer, MetaData, SmallInteger, String, Table, Text, func, inspect, select, text
+
+from models import SchemaMigration
+
+# Postgres 上多个进程同时启动时，用咨询锁保证迁移只执行一次
+_PG_LOCK_ID = 7301
+
+# 迁移10的变更日志触发器使用的咨询锁（迁移14起改为记录事务ID，不再加锁）
+_PG_CHANGES_LOCK_ID = 7302
+
+
+def _add_intent_indexes(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_intents_file_id_id ON intents (file_id, id)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_intents_file_id_review_status ON intents (file_id, review_status)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_intents_file_id_stage ON intents (file_id, stage)'))
+
+
+def _create_jobs_table(conn):
+    # 使用固定的表结构而不是当前模型，保证迁移结果不随模型变化
+    metadata = MetaData()
+    Table(
+        'jobs', metadata,
+        Column('id', String(32), primary_key=True),
+        Column('kind', String(20), nullable=False),
+        Column('status', String(20), nullable=False),
+        Column('file_id', Integer),
+        Column('progress', Integer),
+        Column('total', Integer),
+        Column('message', Text),
+        Column('result', Text),
+        Column('created_at', DateTime),
+        Column('started_at', DateTime),
+        Column('finished_at', DateTime),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+def _add_column(conn, table, column, ddl):
+    """列不存在时才添加，新建的数据库已由 create_all 按最新模型建好"""
+    if column not in {c['name'] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+
+def _add_file_version(conn):
+    _add_column(conn, 'uploaded_files', 'version', 'INTEGER NOT NULL DEFAULT 0')
+
+
+def _create_search_index(conn):
+    if conn.dialect.name == 'postgresql':
+        # 三元组GIN索引让 ILIKE '%关键词%' 走索引
+        conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        for column in ('original_comment', 'modified_content'):
+            conn.execute(text(
+                f'CREATE INDEX IF NOT EXISTS ix_intents_{column}_trgm ON intents USING gin ({column} gin_trgm_ops)'
+            ))
+        return
+    if conn.dialect.name != 'sqlite':
+        return
+    # SQLite 使用外部内容的 FTS5 表（trigram 分词支持中文子串匹配），由触发器增量维护
+    try:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS intents_fts USING fts5("
+            "original_comment, modified_content, content='intents', content_rowid='id', tokenize='trigram')"
+        ))
+    except Exception:
+        # 旧版本SQLite不支持 trigram 分词，搜索会退化为 LIKE 查询
+        return
+    conn.execute(text(
+        'CREATE TRIGGER IF NOT EXISTS intents_fts_ai AFTER INSERT ON intents BEGIN '
+        'INSERT INTO intents_fts(rowid, original_comment, modified_content) '
+        'VALUES (new.id, new.original_comment, new.modified_content); END'
+    ))
+    conn.execute(text(
+        'CREATE TRIGGER IF NOT EXISTS intents_fts_ad AFTER DELETE ON intents BEGIN '
+        "INSERT INTO intents_fts(intents_fts, rowid, original_comment, modified_content) "
+        "VALUES ('delete', old.id, old.original_comment, old.modified_content); END"
+    ))
+    conn.execute(text(
+        'CREATE TRIGGER IF NOT EXISTS intents_fts_au AFTER UPDATE OF original_comment, modified_content ON intents BEGIN '
+        "INSERT INTO intents_fts(intents_fts, rowid, original_comment, modified_content) "
+        "VALUES ('delete', old.id, old.original_comment, old.modified_content); "
+        'INSERT INTO intents_fts(rowid, original_comment, modified_content) '
+        'VALUES (new.id, new.original_comment, new.modified_content); END'
+    ))
+    conn.execute(text("INSERT INTO intents_fts(intents_fts) VALUES ('rebuild')"))
+
+
+def _add_content_hash(conn):
+    _add_column(conn, 'uploaded_files', 'content_hash', 'VARCHAR(64)')
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_uploaded_files_content_hash ON uploaded_files (content_hash)'
+    ))
+
+
+
+def _create_step_items(conn):
+    _add_column(conn, 'uploaded_files', 'item_table', "VARCHAR(20) NOT NULL DEFAULT 'intents'")
+    metadata = MetaData()
+    Table(
+        'step_items', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('file_id', Integer, ForeignKey('uploaded_files.id'), nullable=False),
+        Column('item_id', String(255)),
+        Column('stage', String(100), nullable=False),
+        Column('item_type', String(255)),
+        Column('subject', String(255)),
+        Column('predicate', String(255)),
+        Column('object', String(255)),
+        Column('data', Text, nullable=False),
+        Index('ix_step_items_file_id_id', 'file_id', 'id'),
+        Index('ix_step_items_file_id_stage', 'file_id', 'stage'),
+        Index('ix_step_items_file_id_item_type', 'file_id', 'item_type'),
+        Index('ix_step_items_file_id_subject', 'file_id', 'subject'),
+        Index('ix_step_items_file_id_object', 'file_id', 'object'),
+    )
+    # uploaded_files 只用于解析外键，不会被创建
+    Table('uploaded_files', metadata, Column('id', Integer, primary_key=True))
+    metadata.tables['step_items'].create(conn, checkfirst=True)
+
+
+def _add_soft_delete(conn):
+    _add_column(conn, 'uploaded_files', 'deleted_at', 'TIMESTAMP' if conn.dialect.name == 'postgresql' else 'DATETIME')
+    if conn.dialect.name != 'postgresql':
+        # SQLite 修改外键需要重建表，删除文件时由批量 DELETE 删除子表行
+        return
+    for table in ('intents', 'step_items'):
+        for fk in inspect(conn).get_foreign_keys(table):
+            if fk['referred_table'] != 'uploaded_files' or fk['options'].get('ondelete') == 'CASCADE':
+                continue
+            conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT {fk["name"]}'))
+            conn.execute(text(
+                f'ALTER TABLE {table} ADD CONSTRAINT {fk["name"]} FOREIGN KEY (file_id) '
+                f'REFERENCES uploaded_files (id) ON DELETE CASCADE'
+            ))
+
+
+def _add_review_claims(conn):
+    _add_column(conn, 'intents', 'version', 'INTEGER NOT NULL DEFAULT 0')
+    _add_column(conn, 'intents', 'claimed_by', 'VARCHAR(50)')
+    _add_column(conn, 'intents', 'claim_expires_at', 'TIMESTAMP' if conn.dialect.name == 'postgresql' else 'DATETIME')
+
+# 汇总表的维度列及长度，NULL 统一记为空字符串，保证主键能正确去重
+_STAT_COLUMNS = {'stage': 100, 'category': 50, 'judgement': 20, 'review_status': 20, 'judged_by': 50}
+_STAT_DIMENSIONS = tuple(_STAT_COLUMNS)
+
+
+def _stat_values(prefix):
+    return ', '.join([f'{prefix}.file_id'] + [f"COALESCE({prefix}.{d}, '')" for d in _STAT_DIMENSIONS])
+
+
+def _stat_match(prefix):
+    return ' AND '.join([f'file_id = {prefix}.file_id'] + [f"{d} = COALESCE({prefix}.{d}, '')" for d in _STAT_DIMENSIONS])
+
+
+def _create_review_stats(conn):
+    metadata = MetaData()
+    Table(
+        'review_stats', metadata,
+        Column('file_id', Integer, primary_key=True, autoincrement=False),
+        *[Column(d, String(length), primary_key=True) for d, length in _STAT_COLUMNS.items()],
+        Column('item_count', Integer, nullable=False),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+    columns = 'file_id, ' + ', '.join(_STAT_DIMENSIONS)
+    upsert = (
+        f'INSERT INTO review_stats ({columns}, item_count) VALUES ({_stat_values("NEW")}, 1) '
+        f'ON CONFLICT ({columns}) DO UPDATE SET item_count = review_stats.item_count + 1'
+    )
+    decrement = f'UPDATE review_stats SET item_count = item_count - 1 WHERE {_stat_match("OLD")}'
+
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f"""
+            CREATE OR REPLACE FUNCTION review_stats_sync() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    {decrement};
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    {upsert};
+                    RETURN NEW;
+                END IF;
+                RETURN OLD;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+        conn.execute(text('DROP TRIGGER IF EXISTS review_stats_sync ON intents'))
+        conn.execute(text(
+            'CREATE TRIGGER review_stats_sync AFTER INSERT OR DELETE OR UPDATE OF '
+            f'file_id, {", ".join(_STAT_DIMENSIONS)} ON intents FOR EACH ROW '
+            'EXECUTE FUNCTION review_stats_sync()'
+        ))
+    else:
+        changed = ' OR '.join(f'OLD.{d} IS NOT NEW.{d}' for d in ('file_id',) + _STAT_DIMENSIONS)
+        conn.execute(text(f'CREATE TRIGGER IF NOT EXISTS review_stats_ai AFTER INSERT ON intents BEGIN {upsert}; END'))
+        conn.execute(text(f'CREATE TRIGGER IF NOT EXISTS review_stats_ad AFTER DELETE ON intents BEGIN {decrement}; END'))
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS review_stats_au AFTER UPDATE ON intents WHEN {changed} '
+            f'BEGIN {decrement}; {upsert}; END'
+        ))
+
+    rebuild_review_stats(conn)
+
+
+def rebuild_review_stats(conn):
+    """用一次 GROUP BY 重建核对统计汇总表（用于修复）"""
+    columns = 'file_id, ' + ', '.join(_STAT_DIMENSIONS)
+    keys = ', '.join(['file_id'] + [f"COALESCE({d}, '')" for d in _STAT_DIMENSIONS])
+    conn.execute(text('DELETE FROM review_stats'))
+    conn.execute(text(
+        f'INSERT INTO review_stats ({columns}, item_count) '
+        f'SELECT {keys}, COUNT(*) FROM intents GROUP BY {keys}'
+    ))
+
+
+# 意图中变化时需要通知客户端的列（核对结果和领取状态）
+_CHANGE_COLUMNS = ('judgement', 'judged_by', 'modified_content', 'judge_date', 'review_status',
+                   'version', 'claimed_by', 'claim_expires_at')
+
+
+def _change_insert(entity, prefix, op, txid=False):
+    """追加一行变更的语句，op 为 SQL 表达式，txid 时同时记录当前事务ID（Postgres）"""
+    file_id = f'{prefix}.file_id' if entity == 'intent' else f'{prefix}.id'
+    if txid:
+        return (f"INSERT INTO changes (entity, entity_id, file_id, op, txid) "
+                f"VALUES ('{entity}', {prefix}.id, {file_id}, {op}, txid_current())")
+    return (f"INSERT INTO changes (entity, entity_id, file_id, op) "
+            f"VALUES ('{entity}', {prefix}.id, {file_id}, {op})")
+
+
+def _create_change_log(conn):
+    metadata = MetaData()
+    Table(
+        'changes', metadata,
+        Column('seq', BigInteger().with_variant(Integer, 'sqlite'), primary_key=True),
+        Column('entity', String(10), nullable=False),
+        Column('entity_id', Integer, nullable=False),
+        Column('file_id', Integer, nullable=False),
+        Column('op', String(10), nullable=False),
+        Index('ix_changes_file_id_seq', 'file_id', 'seq'),
+        sqlite_autoincrement=True,
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+    columns = ', '.join(_CHANGE_COLUMNS)
+    intent_update = _change_insert('intent', 'NEW', "'update'")
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f"""
+            CREATE OR REPLACE FUNCTION changes_log() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_advisory_xact_lock({_PG_CHANGES_LOCK_ID});
+                IF TG_TABLE_NAME = 'intents' THEN
+                    {intent_update};
+                    RETURN NEW;
+                END IF;
+                IF TG_OP = 'DELETE' THEN
+                    {_change_insert('file', 'OLD', "'delete'")};
+                    RETURN OLD;
+                END IF;
+                {_change_insert('file', 'NEW', 'lower(TG_OP)')};
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+        conn.execute(text('DROP TRIGGER IF EXISTS changes_log ON intents'))
+        conn.execute(text(
+            f'CREATE TRIGGER changes_log AFTER UPDATE OF {columns} ON intents '
+            'FOR EACH ROW EXECUTE FUNCTION changes_log()'
+        ))
+        conn.execute(text('DROP TRIGGER IF EXISTS changes_log ON uploaded_files'))
+        conn.execute(text(
+            'CREATE TRIGGER changes_log AFTER INSERT OR UPDATE OR DELETE ON uploaded_files '
+            'FOR EACH ROW EXECUTE FUNCTION changes_log()'
+        ))
+        return
+
+    # SQLite 同一时间只有一个写事务，自增的 seq 天然与提交顺序一致
+    conn.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS changes_intents_au AFTER UPDATE OF {columns} ON intents '
+        f'BEGIN {intent_update}; END'
+    ))
+    for suffix, event, prefix in (('ai', 'insert', 'NEW'), ('au', 'update', 'NEW'), ('ad', 'delete', 'OLD')):
+        file_change = _change_insert('file', prefix, f"'{event}'")
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS changes_files_{suffix} AFTER {event.upper()} ON uploaded_files '
+            f'BEGIN {file_change}; END'
+        ))
+
+
+def _md5(value):
+    return hashlib.md5(value.encode('utf-8')).hexdigest() if value is not None else None
+
+
+def _add_comment_hash(conn):
+    _add_column(conn, 'intents', 'comment_hash', 'VARCHAR(32)')
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_intents_file_id_intent_id ON intents (file_id, intent_id)'))
+    if conn.dialect.name == 'sqlite':
+        # SQLite 没有内置的 md5，注册一个与 Postgres md5(text) 结果相同的函数
+        conn.connection.driver_connection.create_function('md5', 1, _md5, deterministic=True)
+    conn.execute(text('UPDATE intents SET comment_hash = md5(original_comment) WHERE comment_hash IS NULL'))
+
+
+def _create_intent_bands(conn):
+    # 只建表，已有意图的分桶由 build-similarity-index 命令补建（计算量与意图数成正比）
+    metadata = MetaData()
+    Table(
+        'intent_bands', metadata,
+        Column('intent_id', Integer, ForeignKey('intents.id', ondelete='CASCADE'), primary_key=True,
+               autoincrement=False),
+        Column('band', SmallInteger, primary_key=True, autoincrement=False),
+        Column('band_key', BigInteger, nullable=False),
+        Column('file_id', Integer, nullable=False),
+        Index('ix_intent_bands_band_key', 'band_key'),
+        Index('ix_intent_bands_file_id', 'file_id'),
+    )
+    Table('intents', metadata, Column('id', Integer, primary_key=True))
+    metadata.tables['intent_bands'].create(conn, checkfirst=True)
+
+
+def _add_file_importing(conn):
+    _add_column(conn, 'uploaded_files', 'importing', 'BOOLEAN NOT NULL DEFAULT FALSE')
+
+
+def _add_change_txid(conn):
+    _add_column(conn, 'changes', 'txid', 'BIGINT')
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_changes_txid ON changes (txid)'))
+    if conn.dialect.name != 'postgresql':
+        return
+    # 已有的变更视为最早的事务；触发器不再取全局咨询锁，改为记录事务ID，
+    # 读取时只返回早于所有进行中事务的变更（见 changes.py），写入之间互不阻塞
+    conn.execute(text('UPDATE changes SET txid = 0 WHERE txid IS NULL'))
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION changes_log() RETURNS trigger AS $$
+        BEGIN
+            IF TG_TABLE_NAME = 'intents' THEN
+                {_change_insert('intent', 'NEW', "'update'", txid=True)};
+                RETURN NEW;
+            END IF;
+            IF TG_OP = 'DELETE' THEN
+                {_change_insert('file', 'OLD', "'delete'", txid=True)};
+                RETURN OLD;
+            END IF;
+            {_change_insert('file', 'NEW', 'lower(TG_OP)', txid=True)};
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+
+
+def _clear_intent_bands(conn):
+    # 片段编码和分桶键改为可整批向量化计算的算法，旧分桶与新算出的分桶键不再匹配，
+    # 清空后由 build-similarity-index 命令重建（计算量与意图数成正比，不在迁移中执行）
+    conn.execute(text('DELETE FROM intent_bands'))
+
+
+
+def _add_job_heartbeat(conn):
+    _add_column(conn, 'jobs', 'heartbeat_at', 'TIMESTAMP' if conn.dialect.name == 'postgresql' else 'DATETIME')
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status)'))
+
+
+# 迁移列表：(版本号, 描述, 执行函数)，只能追加，不能修改已发布的条目
+# 每个迁移都需要能在 SQLite 和 Postgres 上重复执行（如使用 IF NOT EXISTS），
+# 因为新建的数据库会先由 create_all 按最新模型建表
+MIGRATIONS = [
+    (1, '为 intents 添加 file_id 组合索引', _add_intent_indexes),
+    (2, '创建后台任务表 jobs', _create_jobs_table),
+    (3, '为 uploaded_files 添加版本号 version', _add_file_version),
+    (4, '为意图内容建立全文索引', _create_search_index),
+    (5, '创建核对统计汇总表 review_stats 及维护触发器', _create_review_stats),
+    (6, '为 uploaded_files 添加内容哈希 content_hash', _add_content_hash),
+    (7, '创建非意图步骤的通用条目表 step_items', _create_step_items),
+    (8, '为 uploaded_files 添加软删除时间 deleted_at，子表外键改为级联删除', _add_soft_delete),
+    (9, '为 intents 添加行版本号 version 及领取字段 claimed_by/claim_expires_at', _add_review_claims),
+    (10, '创建变更日志表 changes 及维护触发器', _create_change_log),
+    (11, '为 intents 添加原始内容哈希 comment_hash 及 (file_id, intent_id) 索引', _add_comment_hash),
+    (12, '创建近似重复检测的 LSH 分桶表 intent_bands', _create_intent_bands),
+    (13, '为 uploaded_files 添加导入中标记 importing', _add_file_importing),
+    (14, '变更日志记录事务ID txid，Postgres 触发器不再使用全局咨询锁', _add_change_txid),
+    (15, '近似重复分桶的哈希算法变更，清空 intent_bands 待重建', _clear_intent_bands),
+    (16, '为 jobs 添加心跳时间 heartbeat_at 及 status 索引', _add_job_heartbeat),
+]
+
+
+def schema_is_current(engine):
+    """已执行到最新版本的迁移时返回 True，只需一次查询（表不存在时返回 False）"""
+    table = SchemaMigration.__table__
+    try:
+        with engine.connect() as conn:
+            latest = conn.execute(select(func.max(table.c.version))).scalar()
+    except Exception:
+        return False
+    return latest == MIGRATIONS[-1][0]
+
+
+def run_migrations(engine):
+    """执行所有未执行的迁移，返回本次执行的版本号列表"""
+    table = SchemaMigration.__table__
+    applied = []
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text('SELECT pg_advisory_xact_lock(:id)'), {'id': _PG_LOCK_ID})
+        table.create(conn, checkfirst=True)
+        done = {row[0] for row in conn.execute(table.select().with_only_columns(table.c.version))}
+        for version, description, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            migrate(conn)
+            conn.execute(table.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.now()
+            ))
+            applied.append(version)
+    return applied
+
@@ -1,8 +1,20 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# 意图的待核对状态，离开该状态才计入 reviewed_items
+REVIEW_PENDING = '待核对'
+
+def format_datetime(value):
+    """格式化为 YYYY-MM-DD HH:MM:SS，空值返回空字符串（isoformat 比 strftime 快得多）"""
+    return value.isoformat(' ', 'seconds') if value else ''
+
+# 按意图表结构存储的步骤类型，其余步骤的条目存入通用条目表 step_items
+INTENT_STEP_TYPES = ('atomic_intent',)
+
 class UploadedFile(db.Model):
     """上传的JSON文件记录"""
     __tablename__ = 'uploaded_files'
@@ -15,8 +27,15 @@ class UploadedFile(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now)
     total_items = db.Column(db.Integer, default=0)
     reviewed_items = db.Column(db.Integer, default=0)
+    version = db.Column(db.Integer, nullable=False, default=0)  # 文件或其意图每次变化时加一，用于ETag
+    content_hash = db.Column(db.String(64), index=True)  # 原始上传内容的sha256，用于识别重复上传
+    item_table = db.Column(db.String(20), nullable=False, default='intents')  # 条目存放的表：intents 或 step_items
+    deleted_at = db.Column(db.DateTime)  # 软删除时间，非空时文件已隐藏、等待后台清理
+    importing = db.Column(db.Boolean, nullable=False, default=False)  # 正在分批导入，完成前文件不可见
     
-    intents = db.relationship('Intent', backref='file', lazy='dynamic', cascade='all, delete-orphan')
+    # 删除文件时由批量 DELETE（及数据库外键级联）删除意图，ORM不再逐条加载
+    intents = db.relationship('Intent', backref='file', lazy='dynamic', cascade='all, delete-orphan',
+                              passive_deletes=True)
     
     def to_dict(self):
         return {
@@ -25,22 +44,46 @@ class UploadedFile(db.Model):
             'original_filename': self.original_filename,
             'step_type': self.step_type,
             'source_file': self.source_file,
-            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else '',
+            'created_at': format_datetime(self.created_at),
             'total_items': self.total_items,
-            'reviewed_items': self.reviewed_items
+            'reviewed_items': self.reviewed_items,
+            'item_table': self.item_table
         }
+    
+    @property
+    def is_visible(self):
+        """未删除且已导入完成的文件才出现在列表和查询中"""
+        return self.deleted_at is None and not self.importing
+    
+    @classmethod
+    def visible(cls):
+        """与 is_visible 对应的查询条件"""
+        return and_(cls.deleted_at.is_(None), cls.importing.is_(False))
+    
+    @property
+    def stores_items(self):
+        """条目是否存放在通用条目表 step_items 中"""
+        return self.item_table == 'step_items'
 
 
 class Intent(db.Model):
     """原子意图数据"""
     __tablename__ = 'intents'
+    # 所有查询都按 file_id 过滤，索引同时由 migrations.py 为已有数据库补建
+    __table_args__ = (
+        db.Index('ix_intents_file_id_id', 'file_id', 'id'),
+        db.Index('ix_intents_file_id_review_status', 'file_id', 'review_status'),
+        db.Index('ix_intents_file_id_stage', 'file_id', 'stage'),
+        db.Index('ix_intents_file_id_intent_id', 'file_id', 'intent_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    file_id = db.Column(db.Integer, db.ForeignKey('uploaded_files.id'), nullable=False)
+    file_id = db.Column(db.Integer, db.ForeignKey('uploaded_files.id', ondelete='CASCADE'), nullable=False)
     intent_id = db.Column(db.String(50), nullable=False)  # 如 INT-S1-001
     stage = db.Column(db.String(100), nullable=False)  # 阶段名称
     category = db.Column(db.String(50))  # Fact, Action, Logic等
     original_comment = db.Column(db.Text, nullable=False)
+    comment_hash = db.Column(db.String(32))  # original_comment 的 md5，重新上传时用于判断内容是否变化
     
     # 核对相关字段
     judgement = db.Column(db.String(20), default='')  # 通过, 需修改, 删除, 待定
@@ -49,7 +92,16 @@ class Intent(db.Model):
     judge_date = db.Column(db.DateTime)
     
     # 状态字段
-    review_status = db.Column(db.String(20), default='待核对')  # 待核对, 已核对, 直接通过
+    review_status = db.Column(db.String(20), default=REVIEW_PENDING)  # 待核对, 已核对, 直接通过
+    
+    # 并发核对：每次核对加一的行版本号，以及领取人和领取到期时间
+    version = db.Column(db.Integer, nullable=False, default=0)
+    claimed_by = db.Column(db.String(50))
+    claim_expires_at = db.Column(db.DateTime)
+    
+    # to_dict 的字段，列表接口可用 fields 参数只取其中一部分
+    FIELDS = ('id', 'file_id', 'intent_id', 'stage', 'category', 'original_comment', 'judgement', 'judged_by',
+              'modified_content', 'judge_date', 'review_status', 'version', 'claimed_by', 'claim_expires_at')
     
     def to_dict(self):
         return {
@@ -62,7 +114,158 @@ class Intent(db.Model):
             'judgement': self.judgement,
             'judged_by': self.judged_by,
             'modified_content': self.modified_content,
-            'judge_date': self.judge_date.strftime('%Y-%m-%d %H:%M:%S') if self.judge_date else '',
-            'review_status': self.review_status
+            'judge_date': format_datetime(self.judge_date),
+            'review_status': self.review_status,
+            'version': self.version,
+            'claimed_by': self.claimed_by or '',
+            'claim_expires_at': format_datetime(self.claim_expires_at)
+        }
+
+
+
+# 通用条目中抽取出来建索引的字段的最大长度，完整内容保存在 data 中
+ITEM_KEY_LENGTH = 255
+
+# 通用条目列表可用的筛选字段
+ITEM_FILTERS = ('stage', 'item_type', 'subject', 'predicate', 'object')
+
+
+class StepItem(db.Model):
+    """非意图步骤（数据清洗、Object/Action建模、三元组）的通用条目
+
+    原始条目完整保存在 data（JSON文本）中，常用的查询字段单独抽取并建索引。
+    """
+    __tablename__ = 'step_items'
+    __table_args__ = (
+        db.Index('ix_step_items_file_id_id', 'file_id', 'id'),
+        db.Index('ix_step_items_file_id_stage', 'file_id', 'stage'),
+        db.Index('ix_step_items_file_id_item_type', 'file_id', 'item_type'),
+        db.Index('ix_step_items_file_id_subject', 'file_id', 'subject'),
+        db.Index('ix_step_items_file_id_object', 'file_id', 'object'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.Integer, db.ForeignKey('uploaded_files.id', ondelete='CASCADE'), nullable=False)
+    item_id = db.Column(db.String(ITEM_KEY_LENGTH), default='')  # 条目自带的 id
+    stage = db.Column(db.String(100), nullable=False)  # 所在的顶层分组
+    item_type = db.Column(db.String(ITEM_KEY_LENGTH), default='')  # type 或 category
+    # 三元组的主语、谓语、宾语，其他步骤为空
+    subject = db.Column(db.String(ITEM_KEY_LENGTH))
+    predicate = db.Column(db.String(ITEM_KEY_LENGTH))
+    object = db.Column(db.String(ITEM_KEY_LENGTH))
+    data = db.Column(db.Text, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'file_id': self.file_id,
+            'item_id': self.item_id,
+            'stage': self.stage,
+            'item_type': self.item_type,
+            'subject': self.subject,
+            'predicate': self.predicate,
+            'object': self.object,
+            'data': json.loads(self.data)
         }
 
+
+
+class ReviewStat(db.Model):
+    """核对统计汇总：每种维度组合的意图数量，由数据库触发器随 intents 增量维护"""
+    __tablename__ = 'review_stats'
+    
+    file_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    stage = db.Column(db.String(100), primary_key=True, default='')
+    category = db.Column(db.String(50), primary_key=True, default='')
+    judgement = db.Column(db.String(20), primary_key=True, default='')
+    review_status = db.Column(db.String(20), primary_key=True, default='')
+    judged_by = db.Column(db.String(50), primary_key=True, default='')
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class IntentBand(db.Model):
+    """意图原始内容的 MinHash LSH 分桶（见 similarity.py），每条意图每个 band 一行
+
+    band_key 相同的意图是近似重复的候选，查找候选只需按 band_key 索引查询，
+    与意图总数无关。文件导入完成后由后台任务写入，删除文件时一起删除。
+    """
+    __tablename__ = 'intent_bands'
+    __table_args__ = (
+        db.Index('ix_intent_bands_band_key', 'band_key'),
+        db.Index('ix_intent_bands_file_id', 'file_id'),
+    )
+
+    intent_id = db.Column(db.Integer, db.ForeignKey('intents.id', ondelete='CASCADE'), primary_key=True,
+                          autoincrement=False)
+    band = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    band_key = db.Column(db.BigInteger, nullable=False)
+    file_id = db.Column(db.Integer, nullable=False)
+
+
+class Change(db.Model):
+    """变更日志：意图的核对/领取字段和文件记录每次变化时由数据库触发器追加一行
+
+    SQLite 上 seq 的顺序与提交顺序一致，客户端记录看到的最大 seq，之后只拉取更新的变更。
+    Postgres 上并发事务的 seq 不按提交顺序可见，改用写入事务的 txid 作为位置（见 changes.py）。
+    意图的批量写入（上传、删除）不逐行记录，由对应文件的变更表示。
+    """
+    __tablename__ = 'changes'
+    __table_args__ = (
+        db.Index('ix_changes_file_id_seq', 'file_id', 'seq'),
+        db.Index('ix_changes_txid', 'txid'),
+        # SQLite 下 seq 不复用已清理的编号
+        {'sqlite_autoincrement': True},
+    )
+    
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    entity = db.Column(db.String(10), nullable=False)  # intent, file
+    entity_id = db.Column(db.Integer, nullable=False)
+    file_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # insert, update, delete, prune
+    txid = db.Column(db.BigInteger)  # Postgres 上写入该行的事务ID，SQLite 上为空
+
+
+class Job(db.Model):
+    """后台任务（上传解析、导出、删除）"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status', 'status'),
+    )
+    
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # upload, export, delete
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, succeeded, failed
+    file_id = db.Column(db.Integer)
+    progress = db.Column(db.Integer, default=0)  # 已处理的数量
+    total = db.Column(db.Integer, default=0)  # 总数量，未知时为0
+    message = db.Column(db.Text, default='')
+    result = db.Column(db.Text, default='')  # JSON格式的结果
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # 执行任务的进程定期更新，长时间未更新说明进程已退出
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'file_id': self.file_id,
+            'progress': self.progress,
+            'total': self.total,
+            'percent': round(self.progress * 100 / self.total, 1) if self.total else None,
+            'message': self.message,
+            'result': json.loads(self.result) if self.result else None,
+            'created_at': format_datetime(self.created_at),
+            'started_at': format_datetime(self.started_at),
+            'finished_at': format_datetime(self.finished_at)
+        }
+
+
+class SchemaMigration(db.Model):
+    """已执行的数据库迁移版本"""
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(255), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.now)
@@ -0,0 +1,96 @@
+import base64
+import math
+
+# 总数的获取方式：exact 实时 COUNT，cached 使用文件记录上维护的 total_items，none 不返回
+COUNT_MODES = ('exact', 'cached', 'none')
+
+
+def encode_cursor(direction, key):
+    """生成不透明游标，direction 为 'a'（之后）或 'b'（之前）"""
+    return base64.urlsafe_b64encode(f'{direction}:{key}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (direction, key)，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, key = base64.urlsafe_b64decode(padded.encode()).decode().split(':', 1)
+        key = int(key)
+    except Exception:
+        raise ValueError('无效的游标')
+    if direction not in ('a', 'b'):
+        raise ValueError('无效的游标')
+    return direction, key
+
+
+def keyset_page(query, key_column, cursor, per_page, key_name=None):
+    """基于主键的游标分页，每页的开销与页码无关
+
+    key_name 为结果对象上与 key_column 取值相同的属性名，默认与列名相同。
+    返回 (items, next_cursor, prev_cursor)，没有下一页/上一页时对应游标为 None。
+    """
+    direction, key = decode_cursor(cursor) if cursor else ('a', None)
+
+    if direction == 'a':
+        if key is not None:
+            query = query.filter(key_column > key)
+        rows = query.order_by(key_column).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        items = rows[:per_page]
+        has_next, has_prev = has_more, key is not None
+    else:
+        rows = query.filter(key_column < key).order_by(key_column.desc()).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next, has_prev = True, has_more
+
+    key_name = key_name or key_column.key
+    next_cursor = encode_cursor('a', getattr(items[-1], key_name)) if items and has_next else None
+    prev_cursor = encode_cursor('b', getattr(items[0], key_name)) if items and has_prev else None
+    return items, next_cursor, prev_cursor
+
+
+def windowed_page(query, key_column, cursor, per_page, span, key_max, key_name=None):
+    """与 keyset_page 相同的游标分页，但每次请求最多扫描主键跨度为 span 的一段
+
+    用于用不上索引、只能逐行匹配的条件：匹配项稀少时也不会一次扫完整张表。
+    范围内不足一页时返回已找到的匹配项（可能为空），游标指向范围的边界，
+    客户端继续翻页即可接着扫描；key_max 为主键的最大值，扫描到这里为止。
+    """
+    direction, key = decode_cursor(cursor) if cursor else ('a', None)
+
+    if direction == 'a':
+        start = key if key is not None else 0
+        bound = start + span
+        if key is not None:
+            query = query.filter(key_column > key)
+        rows = query.filter(key_column <= bound).order_by(key_column).limit(per_page + 1).all()
+        items = rows[:per_page]
+        key_name = key_name or key_column.key
+        if len(rows) > per_page:
+            next_cursor = encode_cursor('a', getattr(items[-1], key_name))
+        else:
+            next_cursor = encode_cursor('a', bound) if key_max is not None and bound < key_max else None
+        if key is None:
+            prev_cursor = None
+        else:
+            prev_cursor = encode_cursor('b', getattr(items[0], key_name) if items else key + 1)
+    else:
+        bound = key - span
+        rows = (query.filter(key_column < key, key_column >= bound)
+                .order_by(key_column.desc()).limit(per_page + 1).all())
+        items = list(reversed(rows[:per_page]))
+        key_name = key_name or key_column.key
+        if len(rows) > per_page:
+            prev_cursor = encode_cursor('b', getattr(items[0], key_name))
+        else:
+            prev_cursor = encode_cursor('b', bound) if bound > 1 else None
+        next_cursor = encode_cursor('a', getattr(items[-1], key_name) if items else key - 1)
+    return items, next_cursor, prev_cursor
+
+
+def page_count(total, per_page):
+    """根据总数计算页数，总数未知时返回 None"""
+    if total is None:
+        return None
+    return math.ceil(total / per_page) if per_page > 0 else 0
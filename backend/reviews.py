@@ -0,0 +1,160 @@
+from datetime import datetime
+
+from sqlalchemy import bindparam, not_, or_, select, update
+
+from models import db, Intent, REVIEW_PENDING
+from counters import touch_file
+from claims import claimable
+
+# 批量操作：action -> (核对状态, 固定的核对结果)
+BATCH_ACTIONS = {
+    'review': ('已核对', None),
+    'pass': ('直接通过', '通过'),
+}
+
+# 批量筛选支持的字段
+FILTER_FIELDS = ('stage', 'category', 'judgement', 'judged_by', 'review_status')
+
+# 写入核对结果时同时递增行版本号并释放领取，单条核对时带旧版本号的请求会因此被拒绝
+_REVIEWED = {'version': Intent.version + 1, 'claimed_by': None, 'claim_expires_at': None}
+
+# IN 列表分块大小，避免超过数据库的参数数量上限
+_ID_CHUNK = 500
+
+
+def _chunks(values, size=_ID_CHUNK):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def batch_update_items(action, items, judged_by):
+    """按ID列表批量核对，返回 (更新的意图数量, 因正被其他人领取而跳过的意图ID列表)
+
+    review 时每条可带各自的 judgement/modified_content，pass 时只需要ID。
+    与单条核对一样只处理未被领取、领取已过期或由本人领取的意图，每条 UPDATE 都带该条件。
+    先用带 review_status 条件的 UPDATE 切换状态并得到每个文件的计数增量，
+    再写入核对内容，全部在调用方的事务中完成。返回的数量是写入核对内容时实际更新的行数。
+    """
+    status, fixed_judgement = BATCH_ACTIONS[action]
+    now = datetime.now()
+    ids = list(dict.fromkeys(int(item['id']) for item in items))
+    allowed = claimable(judged_by, now)
+
+    by_file = {}
+    conflicts = []
+    for chunk in _chunks(ids):
+        for intent_id, file_id, ok in db.session.execute(
+            select(Intent.id, Intent.file_id, allowed).where(Intent.id.in_(chunk))
+        ):
+            if ok:
+                by_file.setdefault(file_id, []).append(intent_id)
+            else:
+                conflicts.append(intent_id)
+    existing = [intent_id for file_ids in by_file.values() for intent_id in file_ids]
+    if not existing:
+        return 0, sorted(conflicts)
+
+    for file_id, file_ids in by_file.items():
+        moved = 0
+        for chunk in _chunks(file_ids):
+            moved += db.session.execute(
+                update(Intent)
+                .where(Intent.id.in_(chunk), Intent.review_status == REVIEW_PENDING, allowed)
+                .values(review_status=status)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        touch_file(file_id, moved)
+
+    table = Intent.__table__
+    if fixed_judgement is not None:
+        # 所有意图写入相同的值，直接用 IN 条件更新，RETURNING 得到实际更新的ID
+        written = set()
+        for chunk in _chunks(existing):
+            written.update(db.session.execute(
+                table.update()
+                .where(table.c.id.in_(chunk), allowed)
+                .values(judgement=fixed_judgement, judged_by=judged_by,
+                        judge_date=now, review_status=status, **_REVIEWED)
+                .returning(table.c.id)
+            ).scalars())
+        return _written_result(existing, written, conflicts)
+
+    # 每条内容不同，用一次 executemany 写入；同一ID出现多次时以最后一条为准
+    found = set(existing)
+    params = {}
+    for item in items:
+        intent_id = int(item['id'])
+        if intent_id in found:
+            params[intent_id] = {
+                'b_id': intent_id,
+                'b_judgement': item.get('judgement', ''),
+                'b_modified': item.get('modified_content', ''),
+            }
+    db.session.execute(
+        table.update()
+        .where(table.c.id == bindparam('b_id'), allowed)
+        .values(judgement=bindparam('b_judgement'), modified_content=bindparam('b_modified'),
+                judged_by=judged_by, judge_date=now, review_status=status, **_REVIEWED),
+        list(params.values())
+    )
+    # executemany 的 rowcount 在部分驱动上不可靠，也无法 RETURNING，按本次写入的时间和核对人查出实际更新的行
+    written = set()
+    for chunk in _chunks(existing):
+        written.update(db.session.execute(
+            select(Intent.id).where(Intent.id.in_(chunk), Intent.judge_date == now, Intent.judged_by == judged_by)
+        ).scalars())
+    return _written_result(existing, written, conflicts)
+
+
+def _written_result(existing, written, conflicts):
+    """(实际更新的数量, 冲突ID)：读取时可领取、写入前被其他人领取而跳过的行也计入冲突"""
+    return len(written), sorted(conflicts + [intent_id for intent_id in existing if intent_id not in written])
+
+
+def batch_update_filter(action, file_id, filters, judged_by, judgement='', modified_content='',
+                        include_reviewed=False):
+    """按筛选条件批量核对文件中的意图，返回 (更新的意图数量, 因正被其他人领取而跳过的意图ID列表)
+
+    默认只处理待核对的行，不覆盖其他人已有的核对结果；include_reviewed 为 True 时已核对的行
+    也一并覆盖，两者分两条 UPDATE 处理，待核对那条的 rowcount 就是计数增量。
+    正被其他人领取（且未过期）的行不更新。
+    """
+    status, fixed_judgement = BATCH_ACTIONS[action]
+    now = datetime.now()
+    values = {
+        'judgement': fixed_judgement if fixed_judgement is not None else judgement,
+        'judged_by': judged_by,
+        'judge_date': now,
+        'review_status': status,
+        **_REVIEWED,
+    }
+    if fixed_judgement is None:
+        values['modified_content'] = modified_content
+
+    conditions = [Intent.file_id == file_id]
+    for field in FILTER_FIELDS:
+        if field in filters:
+            conditions.append(getattr(Intent, field) == filters[field])
+    if not include_reviewed:
+        conditions.append(Intent.review_status == REVIEW_PENDING)
+    allowed = claimable(judged_by, now)
+
+    conflicts = db.session.execute(
+        select(Intent.id).where(*conditions, not_(allowed)).order_by(Intent.id)
+    ).scalars().all()
+
+    def run(*extra):
+        return db.session.execute(
+            update(Intent)
+            .where(*conditions, allowed, *extra)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    # 先更新已离开待核对状态的行，再更新待核对的行，避免同一行被更新两次
+    reviewed = run(or_(Intent.review_status != REVIEW_PENDING, Intent.review_status.is_(None))) \
+        if include_reviewed else 0
+    moved = run(Intent.review_status == REVIEW_PENDING)
+    if reviewed or moved:
+        touch_file(file_id, moved)
+    return reviewed + moved, conflicts
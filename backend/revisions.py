@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.orm import aliased
+
+from models import db, UploadedFile, Intent, REVIEW_PENDING
+from counters import touch_file
+
+# 上传方式：new 作为全新文件导入，merge 与同一来源的上一版本比对并沿用未变化意图的核对结果
+UPLOAD_MODES = ('new', 'merge')
+
+# 比较核对时间时代替空值（导入时已带核对结果的意图可能没有核对时间）
+_NO_DATE = datetime(1970, 1, 1)
+
+
+def find_previous_revision(uploaded_file):
+    """同一 source_file 的最近一次（未删除的）意图文件，没有时返回 None"""
+    return UploadedFile.query.filter(
+        UploadedFile.source_file == uploaded_file.source_file,
+        UploadedFile.item_table == uploaded_file.item_table,
+        UploadedFile.id != uploaded_file.id,
+        UploadedFile.visible(),
+    ).order_by(UploadedFile.id.desc()).first()
+
+
+def merge_revision(uploaded_file, previous):
+    """把上一版本中已核对的意图的结果沿用到新文件中内容未变的意图上（不提交事务）
+
+    以 (intent_id, comment_hash) 把新旧两个文件的意图做连接，整个比对和沿用都是
+    几条集合操作的SQL（UPDATE ... FROM 和带 EXISTS 的计数），由数据库用哈希连接或
+    (file_id, intent_id) 索引完成，不按条目逐条查询。新增和内容变化的意图保持待核对。
+    旧文件中同一意图有多条内容相同的已核对记录时，只沿用核对时间最晚的一条（时间相同取ID最大的），
+    沿用与核对一样使行版本号加一。
+    返回比对结果：未变化、内容变化、新增、删除的条数以及沿用了核对结果的条数。
+    """
+    new, old = Intent, aliased(Intent)
+    same_id = (old.file_id == previous.id) & (old.intent_id == new.intent_id)
+    same_content = same_id & (old.comment_hash == new.comment_hash)
+    reviewed = old.review_status != REVIEW_PENDING
+
+    # 同一意图没有更晚核对的同内容记录，保证每条新意图最多连接到旧文件的一行
+    later = aliased(Intent)
+    old_date, later_date = (func.coalesce(i.judge_date, _NO_DATE) for i in (old, later))
+    latest = ~exists().where(
+        later.file_id == previous.id,
+        later.intent_id == old.intent_id,
+        later.comment_hash == old.comment_hash,
+        later.review_status != REVIEW_PENDING,
+        (later_date > old_date) | ((later_date == old_date) & (later.id > old.id)),
+    )
+
+    carried = db.session.execute(
+        update(new)
+        .where(new.file_id == uploaded_file.id, same_content, reviewed, latest)
+        .values(
+            judgement=old.judgement,
+            judged_by=old.judged_by,
+            modified_content=old.modified_content,
+            judge_date=old.judge_date,
+            review_status=old.review_status,
+            version=new.version + 1,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if carried:
+        touch_file(uploaded_file.id, carried)
+
+    def count(model, *conditions):
+        return db.session.scalar(select(func.count()).select_from(model).where(*conditions))
+
+    unchanged = count(new, new.file_id == uploaded_file.id, exists().where(same_content))
+    matched = count(new, new.file_id == uploaded_file.id, exists().where(same_id))
+    # 旧文件中在新文件里已经不存在的意图
+    removed = count(old, old.file_id == previous.id, ~exists().where(
+        (new.file_id == uploaded_file.id) & (new.intent_id == old.intent_id)
+    ))
+    return {
+        'previous_file_id': previous.id,
+        'unchanged': unchanged,
+        'changed': matched - unchanged,
+        'added': (uploaded_file.total_items or 0) - matched,
+        'removed': removed,
+        'carried_over': carried,
+    }
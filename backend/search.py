@@ -0,0 +1,78 @@
+from sqlalchemy import column, or_, select, table, text
+
+from config import Config
+from models import db, Intent, UploadedFile
+
+# 可与关键词组合使用的筛选字段
+SEARCH_FILTERS = ('file_id', 'stage', 'category', 'judgement', 'review_status', 'judged_by')
+
+# trigram 索引只能加速不少于3个字符的关键词
+_MIN_INDEXED_LENGTH = 3
+
+_fts = table('intents_fts', column('rowid'))
+
+# engine -> 是否存在 intents_fts 表
+_fts_available = {}
+
+
+def has_fts(engine):
+    """SQLite 上是否已建立 FTS5 索引（结果按 engine 缓存）"""
+    if engine.dialect.name != 'sqlite':
+        return False
+    if engine not in _fts_available:
+        with engine.connect() as conn:
+            _fts_available[engine] = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'intents_fts'"
+            )).first() is not None
+    return _fts_available[engine]
+
+
+def _like_pattern(keyword):
+    escaped = keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search_query(keyword, filters):
+    """构造意图搜索查询：关键词匹配 original_comment/modified_content，再叠加字段筛选
+
+    SQLite 上使用 FTS5 trigram 索引，Postgres 上 ILIKE 由 pg_trgm GIN 索引加速，
+    其他情况退化为 LIKE。返回 (query, 分页键列, 扫描跨度)：使用FTS时按索引的 rowid 分页，
+    这样常见关键词也能按ID顺序逐条取出匹配项，取满一页即停止。
+    少于3个字符的关键词（如“面试”）用不上 trigram 索引，只能逐行 LIKE 匹配：指定了 file_id 时
+    扫描限制在一个文件内，否则扫描跨度为 SEARCH_SCAN_ROWS，调用方每次请求只扫描这么多ID
+    （见 pagination.windowed_page），不需要限制时扫描跨度为 None。
+    """
+    keyword = (keyword or '').strip()
+    span = None
+    if keyword and len(keyword) < _MIN_INDEXED_LENGTH and filters.get('file_id') in (None, ''):
+        span = Config.SEARCH_SCAN_ROWS
+
+    # 已软删除、等待清理或尚未导入完成的文件中的意图不出现在结果中
+    query = Intent.query.filter(Intent.file_id.notin_(
+        select(UploadedFile.id).where(~UploadedFile.visible())
+    ))
+    for field in SEARCH_FILTERS:
+        if filters.get(field) not in (None, ''):
+            query = query.filter(getattr(Intent, field) == filters[field])
+
+    if not keyword:
+        return query, Intent.id, None
+
+    engine = db.engine
+    if len(keyword) >= _MIN_INDEXED_LENGTH and has_fts(engine):
+        phrase = '"' + keyword.replace('"', '""') + '"'
+        query = query.join(_fts, _fts.c.rowid == Intent.id).filter(
+            text('intents_fts MATCH :phrase').bindparams(phrase=phrase)
+        )
+        return query, _fts.c.rowid, None
+
+    pattern = _like_pattern(keyword)
+    if engine.dialect.name == 'postgresql':
+        return query.filter(or_(
+            Intent.original_comment.ilike(pattern, escape='\\'),
+            Intent.modified_content.ilike(pattern, escape='\\')
+        )), Intent.id, span
+    return query.filter(or_(
+        Intent.original_comment.like(pattern, escape='\\'),
+        Intent.modified_content.like(pattern, escape='\\')
+    )), Intent.id, span
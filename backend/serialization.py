@@ -0,0 +1,122 @@
+import json
+import zlib
+
+from flask import Response, request
+
+from config import Config
+from models import format_datetime
+
+try:
+    import orjson
+except ImportError:  # 未安装时使用标准库
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 按优先顺序支持的压缩编码，未安装 brotli 时只使用 gzip
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# 行元组中需要格式化的时间列，以及为空时返回空字符串的列（与 to_dict 一致）
+_DATETIME_FIELDS = frozenset(('judge_date', 'claim_expires_at', 'created_at'))
+_BLANK_FIELDS = frozenset(('claimed_by',))
+
+
+def dumps(obj):
+    """序列化为UTF-8编码的JSON字节串，中文不转义；安装了 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_indent(obj):
+    """与 json.dumps(obj, ensure_ascii=False, indent=2) 结果相同的字符串"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def parse_fields(value, allowed):
+    """解析 fields 参数（逗号分隔），返回按 allowed 顺序排列的字段元组，id 总是包含在内
+
+    未提供时返回全部字段，包含未知字段时抛出 ValueError。
+    """
+    if not value:
+        return tuple(allowed)
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(sorted(unknown))}")
+    requested.add('id')
+    return tuple(field for field in allowed if field in requested)
+
+
+def rows_to_dicts(rows, fields):
+    """把按 fields 顺序选出的行元组转为字典，时间列的格式与 to_dict 相同"""
+    dates = [field for field in fields if field in _DATETIME_FIELDS]
+    blanks = [field for field in fields if field in _BLANK_FIELDS]
+    items = []
+    for row in rows:
+        item = dict(zip(fields, row))
+        for field in dates:
+            item[field] = format_datetime(item[field])
+        for field in blanks:
+            item[field] = item[field] or ''
+        items.append(item)
+    return items
+
+
+def negotiate_encoding():
+    """根据 Accept-Encoding 选择压缩编码，客户端不接受压缩时返回 None"""
+    for encoding in ENCODINGS:
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=Config.BROTLI_QUALITY)
+    return zlib.compress(data, Config.GZIP_LEVEL, wbits=31)
+
+
+def compress_response(response):
+    """按客户端支持的编码压缩已生成的响应，较小的响应不压缩
+
+    压缩后的 ETag 加上编码后缀，与未压缩的表示区分（not_modified 两者都接受）。
+    """
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if (encoding is None or response.status_code != 200 or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < Config.COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+
+def compress_stream(chunks, encoding):
+    """逐块压缩流式响应（字符串块），压缩器内部缓冲，内存占用与总大小无关"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=Config.BROTLI_QUALITY)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(Config.GZIP_LEVEL, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        data = process(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield finish()
@@ -0,0 +1,309 @@
+import random
+import re
+from itertools import groupby, islice
+from operator import itemgetter
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import aliased
+
+from models import db, Intent, IntentBand, UploadedFile
+from ingest import bulk_insert
+
+try:
+    import numpy as np
+except ImportError:  # 未安装时使用纯Python实现，签名结果完全相同
+    np = None
+
+# LSH 参数：签名长度为 NUM_BANDS * BAND_ROWS，一对意图至少有一个 band 完全相同时成为候选，
+# 相似度为 s 的两条意图成为候选的概率为 1 - (1 - s^3)^10（s=0.6 时约 0.91，s=0.3 时约 0.24）。
+# 修改这些参数或分片方式后需要用 build-similarity-index --rebuild 重建分桶
+NUM_BANDS = 10
+BAND_ROWS = 3
+NUM_PERM = NUM_BANDS * BAND_ROWS
+# 字符片段长度：中文意图较短，使用相邻两个字符
+SHINGLE_SIZE = 2
+
+# 哈希函数族 h(x) = (a * x + b) mod p，系数用固定种子生成，保证不同进程算出的签名一致
+_PRIME = (1 << 31) - 1
+_rng = random.Random(7303)
+_COEFFS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+if np is not None:
+    _A = np.array([a for a, _ in _COEFFS], dtype=np.uint64)[:, None]
+    _B = np.array([b for _, b in _COEFFS], dtype=np.uint64)[:, None]
+
+# 字符片段的编码：两个字符的码位（小于 2^21）拼接后对 p 取模，可以整批用数组运算得到，
+# 不再逐个片段计算哈希。片段长度固定为2，只有一个字符的文本第二个码位记为0
+_CODE_SHIFT = 21
+
+# 分桶键：band 序号和该 band 的签名值依次经过 64 位整数混合（murmur3 的 fmix64），同样可以整批计算
+_MASK64 = (1 << 64) - 1
+_MIX_STEP = 0x9E3779B97F4A7C15
+_FMIX1 = 0xFF51AFD7ED558CCD
+_FMIX2 = 0xC4CEB9FE1A85EC53
+
+# 比较前去掉空白和标点，英文统一小写
+_IGNORED = re.compile(r'[\W_]+')
+
+
+def _normalize(text):
+    return _IGNORED.sub('', str(text or '').lower())
+
+
+def shingles(text):
+    """文本的字符片段集合，文本（去掉空白和标点后）短于片段长度时为整段文本"""
+    text = _normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _shingle_code(shingle):
+    second = ord(shingle[1]) if len(shingle) > 1 else 0
+    return ((ord(shingle[0]) << _CODE_SHIFT) | second) % _PRIME
+
+
+def _fmix(h):
+    h ^= h >> 33
+    h = (h * _FMIX1) & _MASK64
+    h ^= h >> 33
+    h = (h * _FMIX2) & _MASK64
+    return h ^ (h >> 33)
+
+
+def band_keys(signature):
+    """签名每个 band 的分桶键（带符号的64位整数，包含 band 序号，不同 band 不会相同）"""
+    keys = []
+    for band in range(NUM_BANDS):
+        h = band
+        for value in signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]:
+            h = _fmix((h * _MIX_STEP + value + 1) & _MASK64)
+        keys.append(h - (1 << 64) if h >> 63 else h)
+    return keys
+
+
+def signatures(texts):
+    """一批文本的 MinHash 签名（长度为 NUM_PERM 的整数元组），没有字符片段的文本为 None"""
+    sets = [shingles(text) for text in texts]
+    # 同一批文本中重复出现的片段只计算一次哈希值
+    cache = {}
+    result = []
+    for shingle_set in sets:
+        if not shingle_set:
+            result.append(None)
+            continue
+        vectors = []
+        for shingle in shingle_set:
+            vector = cache.get(shingle)
+            if vector is None:
+                x = _shingle_code(shingle)
+                vector = cache[shingle] = tuple((a * x + b) % _PRIME for a, b in _COEFFS)
+            vectors.append(vector)
+        result.append(tuple(map(min, *vectors)) if len(vectors) > 1 else vectors[0])
+    return result
+
+
+def _band_keys_python(texts):
+    return [band_keys(signature) if signature is not None else None for signature in signatures(texts)]
+
+
+def _band_keys_numpy(texts):
+    """整批文本的分桶键：所有文本的码位拼成一个数组，片段编码、哈希、按文本取最小值和分桶键都是数组运算"""
+    cleaned = [_normalize(text) for text in texts]
+    lengths = np.fromiter(map(len, cleaned), dtype=np.int64, count=len(cleaned))
+    result = [None] * len(cleaned)
+    if not lengths.any():
+        return result
+    codes = np.frombuffer(''.join(cleaned).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    ends = np.cumsum(lengths)[lengths > 0]
+    # 每个位置与下一个字符组成片段；文本的最后一个字符没有下一个字符，
+    # 除非文本只有一个字符（整段文本作为唯一的片段），否则不构成片段
+    second = np.append(codes[1:], np.uint64(0))
+    second[ends - 1] = 0
+    keep = np.ones(len(codes), dtype=bool)
+    keep[ends - 1] = lengths[lengths > 0] == 1
+    xs = ((codes << np.uint64(_CODE_SHIFT)) | second)[keep] % np.uint64(_PRIME)
+    counts = np.where(lengths > 1, lengths - 1, lengths)
+    present = np.flatnonzero(counts)
+    # a < 2^31、x < 2^31，a * x + b 不会超出 uint64
+    values = (_A * xs[None, :] + _B) % np.uint64(_PRIME)
+    offsets = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+    mins = np.minimum.reduceat(values, offsets, axis=1)
+
+    keys = np.empty((NUM_BANDS, len(present)), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for band in range(NUM_BANDS):
+            h = np.full(len(present), band, dtype=np.uint64)
+            for row in mins[band * BAND_ROWS:(band + 1) * BAND_ROWS]:
+                h = h * np.uint64(_MIX_STEP) + row + np.uint64(1)
+                h ^= h >> np.uint64(33)
+                h *= np.uint64(_FMIX1)
+                h ^= h >> np.uint64(33)
+                h *= np.uint64(_FMIX2)
+                h ^= h >> np.uint64(33)
+            keys[band] = h
+    for column, key_list in zip(present.tolist(), keys.view(np.int64).T.tolist()):
+        result[column] = key_list
+    return result
+
+
+def text_band_keys(texts):
+    """一批文本各自的分桶键列表，没有字符片段的文本为 None（有无 numpy 结果相同）"""
+    return _band_keys_numpy(texts) if np is not None else _band_keys_python(texts)
+
+
+def _band_rows(file_id, intents):
+    ids, texts = zip(*intents)
+    for intent_id, keys in zip(ids, text_band_keys(texts)):
+        if keys is None:
+            continue
+        for band, key in enumerate(keys):
+            yield {'intent_id': intent_id, 'band': band, 'band_key': key, 'file_id': file_id}
+
+
+def index_file(file_id, batch_size=1000, on_progress=None):
+    """为文件中的意图写入分桶，返回本次写入分桶的意图数量
+
+    按ID分批读取意图原文，每批计算签名后批量插入并提交，不长时间持有写锁。
+    从文件已有分桶的最大意图ID之后继续，中断后重新执行不会重复写入；文件被删除后停止。
+    on_progress(已处理的意图数) 在每批提交后调用。
+    """
+    indexed = processed = 0
+    last_id = db.session.scalar(select(func.max(IntentBand.intent_id)).where(IntentBand.file_id == file_id)) or 0
+    while True:
+        if not db.session.scalar(select(UploadedFile.id).where(UploadedFile.id == file_id,
+                                                               UploadedFile.deleted_at.is_(None))):
+            return indexed
+        intents = db.session.execute(
+            select(Intent.id, Intent.original_comment)
+            .where(Intent.file_id == file_id, Intent.id > last_id)
+            .order_by(Intent.id).limit(batch_size)
+        ).all()
+        if not intents:
+            return indexed
+        last_id = intents[-1][0]
+        indexed += bulk_insert(IntentBand.__table__, _band_rows(file_id, intents), batch_size * NUM_BANDS) // NUM_BANDS
+        db.session.commit()
+        processed += len(intents)
+        if on_progress:
+            on_progress(processed)
+
+
+def build_index(rebuild=False, batch_size=1000):
+    """为还没有分桶的意图文件建立分桶（rebuild 时清空后全部重建），返回处理的文件数"""
+    if rebuild:
+        db.session.execute(delete(IntentBand))
+        db.session.commit()
+    indexed_files = select(IntentBand.file_id).distinct()
+    file_ids = db.session.execute(
+        select(UploadedFile.id).where(
+            UploadedFile.item_table == 'intents',
+            UploadedFile.visible(),
+            UploadedFile.id.notin_(indexed_files),
+        ).order_by(UploadedFile.id)
+    ).scalars().all()
+    for file_id in file_ids:
+        index_file(file_id, batch_size)
+    return len(file_ids)
+
+
+def _active_band(scope_file_id):
+    """候选一侧的分桶，只在指定文件内或全部可见（未删除且已导入完成）的文件中查找"""
+    other = aliased(IntentBand)
+    if scope_file_id is not None:
+        return other, [other.file_id == scope_file_id]
+    deleted = select(UploadedFile.id).where(~UploadedFile.visible())
+    return other, [other.file_id.notin_(deleted)]
+
+
+def _texts(ids):
+    texts = {}
+    ids = list(ids)
+    for i in range(0, len(ids), 500):
+        texts.update(db.session.execute(
+            select(Intent.id, Intent.original_comment).where(Intent.id.in_(ids[i:i + 500]))
+        ).all())
+    return texts
+
+
+def similar_intents(intent_id, threshold, scope_file_id=None, limit=100):
+    """与意图相似度不低于 threshold 的意图，返回按相似度从高到低排列的 [(id, 相似度)]
+
+    候选来自与该意图至少有一个分桶键相同的意图（走 band_key 索引），再按字符片段
+    的 Jaccard 相似度精确过滤。意图没有分桶（原文为空或尚未建立索引）时返回空列表。
+    """
+    other, conditions = _active_band(scope_file_id)
+    mine = select(IntentBand.band_key).where(IntentBand.intent_id == intent_id)
+    candidates = db.session.execute(
+        select(other.intent_id).distinct()
+        .where(other.band_key.in_(mine), other.intent_id != intent_id, *conditions)
+    ).scalars().all()
+    if not candidates:
+        return []
+    texts = _texts([intent_id, *candidates])
+    base = shingles(texts.get(intent_id))
+    scored = [(cid, jaccard(base, shingles(texts.get(cid)))) for cid in candidates]
+    scored = [(cid, round(score, 4)) for cid, score in scored if score >= threshold]
+    scored.sort(key=lambda pair: (-pair[1], pair[0]))
+    return scored[:limit]
+
+
+def _buckets(file_id, across_files, max_bucket):
+    """逐个返回有两条以上意图的分桶（意图ID列表，文件自身的意图排在前面，最多 max_bucket 条）"""
+    if across_files:
+        other, conditions = _active_band(None)
+        keys = select(IntentBand.band_key).where(IntentBand.file_id == file_id)
+        conditions.append(other.band_key.in_(keys))
+    else:
+        other, conditions = IntentBand, [IntentBand.file_id == file_id]
+    rows = db.session.execute(
+        select(other.band_key, other.intent_id).where(*conditions)
+        .order_by(other.band_key, other.file_id != file_id, other.intent_id)
+    )
+    for _, members in groupby(rows, key=itemgetter(0)):
+        bucket = [intent_id for _, intent_id in islice(members, max_bucket)]
+        if len(bucket) > 1:
+            yield bucket
+
+
+def duplicate_clusters(file_id, threshold, across_files=False, max_bucket=1000):
+    """文件中近似重复的意图簇，across_files 时簇中也包括其他文件里的相似意图
+
+    按 band_key 顺序读取一次分桶，同一分桶内的意图只与分桶的代表（第一条，优先取本文件的意图）
+    比较相似度并用并查集合并，已在同一簇中的不再比较，计算量与分桶行数成正比，不枚举所有候选对。
+    每个分桶最多处理 max_bucket 条意图（大量完全相同的内容会落在同一分桶中）。
+    返回按大小从大到小排列的ID列表（每个簇至少两条，ID升序）。
+    """
+    buckets = list(_buckets(file_id, across_files, max_bucket))
+    if not buckets:
+        return []
+    sets = {intent_id: shingles(text)
+            for intent_id, text in _texts({i for bucket in buckets for i in bucket}).items()}
+
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for representative, *members in buckets:
+        base = sets.get(representative)
+        for member in members:
+            root_a, root_b = find(representative), find(member)
+            if root_a != root_b and jaccard(base, sets.get(member)) >= threshold:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters = {}
+    for intent_id in parent:
+        clusters.setdefault(find(intent_id), []).append(intent_id)
+    result = [sorted(members) for members in clusters.values() if len(members) > 1]
+    result.sort(key=lambda members: (-len(members), members[0]))
+    return result
@@ -0,0 +1,264 @@
+import fcntl
+import gzip
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import func, or_, select
+
+from models import db, Intent, UploadedFile, Change
+from changes import change_position, cursor_expired, head_seq
+from serialization import dumps
+from storage import remove_upload
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装时写入字典编码的列式JSON
+    pa = pq = None
+
+# 快照的列：(列名, 查询的列, 类型, 是否字典编码)，取值种类少的文本列使用字典编码
+SNAPSHOT_COLUMNS = (
+    ('id', Intent.id, 'int', False),
+    ('file_id', Intent.file_id, 'int', False),
+    ('source_file', UploadedFile.source_file, 'str', True),
+    ('original_filename', UploadedFile.original_filename, 'str', True),
+    ('file_created_at', UploadedFile.created_at, 'datetime', False),
+    ('intent_id', Intent.intent_id, 'str', False),
+    ('stage', Intent.stage, 'str', True),
+    ('category', Intent.category, 'str', True),
+    ('original_comment', Intent.original_comment, 'str', False),
+    ('comment_hash', Intent.comment_hash, 'str', False),
+    ('judgement', Intent.judgement, 'str', True),
+    ('judged_by', Intent.judged_by, 'str', True),
+    ('modified_content', Intent.modified_content, 'str', False),
+    ('judge_date', Intent.judge_date, 'datetime', False),
+    ('review_status', Intent.review_status, 'str', True),
+    ('version', Intent.version, 'int', False),
+)
+COLUMN_NAMES = tuple(name for name, _, _, _ in SNAPSHOT_COLUMNS)
+DICTIONARY_COLUMNS = tuple(name for name, _, _, encoded in SNAPSHOT_COLUMNS if encoded)
+_DATETIME_COLUMNS = tuple(name for name, _, kind, _ in SNAPSHOT_COLUMNS if kind == 'datetime')
+
+# 列式JSON的格式名，写在文件第一行
+COLUMNS_FORMAT = 'ontology-review-columns'
+
+SNAPSHOT_MIMETYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'cols.gz': 'application/gzip',
+}
+
+MANIFEST = 'manifest.json'
+
+
+class SnapshotBusy(Exception):
+    """已有快照任务正在运行"""
+
+
+class ParquetSegmentWriter:
+    """用 pyarrow 按批写入 Parquet 文件，每批是一个 row group"""
+
+    extension = 'parquet'
+
+    def __init__(self, path):
+        types = {'int': pa.int64(), 'str': pa.string(), 'datetime': pa.timestamp('s')}
+        self.schema = pa.schema([(name, types[kind]) for name, _, kind, _ in SNAPSHOT_COLUMNS])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd',
+                                       use_dictionary=list(DICTIONARY_COLUMNS))
+
+    def write(self, columns):
+        self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class ColumnsSegmentWriter:
+    """没有 pyarrow 时的列式格式：gzip压缩的JSON行文件
+
+    第一行为列定义；之后每行一批：{"rows": 行数, "columns": {列名: 值列表}}。
+    字典编码的列写为 {"dictionary": 本批新增的取值, "indices": 每行取值的序号}，
+    序号指向文件中到该批为止累积的字典，相同的取值在整个文件中只写一次。
+    时间列为 YYYY-MM-DD HH:MM:SS 格式的字符串。可用 read_columns 读取。
+    """
+
+    extension = 'cols.gz'
+
+    def __init__(self, path, compresslevel=6):
+        self.fp = gzip.open(path, 'wb', compresslevel=compresslevel)
+        self.dictionaries = {name: {} for name in DICTIONARY_COLUMNS}
+        self.fp.write(dumps({
+            'format': COLUMNS_FORMAT,
+            'version': 1,
+            'columns': [{'name': name, 'type': kind, 'encoding': 'dictionary' if encoded else 'plain'}
+                        for name, _, kind, encoded in SNAPSHOT_COLUMNS]
+        }) + b'\n')
+
+    def write(self, columns):
+        chunk = {}
+        for name, values in columns.items():
+            if name in _DATETIME_COLUMNS:
+                values = [value.isoformat(' ', 'seconds') if value else None for value in values]
+            codes = self.dictionaries.get(name)
+            if codes is None:
+                chunk[name] = values
+                continue
+            added, indices = [], []
+            for value in values:
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(codes)
+                    added.append(value)
+                indices.append(code)
+            chunk[name] = {'dictionary': added, 'indices': indices}
+        self.fp.write(dumps({'rows': len(columns['id']), 'columns': chunk}) + b'\n')
+
+    def close(self):
+        self.fp.close()
+
+
+def read_columns(path):
+    """逐批读取列式JSON快照，每批返回 {列名: 值列表}（字典编码的列已还原）"""
+    with gzip.open(path, 'rb') as fp:
+        header = json.loads(fp.readline())
+        if header.get('format') != COLUMNS_FORMAT:
+            raise ValueError('不是列式JSON快照文件')
+        dictionaries = {c['name']: [] for c in header['columns'] if c['encoding'] == 'dictionary'}
+        for line in fp:
+            chunk = json.loads(line)['columns']
+            for name, values in dictionaries.items():
+                values.extend(chunk[name]['dictionary'])
+                chunk[name] = [values[i] for i in chunk[name]['indices']]
+            yield chunk
+
+
+def segment_writer():
+    return ParquetSegmentWriter if pq is not None else ColumnsSegmentWriter
+
+
+def load_manifest(folder):
+    """快照目录的清单，没有快照时返回空清单"""
+    try:
+        with open(os.path.join(folder, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'segments': [], 'watermark': None}
+
+
+def _save_manifest(folder, manifest):
+    path = os.path.join(folder, MANIFEST)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _deleted_files(since_seq, head):
+    """变更日志中位置在 (since_seq, head] 之间被删除（或软删除）的文件ID"""
+    position = change_position()
+    changed = db.session.execute(
+        select(Change.entity_id).distinct()
+        .where(Change.entity == 'file', position > since_seq, position <= head)
+    ).scalars().all()
+    if not changed:
+        return []
+    active = set(db.session.execute(
+        select(UploadedFile.id).where(UploadedFile.id.in_(changed), UploadedFile.visible())
+    ).scalars())
+    return sorted(set(changed) - active)
+
+
+def build_snapshot(folder, incremental=False, batch_size=10000, on_rows=None):
+    """把全部（未删除文件的）意图及所属文件的信息按批写入一个列式快照分段，返回分段信息
+
+    incremental 时只写入上次快照之后新增或核对内容有变化的意图（依据变更日志的 seq
+    和意图的最大ID），分段追加到清单中，读取时同一 id 以最后一个分段中的行为准，
+    deleted_file_ids 中的文件应整体去掉。没有上次快照，或变更日志已被清理到上次快照
+    之后时退回全量快照。全量快照完成后删除之前的分段。内存占用只与 batch_size 有关。
+    """
+    os.makedirs(folder, exist_ok=True)
+    # 用 flock 而不是锁文件是否存在来互斥：进程异常退出时锁由系统释放，遗留的 .lock 文件不影响之后的快照。
+    # 锁文件不删除，否则其他进程可能锁住新建的另一个文件而同时运行
+    fd = os.open(os.path.join(folder, '.lock'), os.O_CREAT | os.O_WRONLY)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise SnapshotBusy('已有快照任务正在运行')
+        return _build_snapshot(folder, incremental, batch_size, on_rows)
+    finally:
+        os.close(fd)
+
+
+def _build_snapshot(folder, incremental, batch_size, on_rows):
+    manifest = load_manifest(folder)
+    since = manifest.get('watermark') if incremental else None
+    if since and cursor_expired(since['seq']):
+        since = None
+    # 先记录水位，读取期间的新变更留给下一次增量快照（可能重复写入，以最后一行为准）。
+    # 正在导入的文件完成后其意图不会产生变更记录，水位停在这些意图之前，留给之后的快照
+    max_id = db.session.scalar(select(func.max(Intent.id))) or 0
+    importing = db.session.scalar(select(func.min(Intent.id)).where(
+        Intent.file_id.in_(select(UploadedFile.id).where(UploadedFile.importing.is_(True)))
+    ))
+    if importing is not None:
+        max_id = min(max_id, importing - 1)
+    watermark = {'seq': head_seq(), 'max_id': max_id}
+
+    stmt = select(*[column for _, column, _, _ in SNAPSHOT_COLUMNS]) \
+        .join(UploadedFile, UploadedFile.id == Intent.file_id) \
+        .where(UploadedFile.visible(), Intent.id <= watermark['max_id'])
+    if since:
+        position = change_position()
+        changed = select(Change.entity_id).where(
+            Change.entity == 'intent', position > since['seq'], position <= watermark['seq']
+        )
+        stmt = stmt.where(or_(Intent.id > since['max_id'], Intent.id.in_(changed)))
+
+    writer_class = segment_writer()
+    created_at = datetime.now()
+    mode = 'incremental' if since else 'full'
+    name = f"snapshot_{created_at.strftime('%Y%m%d_%H%M%S_%f')}_{mode}.{writer_class.extension}"
+    path = os.path.join(folder, name)
+    tmp_path = path + '.tmp'
+
+    rows = 0
+    last_id = 0
+    writer = writer_class(tmp_path)
+    try:
+        while True:
+            # 按ID分批读取（走主键索引），每批转为列后立即写出
+            batch = db.session.execute(stmt.where(Intent.id > last_id).order_by(Intent.id).limit(batch_size)).all()
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            writer.write(dict(zip(COLUMN_NAMES, map(list, zip(*batch)))))
+            rows += len(batch)
+            if on_rows:
+                on_rows(rows)
+        writer.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        writer.close()
+        remove_upload(tmp_path)
+        raise
+
+    segment = {
+        'name': name,
+        'mode': mode,
+        'format': writer_class.extension,
+        'rows': rows,
+        'created_at': created_at.isoformat(' ', 'seconds'),
+        'deleted_file_ids': _deleted_files(since['seq'], watermark['seq']) if since else [],
+    }
+    previous = manifest['segments'] if since else []
+    if since and not rows and not segment['deleted_file_ids']:
+        # 没有变化时不追加空分段，只推进水位
+        remove_upload(path)
+        _save_manifest(folder, {'segments': previous, 'watermark': watermark})
+        return segment
+    _save_manifest(folder, {'segments': previous + [segment], 'watermark': watermark})
+    if not since:
+        for old in manifest['segments']:
+            remove_upload(os.path.join(folder, old['name']))
+    return segment
@@ -0,0 +1,64 @@
+from sqlalchemy import func, select
+
+from models import db, ReviewStat, REVIEW_PENDING
+from migrations import rebuild_review_stats
+
+# 可用于分组的统计维度
+STAT_DIMENSIONS = ('file_id', 'stage', 'category', 'judgement', 'review_status', 'judged_by')
+
+
+def _is_reviewed(status):
+    return status not in (REVIEW_PENDING, '')
+
+
+def review_statistics(file_id=None):
+    """返回单个文件或全部文件的核对进度分项统计，只读取汇总表"""
+    stmt = select(ReviewStat).where(ReviewStat.item_count > 0)
+    if file_id is not None:
+        stmt = stmt.where(ReviewStat.file_id == file_id)
+
+    result = {
+        'total_items': 0,
+        'reviewed_items': 0,
+        'by_file': {},
+        'by_stage': {},
+        'by_category': {},
+        'by_judgement': {},
+        'by_review_status': {},
+        'by_reviewer': {},
+    }
+    for row in db.session.execute(stmt).scalars():
+        count = row.item_count
+        reviewed = count if _is_reviewed(row.review_status) else 0
+        result['total_items'] += count
+        result['reviewed_items'] += reviewed
+        for key, value in (('by_file', row.file_id), ('by_stage', row.stage), ('by_category', row.category)):
+            bucket = result[key].setdefault(value, {'total': 0, 'reviewed': 0})
+            bucket['total'] += count
+            bucket['reviewed'] += reviewed
+        result['by_review_status'][row.review_status] = result['by_review_status'].get(row.review_status, 0) + count
+        if reviewed:
+            result['by_judgement'][row.judgement] = result['by_judgement'].get(row.judgement, 0) + count
+            if row.judged_by:
+                result['by_reviewer'][row.judged_by] = result['by_reviewer'].get(row.judged_by, 0) + count
+    return result
+
+
+def grouped_statistics(group_by, file_id=None):
+    """按任意维度组合分组统计，返回 [{维度...: 值, 'count': n}]"""
+    columns = [getattr(ReviewStat, d) for d in group_by]
+    stmt = (
+        select(*columns, func.sum(ReviewStat.item_count).label('count'))
+        .where(ReviewStat.item_count > 0)
+        .group_by(*columns)
+        .order_by(*columns)
+    )
+    if file_id is not None:
+        stmt = stmt.where(ReviewStat.file_id == file_id)
+    return [dict(row._mapping) for row in db.session.execute(stmt)]
+
+
+def rebuild_statistics():
+    """从 intents 重建汇总表"""
+    rebuild_review_stats(db.session.connection())
+    db.session.commit()
@@ -0,0 +1,92 @@
+import gzip
+import hashlib
+import os
+import uuid
+
+from config import Config
+from models import db, UploadedFile
+from logger import logger
+
+# 重复上传的处理方式：reject 拒绝，link 直接返回已有的文件记录
+DUPLICATE_POLICIES = ('reject', 'link')
+
+
+def upload_path(filename):
+    return os.path.join(Config.UPLOAD_FOLDER, filename)
+
+
+def remove_upload(file_path):
+    """删除磁盘上的文件，失败时只记录警告"""
+    if os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except Exception as e:
+            logger.warning(f"无法删除文件: {e}")
+
+
+def save_upload(stream, chunk_size=64 * 1024):
+    """把上传内容按内容哈希压缩保存，返回 (相对路径, sha256, 原始字节数)
+
+    边读边计算哈希并gzip压缩，内容相同的上传只保存一份。
+    """
+    os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+    tmp_path = upload_path(f'.tmp-{uuid.uuid4().hex}.gz')
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as gz:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                gz.write(chunk)
+                size += len(chunk)
+        digest = hasher.hexdigest()
+        filename = f'{digest[:2]}/{digest}.json.gz'
+        final_path = upload_path(filename)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, final_path)
+    except Exception:
+        remove_upload(tmp_path)
+        raise
+    return filename, digest, size
+
+
+def hash_stream(stream, chunk_size=64 * 1024):
+    """只计算内容哈希（磁盘不可写时使用），读取后把流重置到开头"""
+    hasher = hashlib.sha256()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        hasher.update(chunk)
+    stream.seek(0)
+    return hasher.hexdigest()
+
+
+def open_upload(filename):
+    """打开保存的上传文件，兼容旧版未压缩的文件"""
+    path = upload_path(filename)
+    if filename.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def find_duplicate(content_hash):
+    """查找内容相同的已上传文件"""
+    return UploadedFile.query.filter(UploadedFile.content_hash == content_hash, UploadedFile.visible()) \
+        .order_by(UploadedFile.id).first()
+
+
+def release_upload(filename, exclude_id=None):
+    """没有其他文件记录引用该存储文件时删除它"""
+    query = UploadedFile.query.filter_by(filename=filename)
+    if exclude_id is not None:
+        query = query.filter(UploadedFile.id != exclude_id)
+    if db.session.query(query.exists()).scalar():
+        return
+    remove_upload(upload_path(filename))
@@ -0,0 +1,289 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+from config import Config
+from models import db, UploadedFile, Intent, IntentBand, StepItem, ReviewStat, Job
+from logger import logger
+from ingest import ingest_intents, ingest_items
+from counters import touch_file
+from revisions import find_previous_revision, merge_revision
+from similarity import index_file
+from jobs import job_runner, JobQueueFull
+from storage import remove_upload, open_upload, release_upload
+from exports import generate_export
+from export_cache import export_cache
+from snapshots import build_snapshot
+
+# 删除文件的方式：hard 在请求中用批量 DELETE 删除，soft 立即隐藏文件并由后台任务分块清理
+DELETE_MODES = ('hard', 'soft')
+
+
+def import_upload(uploaded_file, source, on_progress=None, merge=False):
+    """把上传内容解析写入文件对应的条目表，并更新文件记录的来源和数量
+
+    文件记录需已以 importing=True 提交。条目每写入一批就提交一次，写锁只在单批写入期间持有，
+    导入期间其他请求的核对不会因等待写锁而失败；文件在导入完成前不可见，
+    最后在一个短事务中更新来源和数量并清除 importing 标记。
+    导入失败时调用方应使用 discard_import 清理已提交的部分。
+    merge 为 True 时与同一 source_file 的上一版本比对，沿用未变化意图的核对结果。
+    意图文件导入完成后提交建立近似重复分桶的后台任务。
+    返回 (条目数量, 比对结果)，没有比对时比对结果为 None。
+    """
+    def on_batch(bytes_read):
+        db.session.commit()
+        if on_progress:
+            on_progress(bytes_read)
+
+    ingest = ingest_items if uploaded_file.stores_items else ingest_intents
+    count, metadata = ingest(
+        source, uploaded_file.id,
+        batch_size=Config.INGEST_BATCH_SIZE,
+        chunk_size=Config.INGEST_CHUNK_SIZE,
+        on_progress=on_batch
+    )
+    db.session.commit()
+
+    diff = None
+    uploaded_file.source_file = metadata.get('source_file', uploaded_file.original_filename)
+    uploaded_file.total_items = count
+    if merge and not uploaded_file.stores_items:
+        previous = find_previous_revision(uploaded_file)
+        if previous is not None:
+            diff = merge_revision(uploaded_file, previous)
+            logger.info(f"与上一版本 {previous.id} 比对完成: {diff}")
+    uploaded_file.importing = False
+    touch_file(uploaded_file.id)
+    db.session.commit()
+    if not uploaded_file.stores_items:
+        schedule_similarity_index(uploaded_file.id)
+    return count, diff
+
+
+def schedule_similarity_index(file_id):
+    """开启 SIMILARITY_INDEX 时提交为文件建立近似重复分桶的后台任务，返回任务ID
+
+    分桶在文件导入完成后建立，不增加上传本身的耗时；任务排满时只记录警告，
+    之后可用 build-similarity-index 命令补建。
+    """
+    if not Config.SIMILARITY_INDEX:
+        return None
+    try:
+        return job_runner.submit('similarity', run_similarity_job, file_id, file_id=file_id)
+    except JobQueueFull:
+        logger.warning(f"后台任务已满，文件 {file_id} 的近似重复分桶未建立，可稍后运行 build-similarity-index 补建")
+        return None
+
+
+def run_similarity_job(job, file_id):
+    """后台为文件建立近似重复检测的分桶，进度单位为意图条数"""
+    file = db.session.get(UploadedFile, file_id)
+    if file is None:
+        raise ValueError('文件不存在')
+    job.update(0, file.total_items)
+    indexed = index_file(file_id, Config.INGEST_BATCH_SIZE, on_progress=job.update)
+    return {'file_id': file_id, 'indexed_items': indexed}
+
+
+def discard_import(file_id):
+    """撤销导入失败的文件：分块删除已提交的条目，再删除文件记录"""
+    db.session.rollback()
+    delete_file_rows(file_id, chunk_size=Config.DELETE_CHUNK_SIZE)
+    db.session.execute(delete(UploadedFile).where(UploadedFile.id == file_id))
+    db.session.commit()
+
+
+def run_upload_job(job, file_id, size, merge=False):
+    """后台解析已保存的上传文件，进度单位为（解压后的）字节数"""
+    uploaded_file = db.session.get(UploadedFile, file_id)
+    filename = uploaded_file.filename
+    job.update(0, size)
+    try:
+        with open_upload(filename) as f:
+            item_count, diff = import_upload(uploaded_file, f, on_progress=job.update, merge=merge)
+    except Exception:
+        # 解析失败时撤销文件记录，与同步上传的行为一致
+        discard_import(file_id)
+        release_upload(filename)
+        raise
+    logger.info(f"后台导入完成: {uploaded_file.original_filename}, 共 {item_count} 条")
+    return {'file_id': file_id, 'total_items': item_count, 'diff': diff}
+
+
+def run_export_job(job, file_id, export_format):
+    """后台把导出内容写入 EXPORT_FOLDER，进度单位为意图条数"""
+    file = db.session.get(UploadedFile, file_id)
+    if file is None or not file.is_visible:
+        raise ValueError('文件不存在')
+    os.makedirs(Config.EXPORT_FOLDER, exist_ok=True)
+    filename = f"intent_review_{file_id}_{job.job_id}.{export_format}"
+    path = os.path.join(Config.EXPORT_FOLDER, filename)
+
+    done = 0
+    job.update(0, file.total_items)
+
+    def on_rows(n):
+        nonlocal done
+        done += n
+        job.update(done)
+
+    try:
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            for chunk in generate_export(file, export_format, Config.EXPORT_BATCH_SIZE, on_rows):
+                f.write(chunk)
+    except Exception:
+        remove_upload(path)
+        raise
+    return {
+        'file_id': file_id,
+        'format': export_format,
+        'filename': filename,
+        'download_url': f'/api/jobs/{job.job_id}/result'
+    }
+
+
+def run_snapshot_job(job, incremental=False):
+    """后台生成分析快照，进度单位为写入的意图条数（全量时总数为意图总数）"""
+    job.update(0, None if incremental else Intent.query.count())
+    segment = build_snapshot(Config.SNAPSHOT_FOLDER, incremental=incremental,
+                             batch_size=Config.SNAPSHOT_BATCH_SIZE, on_rows=job.update)
+    logger.info(f"分析快照生成完成: {segment['name']}, 共 {segment['rows']} 条")
+    return dict(segment, download_url=f"/api/snapshots/{segment['name']}")
+
+
+def delete_file_rows(file_id, chunk_size=5000, on_progress=None):
+    """分块删除文件的意图分桶、意图和通用条目并提交，避免长时间持有写锁，返回删除的条数"""
+    deleted = 0
+    for model, key in ((IntentBand, IntentBand.intent_id), (Intent, Intent.id), (StepItem, StepItem.id)):
+        while True:
+            chunk = select(key).where(model.file_id == file_id).limit(chunk_size).scalar_subquery()
+            count = db.session.execute(
+                delete(model).where(key.in_(chunk)).execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if not count:
+                break
+            if model is not IntentBand:
+                deleted += count
+                if on_progress:
+                    on_progress(deleted)
+    return deleted
+
+
+def delete_file_now(file_id):
+    """用批量 DELETE 删除文件的意图、条目和文件记录（不提交事务），返回删除的条数"""
+    db.session.execute(
+        delete(IntentBand).where(IntentBand.file_id == file_id).execution_options(synchronize_session=False)
+    )
+    deleted = 0
+    for model in (Intent, StepItem):
+        deleted += db.session.execute(
+            delete(model).where(model.file_id == file_id).execution_options(synchronize_session=False)
+        ).rowcount
+    # 触发器只把统计计数减到 0，文件删除后清掉这些行
+    db.session.execute(delete(ReviewStat).where(ReviewStat.file_id == file_id))
+    db.session.execute(delete(UploadedFile).where(UploadedFile.id == file_id))
+    return deleted
+
+
+def soft_delete_file(file):
+    """标记文件已删除，之后文件不再出现在列表和查询中（不提交事务）"""
+    file.deleted_at = datetime.now()
+    touch_file(file.id)
+
+
+def purge_file(file_id, on_progress=None):
+    """分块清理文件的数据和记录，最后删除不再被引用的上传文件，返回删除的条数"""
+    file = db.session.get(UploadedFile, file_id)
+    if file is None:
+        raise ValueError('文件不存在')
+    filename = file.filename
+    deleted = delete_file_rows(file_id, chunk_size=Config.DELETE_CHUNK_SIZE, on_progress=on_progress)
+    db.session.execute(delete(ReviewStat).where(ReviewStat.file_id == file_id))
+    db.session.execute(delete(UploadedFile).where(UploadedFile.id == file_id))
+    db.session.commit()
+    release_upload(filename)
+    export_cache.discard(file_id)
+    return deleted
+
+
+def purge_deleted_files():
+    """清理所有已软删除但尚未清理完成的文件（如后台任务中断），返回清理的文件数"""
+    file_ids = db.session.execute(
+        select(UploadedFile.id).where(UploadedFile.deleted_at.isnot(None))
+    ).scalars().all()
+    for file_id in file_ids:
+        purge_file(file_id)
+    return len(file_ids)
+
+
+def run_delete_job(job, file_id):
+    """后台分块清理已软删除的文件，进度单位为条数"""
+    file = db.session.get(UploadedFile, file_id)
+    if file is None:
+        raise ValueError('文件不存在')
+    job.update(0, file.total_items)
+    original_filename = file.original_filename
+    deleted = purge_file(file_id, on_progress=job.update)
+    logger.info(f"后台删除文件成功: {original_filename}, 共 {deleted} 条")
+    return {'file_id': file_id, 'deleted_items': deleted}
+
+
+def fail_stale_jobs(stale_seconds):
+    """把超过 stale_seconds 没有心跳的排队中/运行中任务标记为失败（执行它的进程已退出），返回任务数
+
+    中断的上传任务留下的未导入完成的文件会被软删除并交给后台清理；中断的分桶任务重新提交。
+    """
+    now = datetime.now()
+    jobs = Job.query.filter(
+        Job.status.in_(('pending', 'running')),
+        func.coalesce(Job.heartbeat_at, Job.started_at, Job.created_at) < now - timedelta(seconds=stale_seconds),
+        Job.id.not_in(list(job_runner.active)),
+    ).all()
+    orphaned, reindex = [], []
+    for job in jobs:
+        job.status = 'failed'
+        job.message = '执行任务的进程已退出，任务中断'
+        job.finished_at = now
+        file = db.session.get(UploadedFile, job.file_id) if job.file_id else None
+        if job.kind == 'upload' and file is not None and file.importing and file.deleted_at is None:
+            soft_delete_file(file)
+            orphaned.append(file.id)
+        elif job.kind == 'similarity' and file is not None and file.is_visible:
+            reindex.append(file.id)
+        logger.warning(f"任务已中断: {job.id}, kind={job.kind}")
+    db.session.commit()
+
+    for file_id in orphaned:
+        try:
+            job_runner.submit('delete', run_delete_job, file_id, file_id=file_id)
+        except JobQueueFull:
+            logger.warning(f"后台任务已满，中断导入的文件 {file_id} 暂未清理")
+    for file_id in reindex:
+        schedule_similarity_index(file_id)
+    return len(jobs)
+
+
+def purge_expired_exports(ttl_seconds):
+    """删除 EXPORT_FOLDER 中超过 ttl_seconds 没有修改的后台导出文件，返回删除的数量（ttl 为0时不清理）"""
+    if ttl_seconds <= 0:
+        return 0
+    cutoff = time.time() - ttl_seconds
+    try:
+        with os.scandir(Config.EXPORT_FOLDER) as entries:
+            expired = [e.path for e in entries if e.is_file() and e.stat().st_mtime < cutoff]
+    except FileNotFoundError:
+        return 0
+    for path in expired:
+        remove_upload(path)
+    return len(expired)
+
+
+def run_maintenance():
+    """启动时及心跳线程中定期执行：清理中断的任务和过期的导出文件"""
+    failed = fail_stale_jobs(Config.JOB_STALE_SECONDS)
+    expired = purge_expired_exports(Config.EXPORT_TTL_SECONDS)
+    if failed or expired:
+        logger.info(f"后台维护: 中断任务 {failed} 个, 过期导出 {expired} 个")
@@ -0,0 +1,70 @@
+"""测试共用的应用和数据库：每次测试运行使用临时目录中的 SQLite 数据库和文件目录
+
+数据库和目录在导入 app 之前通过环境变量和 Config 指定，不会写入仓库中的 data、logs 等目录。
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+
+TMP_DIR = tempfile.mkdtemp(prefix='ontology_review_test_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP_DIR, 'test.db')}"
+# 写锁等待时间缩短（默认5秒），长时间持有写锁的代码会直接表现为 database is locked；
+# 不低于3秒，避免分批提交的写入者与等待者之间偶发的轮询错过导致测试不稳定
+os.environ.setdefault('SQLITE_BUSY_TIMEOUT_MS', '3000')
+
+from config import Config  # noqa: E402
+
+Config.LOG_FILE = os.path.join(TMP_DIR, 'logs', 'app.log')
+Config.UPLOAD_FOLDER = os.path.join(TMP_DIR, 'uploads')
+Config.EXPORT_FOLDER = os.path.join(TMP_DIR, 'exports')
+Config.EXPORT_CACHE_FOLDER = os.path.join(TMP_DIR, 'export_cache')
+Config.SNAPSHOT_FOLDER = os.path.join(TMP_DIR, 'snapshots')
+
+from app import app as flask_app, ensure_db  # noqa: E402
+from generate_dataset import write_dataset  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    ensure_db()
+    yield flask_app
+    # 后台任务在测试结束后仍写日志会报错，先等它们完成
+    wait_for_jobs(flask_app)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def wait_for_jobs(app, timeout=60):
+    """等待所有后台任务（如上传后建立分桶的任务）结束"""
+    from models import db, Job
+    deadline = time.monotonic() + timeout
+    with app.app_context():
+        while Job.query.filter(Job.status.in_(('pending', 'running'))).count():
+            if time.monotonic() > deadline:
+                raise AssertionError('后台任务超时')
+            time.sleep(0.05)
+            db.session.rollback()
+
+
+def dataset(intents, seed=0):
+    """生成含 intents 条意图的上传内容（字节）"""
+    fp = io.StringIO()
+    write_dataset(fp, 4, intents, seed=seed)
+    return fp.getvalue().encode('utf-8')
+
+
+def upload(client, content, filename='intents.json', **form):
+    """上传内容，返回响应"""
+    data = dict(form, file=(io.BytesIO(content), filename))
+    return client.post('/api/upload', data=data, content_type='multipart/form-data')
@@ -0,0 +1,79 @@
+from changes import change_feed, head_seq, prune_changes
+from models import db
+from conftest import dataset, upload, wait_for_jobs
+
+
+def test_feed_returns_reviews_after_cursor(app, client):
+    file_id = upload(client, dataset(20, seed=10), filename='feed.json').get_json()['data']['id']
+    intents = client.get(f'/api/intents?file_id={file_id}&per_page=5').get_json()['data']['items']
+    since = client.get('/api/changes').get_json()['data']['next']
+
+    client.post(f"/api/intents/{intents[0]['id']}/pass", json={'judged_by': 'tester'})
+    client.post(f"/api/intents/{intents[1]['id']}/pass", json={'judged_by': 'tester'})
+
+    data = client.get(f'/api/changes?since={since}&file_id={file_id}').get_json()['data']
+    assert not data['reset']
+    assert {i['id'] for i in data['intents']} == {intents[0]['id'], intents[1]['id']}
+    assert [f['id'] for f in data['files']] == [file_id]
+    assert data['next'] > since
+
+    again = client.get(f"/api/changes?since={data['next']}&file_id={file_id}").get_json()['data']
+    assert again['intents'] == [] and again['next'] == data['next']
+
+
+def test_feed_resets_for_pruned_or_future_cursor(app, client):
+    file_id = upload(client, dataset(10, seed=11), filename='prune.json').get_json()['data']['id']
+    intents = client.get(f'/api/intents?file_id={file_id}&per_page=3').get_json()['data']['items']
+    with app.app_context():
+        since = head_seq()
+    for intent in intents:
+        client.post(f"/api/intents/{intent['id']}/pass", json={'judged_by': 'tester'})
+    with app.app_context():
+        assert change_feed(head_seq() + 10)['reset']
+        assert prune_changes(1) > 0
+        db.session.commit()
+        assert change_feed(since)['reset']
+        assert not change_feed(head_seq())['reset']
+
+
+def test_stream_connections_are_capped(app, client, monkeypatch):
+    import threading
+    import app as app_module
+    from config import Config
+
+    monkeypatch.setattr(Config, 'CHANGE_STREAM_MAX', 1)
+    monkeypatch.setattr(Config, 'CHANGE_STREAM_SECONDS', 1)
+    monkeypatch.setattr(app_module, 'change_stream_slots', threading.BoundedSemaphore(1))
+
+    first = client.get('/api/changes/stream', buffered=False)
+    assert first.status_code == 200
+    second = client.get('/api/changes/stream')
+    assert second.status_code == 503
+    assert second.headers['Retry-After'] == '1'
+    first.close()
+    third = client.get('/api/changes/stream?file_id=1', buffered=False)
+    assert third.status_code == 200
+    assert next(third.response).startswith(b'retry: ')
+    third.close()
+
+
+def test_claims_are_published_without_bumping_the_file_version(app, client):
+    file_id = upload(client, dataset(10, seed=12), filename='claims_feed.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    files = client.get('/api/files?step_type=atomic_intent')
+    since = client.get('/api/changes').get_json()['data']['next']
+
+    claimed = client.post(f'/api/files/{file_id}/claim', json={'reviewer': 'alice', 'limit': 2}).get_json()
+    ids = {i['id'] for i in claimed['data']['items']}
+    assert client.get('/api/files?step_type=atomic_intent',
+                      headers={'If-None-Match': files.headers['ETag']}).status_code == 304
+
+    data = client.get(f'/api/changes?since={since}&file_id={file_id}').get_json()['data']
+    assert {i['id']: i['claimed_by'] for i in data['intents']} == dict.fromkeys(ids, 'alice')
+
+    since = data['next']
+    client.post(f'/api/files/{file_id}/release', json={'reviewer': 'alice'})
+    data = client.get(f'/api/changes?since={since}&file_id={file_id}').get_json()['data']
+    assert {i['id']: i['claimed_by'] for i in data['intents']} == dict.fromkeys(ids, '')
+    assert client.get('/api/files?step_type=atomic_intent',
+                      headers={'If-None-Match': files.headers['ETag']}).status_code == 304
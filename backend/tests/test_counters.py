@@ -0,0 +1,51 @@
+from sqlalchemy import update
+
+from conftest import dataset, upload, wait_for_jobs
+from models import db, UploadedFile
+
+
+def counters(app, file_id):
+    with app.app_context():
+        file = db.session.get(UploadedFile, file_id)
+        return file.total_items, file.reviewed_items
+
+
+def test_reviews_update_reviewed_items_once_per_intent(app, client):
+    file_id = upload(client, dataset(6, seed=80), filename='counters.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    intents = client.get(f'/api/intents?file_id={file_id}&per_page=3').get_json()['data']['items']
+    assert counters(app, file_id) == (6, 0)
+
+    client.post(f"/api/intents/{intents[0]['id']}/review", json={'judgement': '需修改', 'judged_by': 'alice'})
+    assert counters(app, file_id) == (6, 1)
+    # 已核对的意图再次核对或直接通过不重复计数
+    client.post(f"/api/intents/{intents[0]['id']}/review", json={'judgement': '通过', 'judged_by': 'alice'})
+    client.post(f"/api/intents/{intents[0]['id']}/pass", json={'judged_by': 'alice'})
+    assert counters(app, file_id) == (6, 1)
+
+    client.post(f"/api/intents/{intents[1]['id']}/pass", json={'judged_by': 'alice'})
+    client.post('/api/intents/batch', json={'action': 'pass', 'judged_by': 'alice',
+                                            'items': [{'id': i['id']} for i in intents]})
+    assert counters(app, file_id) == (6, 3)
+
+
+def test_reconcile_counters_repairs_drifted_files(app, client):
+    file_id = upload(client, dataset(4, seed=81), filename='reconcile.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    intent = client.get(f'/api/intents?file_id={file_id}&per_page=1').get_json()['data']['items'][0]
+    client.post(f"/api/intents/{intent['id']}/pass", json={'judged_by': 'alice'})
+
+    with app.app_context():
+        db.session.execute(update(UploadedFile).where(UploadedFile.id == file_id)
+                           .values(total_items=99, reviewed_items=42))
+        db.session.commit()
+    resp = client.post('/api/files/reconcile')
+    assert resp.get_json()['data']['fixed'] >= 1
+    assert counters(app, file_id) == (4, 1)
+
+    with app.app_context():
+        db.session.execute(update(UploadedFile).where(UploadedFile.id == file_id).values(reviewed_items=0))
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['reconcile-counters'])
+    assert result.exit_code == 0 and '校正完成' in result.output
+    assert counters(app, file_id) == (4, 1)
@@ -0,0 +1,56 @@
+import os
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from config import Config
+from conftest import dataset, upload, wait_for_jobs
+from models import db, Intent, IntentBand, ReviewStat, StepItem, UploadedFile
+
+
+def orphans(app, file_id):
+    """文件删除后仍残留的各表行数"""
+    with app.app_context():
+        return {model.__tablename__: db.session.scalar(select(func.count()).where(column == file_id))
+                for model, column in ((UploadedFile, UploadedFile.id), (Intent, Intent.file_id),
+                                      (IntentBand, IntentBand.file_id), (StepItem, StepItem.file_id),
+                                      (ReviewStat, ReviewStat.file_id))}
+
+
+NONE_LEFT = {'uploaded_files': 0, 'intents': 0, 'intent_bands': 0, 'step_items': 0, 'review_stats': 0}
+
+
+def test_soft_delete_hides_file_then_purges_everything(app, client):
+    file_id = upload(client, dataset(30, seed=120), filename='soft.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    with app.app_context():
+        stored = db.session.get(UploadedFile, file_id).filename
+        assert IntentBand.query.filter_by(file_id=file_id).count() > 0
+
+    resp = client.delete(f'/api/files/{file_id}?mode=soft')
+    assert resp.status_code == 202 and resp.get_json()['data']['job_id']
+    # 立即从列表、查询和搜索中隐藏
+    assert file_id not in [f['id'] for f in client.get('/api/files').get_json()['data']]
+    assert client.get(f'/api/intents?file_id={file_id}').status_code == 404
+    assert client.get(f'/api/intents/search?q=需求来源&file_id={file_id}').get_json()['data']['items'] == []
+
+    wait_for_jobs(app)
+    assert orphans(app, file_id) == NONE_LEFT
+    assert not os.path.exists(os.path.join(Config.UPLOAD_FOLDER, stored))
+
+
+def test_hard_delete_and_purge_command_leave_no_orphans(app, client):
+    hard = upload(client, dataset(10, seed=121), filename='hard.json').get_json()['data']['id']
+    leftover = upload(client, dataset(10, seed=122), filename='leftover.json').get_json()['data']['id']
+    wait_for_jobs(app)
+
+    assert client.delete(f'/api/files/{hard}').status_code == 200
+    assert orphans(app, hard) == NONE_LEFT
+
+    # 软删除后清理任务没有运行（如进程重启），由命令清理
+    with app.app_context():
+        db.session.get(UploadedFile, leftover).deleted_at = datetime.now()
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['purge-deleted-files'])
+    assert result.exit_code == 0
+    assert orphans(app, leftover) == NONE_LEFT
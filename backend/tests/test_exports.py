@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from conftest import dataset, upload, wait_for_jobs
+
+
+def test_cached_export_reports_hit_and_build_time(app, client):
+    file_id = upload(client, dataset(5, seed=50), filename='export.json').get_json()['data']['id']
+    wait_for_jobs(app)
+
+    first = client.get(f'/api/files/{file_id}/export?format=json')
+    assert first.headers['X-Export-Cache'] == 'miss'
+    exported_at = first.get_json()['metadata']['exported_at']
+
+    second = client.get(f'/api/files/{file_id}/export?format=json')
+    assert second.headers['X-Export-Cache'] == 'hit'
+    # 缓存命中时内容中的 exported_at 仍是生成时间，Last-Modified 同样是生成时间
+    assert second.get_json()['metadata']['exported_at'] == exported_at
+    assert second.headers['Last-Modified'] == first.headers['Last-Modified']
+    built_at = second.last_modified.astimezone().replace(tzinfo=None)
+    assert abs((built_at - datetime.fromisoformat(exported_at)).total_seconds()) <= 1
+
+    resp = client.get(f'/api/files/{file_id}/export?format=json', headers={'If-None-Match': second.headers['ETag']})
+    assert resp.status_code == 304
+    assert resp.headers['X-Export-Cache'] == 'hit'
+
+
+def test_export_evicted_before_sending_is_rebuilt_or_streamed(app, client, monkeypatch):
+    from export_cache import export_cache
+
+    file_id = upload(client, dataset(5, seed=51), filename='export_race.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    get, evicted = export_cache.get, []
+
+    # 模拟另一个进程在取到缓存之后、发送之前淘汰了它
+    def get_then_evict(*args):
+        artefact = get(*args)
+        if len(evicted) < limit:
+            evicted.append(artefact)
+            export_cache.discard(file_id)
+        return artefact
+
+    monkeypatch.setattr(export_cache, 'get', get_then_evict)
+    limit = 1
+    resp = client.get(f'/api/files/{file_id}/export?format=json')
+    assert resp.status_code == 200 and resp.headers['X-Export-Cache'] == 'miss'
+    assert resp.get_json()['metadata']
+    assert len(evicted) == 1
+
+    # 重新生成后仍被淘汰时退回流式生成
+    evicted.clear()
+    limit = 2
+    resp = client.get(f'/api/files/{file_id}/export?format=csv')
+    assert resp.status_code == 200 and 'X-Export-Cache' not in resp.headers
+    assert resp.get_data(as_text=True).count('\n') > 5
+    assert len(evicted) == 2
@@ -0,0 +1,20 @@
+from conftest import dataset, upload, wait_for_jobs
+
+
+def test_file_list_etag_changes_when_newest_file_is_replaced(app, client):
+    upload(client, dataset(5, seed=30), filename='first.json', step_type='atomic_intent')
+    newest = upload(client, dataset(5, seed=31), filename='second.json').get_json()['data']
+    wait_for_jobs(app)
+    listing = client.get('/api/files?step_type=atomic_intent')
+    etag = listing.headers['ETag']
+    assert client.get('/api/files?step_type=atomic_intent', headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.delete(f"/api/files/{newest['id']}").status_code == 200
+    replacement = upload(client, dataset(5, seed=32), filename='third.json').get_json()['data']
+    wait_for_jobs(app)
+    # SQLite 复用了被删除的最大ID，文件数量、最大ID和版本号之和都与之前相同
+    assert replacement['id'] == newest['id']
+
+    resp = client.get('/api/files?step_type=atomic_intent', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert 'third.json' in [f['original_filename'] for f in resp.get_json()['data']]
@@ -0,0 +1,44 @@
+import json
+
+from conftest import upload, wait_for_jobs
+
+TRIPLES = {
+    'metadata': {'source_file': 'ontology.md'},
+    'triples': [
+        {'id': f'T{n}', 'subject': f'对象{n % 3}', 'predicate': '属于', 'object': '类别', 'note': {'n': n}}
+        for n in range(7)
+    ],
+    'objects': [{'id': 'O1', 'type': 'Entity', 'name': '客户'}],
+}
+
+
+def test_step_items_upload_list_and_export(app, client):
+    content = json.dumps(TRIPLES, ensure_ascii=False).encode('utf-8')
+    file = upload(client, content, filename='triples.json', step_type='triple_creation').get_json()['data']
+    wait_for_jobs(app)
+    assert (file['item_table'], file['total_items']) == ('step_items', 8)
+    file_id = file['id']
+
+    page = client.get(f'/api/items?file_id={file_id}&per_page=5').get_json()['data']
+    assert page['total'] == 8 and len(page['items']) == 5
+    rest = client.get(f"/api/items?file_id={file_id}&per_page=5&cursor={page['next_cursor']}").get_json()['data']
+    assert [i['data'] for i in page['items'] + rest['items']] == TRIPLES['triples'] + TRIPLES['objects']
+
+    filtered = client.get(f'/api/items?file_id={file_id}&subject=对象1&count=exact').get_json()['data']
+    assert filtered['total'] == 2 and {i['item_id'] for i in filtered['items']} == {'T1', 'T4'}
+    entity = client.get(f'/api/items?file_id={file_id}&item_type=Entity').get_json()['data']['items']
+    assert [(i['stage'], i['data']['name']) for i in entity] == [('objects', '客户')]
+    assert client.get(f"/api/items/{entity[0]['id']}").get_json()['data']['data'] == TRIPLES['objects'][0]
+
+    # JSON导出还原上传时的结构，NDJSON每行一条，CSV带表头
+    exported = client.get(f'/api/files/{file_id}/export?format=json').get_json()
+    assert exported['metadata']['step_type'] == 'triple_creation'
+    assert {key: exported[key] for key in ('triples', 'objects')} == \
+        {key: TRIPLES[key] for key in ('triples', 'objects')}
+    lines = client.get(f'/api/files/{file_id}/export?format=ndjson').get_data(as_text=True).splitlines()
+    assert [json.loads(line)['data']['id'] for line in lines] == [f'T{n}' for n in range(7)] + ['O1']
+    csv_text = client.get(f'/api/files/{file_id}/export?format=csv').get_data(as_text=True)
+    assert len(csv_text.lstrip('﻿').strip().splitlines()) == 9
+
+    # 意图接口不返回通用条目文件中的内容
+    assert client.get(f'/api/intents?file_id={file_id}').get_json()['data']['total'] == 0
@@ -0,0 +1,88 @@
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from config import Config
+from conftest import dataset, upload, wait_for_jobs
+from models import db, Job, UploadedFile, Intent
+from tasks import fail_stale_jobs, purge_expired_exports
+
+
+def add_job(kind, file_id=None, heartbeat_at=None):
+    job = Job(id=uuid.uuid4().hex, kind=kind, status='running', file_id=file_id,
+              started_at=datetime.now() - timedelta(hours=1), heartbeat_at=heartbeat_at)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_stale_upload_job_is_failed_and_its_file_removed(app, client):
+    file_id = upload(client, dataset(10, seed=60), filename='orphan.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    with app.app_context():
+        # 模拟导入过程中进程退出：文件仍在导入中，任务停在 running 且很久没有心跳
+        db.session.get(UploadedFile, file_id).importing = True
+        stale = add_job('upload', file_id, heartbeat_at=datetime.now() - timedelta(minutes=10))
+        fresh = add_job('export', file_id, heartbeat_at=datetime.now())
+
+        assert fail_stale_jobs(stale_seconds=120) == 1
+        assert db.session.get(Job, stale).status == 'failed'
+        assert db.session.get(Job, fresh).status == 'running'
+        db.session.get(Job, fresh).status = 'succeeded'
+        db.session.commit()
+    wait_for_jobs(app)
+    with app.app_context():
+        assert db.session.get(UploadedFile, file_id) is None
+        assert Intent.query.filter_by(file_id=file_id).count() == 0
+
+
+def test_expired_exports_are_removed(app, client):
+    os.makedirs(Config.EXPORT_FOLDER, exist_ok=True)
+    old_path = os.path.join(Config.EXPORT_FOLDER, 'intent_review_1_old.json')
+    new_path = os.path.join(Config.EXPORT_FOLDER, 'intent_review_1_new.json')
+    for path in (old_path, new_path):
+        with open(path, 'w') as f:
+            f.write('{}')
+    two_hours_ago = time.time() - 7200
+    os.utime(old_path, (two_hours_ago, two_hours_ago))
+
+    assert purge_expired_exports(3600) == 1
+    assert not os.path.exists(old_path)
+    assert os.path.exists(new_path)
+    assert purge_expired_exports(0) == 0
+    os.remove(new_path)
+
+
+def test_async_export_download_after_ttl_returns_404(app, client):
+    file_id = upload(client, dataset(5, seed=61), filename='ttl.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    job_id = client.get(f'/api/files/{file_id}/export?format=csv&async=1').get_json()['data']['job_id']
+    wait_for_jobs(app)
+    assert client.get(f'/api/jobs/{job_id}/result').status_code == 200
+
+    filename = client.get(f'/api/jobs/{job_id}').get_json()['data']['result']['filename']
+    two_hours_ago = time.time() - 7200
+    os.utime(os.path.join(Config.EXPORT_FOLDER, filename), (two_hours_ago, two_hours_ago))
+    assert purge_expired_exports(3600) == 1
+    resp = client.get(f'/api/jobs/{job_id}/result')
+    assert resp.status_code == 404
+    assert resp.get_json()['message'] == '导出文件已被清理'
+
+
+def test_first_request_starts_maintenance_without_ensure_db(app, client, monkeypatch):
+    import app as app_module
+
+    # gunicorn 等直接加载 app 的 worker 不调用 ensure_db，由第一个需要数据库的请求启动维护
+    monkeypatch.setattr(app_module, '_maintenance_pid', None)
+    with app.app_context():
+        job_id = add_job('export')
+    assert client.get('/api/health').status_code == 200
+    with app.app_context():
+        assert db.session.get(Job, job_id).status == 'running'
+
+    assert client.get('/api/files').status_code == 200
+    with app.app_context():
+        assert db.session.get(Job, job_id).status == 'failed'
+    assert app_module._maintenance_pid == os.getpid()
+    assert app_module.job_runner.heartbeat_thread.is_alive()
@@ -0,0 +1,37 @@
+import threading
+import time
+
+from logger import logger, SamplingFilter, SAMPLED
+
+
+class Probe:
+    """记录自身被转为字符串（即日志消息被拼接）时所在的线程"""
+
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.current_thread())
+        return 'probe'
+
+
+def test_messages_are_formatted_by_the_listener_thread(monkeypatch):
+    # 只检查应用自己的 handler，不经过 pytest 在根 logger 上的日志捕获
+    monkeypatch.setattr(logger, 'propagate', False)
+    probe = Probe()
+    logger.info('日志探针: %s', probe)
+    deadline = time.monotonic() + 5
+    while not probe.threads and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert probe.threads
+    assert threading.current_thread() not in probe.threads
+
+
+def test_dropped_samples_are_never_formatted(monkeypatch):
+    sampling = next(f for f in logger.filters if isinstance(f, SamplingFilter))
+    monkeypatch.setattr(sampling, 'rate', 0)
+    monkeypatch.setattr(logger, 'propagate', False)
+    probe = Probe()
+    logger.info('日志探针: %s', probe, extra=SAMPLED)
+    time.sleep(0.05)
+    assert probe.threads == []
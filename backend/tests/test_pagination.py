@@ -0,0 +1,58 @@
+from sqlalchemy import delete, update
+
+from conftest import dataset, upload, wait_for_jobs
+from models import db, Intent, UploadedFile
+
+
+def intents_page(client, file_id, **params):
+    query = '&'.join(f'{key}={value}' for key, value in params.items())
+    return client.get(f'/api/intents?file_id={file_id}&{query}').get_json()['data']
+
+
+def test_cursor_pages_are_stable_when_earlier_rows_change(app, client):
+    file_id = upload(client, dataset(12, seed=90), filename='cursor.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    all_ids = [i['id'] for i in intents_page(client, file_id, per_page=100, fields='id')['items']]
+
+    first = intents_page(client, file_id, cursor='', per_page=5)
+    assert [i['id'] for i in first['items']] == all_ids[:5]
+    assert first['prev_cursor'] is None
+
+    # 翻页期间删除前一页的意图：页码分页会跳过一条，游标分页从上一页最后一个ID继续
+    with app.app_context():
+        db.session.execute(delete(Intent).where(Intent.id == all_ids[0]))
+        db.session.execute(update(UploadedFile).where(UploadedFile.id == file_id)
+                           .values(version=UploadedFile.version + 1))
+        db.session.commit()
+    second = intents_page(client, file_id, cursor=first['next_cursor'], per_page=5)
+    assert [i['id'] for i in second['items']] == all_ids[5:10]
+
+    third = intents_page(client, file_id, cursor=second['next_cursor'], per_page=5)
+    assert [i['id'] for i in third['items']] == all_ids[10:]
+    assert third['next_cursor'] is None
+
+    back = intents_page(client, file_id, cursor=third['prev_cursor'], per_page=5)
+    assert [i['id'] for i in back['items']] == all_ids[5:10]
+
+    assert client.get(f'/api/intents?file_id={file_id}&cursor=bogus').status_code == 400
+
+
+def test_count_modes(app, client):
+    file_id = upload(client, dataset(7, seed=91), filename='count.json').get_json()['data']['id']
+    wait_for_jobs(app)
+
+    exact = intents_page(client, file_id, per_page=3)
+    assert (exact['total'], exact['pages']) == (7, 3)
+    with app.app_context():
+        # cached 使用文件记录中的数量，不统计意图表
+        db.session.execute(update(UploadedFile).where(UploadedFile.id == file_id)
+                           .values(total_items=70, version=UploadedFile.version + 1))
+        db.session.commit()
+    cached = intents_page(client, file_id, per_page=3, count='cached')
+    assert (cached['total'], cached['pages']) == (70, 24)
+    assert intents_page(client, file_id, per_page=3, count='exact')['total'] == 7
+    none = intents_page(client, file_id, per_page=3, count='none', mode='cursor')
+    assert (none['total'], none['pages']) == (None, None)
+    assert len(none['items']) == 3 and none['next_cursor']
+
+    assert client.get(f'/api/intents?file_id={file_id}&count=maybe').status_code == 400
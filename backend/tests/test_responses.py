@@ -0,0 +1,71 @@
+import gzip
+import json
+
+import pytest
+
+from config import Config
+from conftest import dataset, upload, wait_for_jobs
+
+
+@pytest.fixture(scope='module')
+def file_id(app):
+    file_id = upload(app.test_client(), dataset(60, seed=130), filename='responses.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    return file_id
+
+
+def test_fields_projection(client, file_id):
+    full = client.get(f'/api/intents?file_id={file_id}&per_page=5').get_json()['data']['items']
+    part = client.get(f'/api/intents?file_id={file_id}&per_page=5&fields=judgement,stage').get_json()['data']['items']
+    # 只返回请求的字段和 id，取值与完整结果相同
+    assert [set(item) for item in part] == [{'id', 'stage', 'judgement'}] * 5
+    assert part == [{k: item[k] for k in ('id', 'stage', 'judgement')} for item in full]
+
+    dates = client.get(f'/api/intents?file_id={file_id}&per_page=5&fields=judge_date,claimed_by')
+    assert [(i['judge_date'], i['claimed_by']) for i in dates.get_json()['data']['items']] == \
+        [(i['judge_date'], i['claimed_by']) for i in full]
+
+    comment = full[0]['original_comment'][:3]
+    found = client.get(f'/api/intents/search?q={comment}&file_id={file_id}&fields=stage').get_json()['data']['items']
+    assert found and all(set(item) == {'id', 'stage'} for item in found)
+
+    for url in (f'/api/intents?file_id={file_id}&fields=stage,secret',
+                f'/api/intents/search?q={comment}&file_id={file_id}&fields=secret'):
+        resp = client.get(url)
+        assert resp.status_code == 400 and 'secret' in resp.get_json()['message']
+
+
+def test_gzip_negotiation(client, file_id):
+    url = f'/api/intents?file_id={file_id}&per_page=50'
+    plain = client.get(url)
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    packed = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in packed.headers['Vary']
+    assert len(packed.data) < len(plain.data)
+    assert json.loads(gzip.decompress(packed.data)) == plain.get_json()
+    # 压缩后的 ETag 与未压缩的表示区分，两者都能命中304
+    assert packed.headers['ETag'] != plain.headers['ETag']
+    for etag in (plain.headers['ETag'], packed.headers['ETag']):
+        assert client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}).status_code == 304
+
+    # 小于 COMPRESS_MIN_BYTES 的响应不压缩
+    small = client.get(f'/api/intents?file_id={file_id}&per_page=1&fields=id', headers={'Accept-Encoding': 'gzip'})
+    assert len(small.data) < Config.COMPRESS_MIN_BYTES
+    assert 'Content-Encoding' not in small.headers
+
+    refused = client.get(url, headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in refused.headers
+
+
+def test_brotli_preferred_when_installed(client, file_id):
+    brotli = pytest.importorskip('brotli')
+    url = f'/api/intents?file_id={file_id}&per_page=50'
+    plain = client.get(url).get_json()
+
+    resp = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+    assert resp.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(resp.data)) == plain
+    assert client.get(url, headers={'Accept-Encoding': 'gzip'}).headers['Content-Encoding'] == 'gzip'
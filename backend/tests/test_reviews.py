@@ -0,0 +1,182 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from conftest import dataset, upload, wait_for_jobs
+from models import db, Intent
+
+
+def claimed_file(app, client, seed):
+    """上传一个文件并让 alice 领取前3条意图，返回 (文件ID, 领取的ID, 未领取的ID)"""
+    file_id = upload(client, dataset(10, seed=seed), filename=f'claims_{seed}.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    claimed = [i['id'] for i in client.post(f'/api/files/{file_id}/claim',
+                                            json={'reviewer': 'alice', 'limit': 3}).get_json()['data']['items']]
+    with app.app_context():
+        free = db.session.scalars(
+            db.select(Intent.id).where(Intent.file_id == file_id, Intent.id.not_in(claimed)).order_by(Intent.id)
+        ).all()
+    return file_id, claimed, free
+
+
+def statuses(app, ids):
+    with app.app_context():
+        return {i.id: i.review_status for i in Intent.query.filter(Intent.id.in_(ids))}
+
+
+def test_batch_items_skip_intents_claimed_by_others(app, client):
+    _, claimed, free = claimed_file(app, client, seed=40)
+    ids = claimed + free[:2]
+    resp = client.post('/api/intents/batch', json={'action': 'pass', 'judged_by': 'bob',
+                                                   'items': [{'id': i} for i in ids]})
+    data = resp.get_json()['data']
+    assert data == {'updated': 2, 'conflicts': claimed}
+    assert set(statuses(app, claimed).values()) == {'待核对'}
+    assert set(statuses(app, free[:2]).values()) == {'直接通过'}
+
+    # 领取人本人可以批量核对自己领取的意图
+    resp = client.post('/api/intents/batch', json={'action': 'review', 'judged_by': 'alice',
+                                                   'items': [{'id': i, 'judgement': '通过'} for i in claimed]})
+    assert resp.get_json()['data'] == {'updated': 3, 'conflicts': []}
+
+
+def test_batch_filter_skips_intents_claimed_by_others(app, client):
+    file_id, claimed, free = claimed_file(app, client, seed=41)
+    resp = client.post('/api/intents/batch', json={'action': 'pass', 'judged_by': 'bob',
+                                                   'filter': {'file_id': file_id}})
+    data = resp.get_json()['data']
+    assert data == {'updated': len(free), 'conflicts': claimed}
+    assert set(statuses(app, claimed).values()) == {'待核对'}
+    with app.app_context():
+        assert db.session.get(Intent, claimed[0]).claimed_by == 'alice'
+
+
+def test_similar_review_skips_intents_claimed_by_others(app, client):
+    _, claimed, _ = claimed_file(app, client, seed=42)
+    resp = client.post(f'/api/intents/{claimed[0]}/similar/review',
+                       json={'action': 'pass', 'judged_by': 'bob', 'threshold': 1.0})
+    data = resp.get_json()['data']
+    assert claimed[0] in data['conflicts']
+    assert claimed[0] not in data['ids']
+    assert statuses(app, [claimed[0]])[claimed[0]] == '待核对'
+
+
+def test_stale_review_is_rejected_with_409(app, client):
+    file_id = upload(client, dataset(5, seed=43), filename='versions.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    intent = client.get(f'/api/intents?file_id={file_id}&per_page=1').get_json()['data']['items'][0]
+    other = app.test_client()
+
+    # 两个核对人读取了同一版本，先提交的成功，后提交的收到409和当前内容，而不是覆盖
+    first = client.post(f"/api/intents/{intent['id']}/review",
+                        json={'judgement': '需修改', 'modified_content': 'A', 'judged_by': 'alice',
+                              'version': intent['version']})
+    assert first.status_code == 200
+    stale = other.post(f"/api/intents/{intent['id']}/pass", json={'judged_by': 'bob', 'version': intent['version']})
+    assert stale.status_code == 409
+    current = stale.get_json()['data']
+    assert (current['judgement'], current['judged_by'], current['version']) == ('需修改', 'alice', intent['version'] + 1)
+
+
+def test_batch_count_excludes_intents_claimed_during_the_update(app, client):
+    _, _, free = claimed_file(app, client, seed=44)
+    expires = (datetime.now() + timedelta(minutes=10)).isoformat(' ')
+
+    # 读取可领取状态之后、写入之前，另一个核对人领取了其中一条
+    def claim_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith('UPDATE intents SET review_status') and not state:
+            state.append(target)
+            conn.connection.driver_connection.execute(
+                "UPDATE intents SET claimed_by = 'carol', claim_expires_at = ? WHERE id = ?", (expires, target)
+            )
+
+    state = []
+    with app.app_context():
+        engine = app.extensions['sqlalchemy'].engine
+    for action, items in (('pass', [{'id': i} for i in free[:3]]),
+                          ('review', [{'id': i, 'judgement': '通过'} for i in free[3:6]])):
+        target = items[0]['id']
+        state.clear()
+        event.listen(engine, 'before_cursor_execute', claim_first)
+        try:
+            resp = client.post('/api/intents/batch', json={'action': action, 'judged_by': 'bob', 'items': items})
+        finally:
+            event.remove(engine, 'before_cursor_execute', claim_first)
+        assert resp.get_json()['data'] == {'updated': 2, 'conflicts': [target]}
+        assert statuses(app, [target])[target] == '待核对'
+
+
+def test_stage_wide_pass_keeps_existing_reviews(app, client):
+    file_id = upload(client, dataset(20, seed=45), filename='stage_pass.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    rejected = client.get(f'/api/intents?file_id={file_id}&per_page=1').get_json()['data']['items'][0]
+    stage = rejected['stage']
+    client.post(f"/api/intents/{rejected['id']}/review",
+                json={'judgement': '删除', 'judged_by': 'alice', 'version': rejected['version']})
+
+    resp = client.post('/api/intents/batch', json={'action': 'pass', 'judged_by': 'bob',
+                                                   'filter': {'file_id': file_id, 'stage': stage}})
+    assert resp.status_code == 200
+    with app.app_context():
+        intent = db.session.get(Intent, rejected['id'])
+        assert (intent.judgement, intent.judged_by, intent.review_status) == ('删除', 'alice', '已核对')
+        pending = Intent.query.filter_by(file_id=file_id, stage=stage, review_status='待核对').count()
+    assert resp.get_json()['data']['updated'] > 0 and pending == 0
+
+    # 显式要求时才覆盖已有的核对结果
+    client.post('/api/intents/batch', json={'action': 'pass', 'judged_by': 'bob', 'include_reviewed': True,
+                                            'filter': {'file_id': file_id, 'stage': stage}})
+    with app.app_context():
+        intent = db.session.get(Intent, rejected['id'])
+        assert (intent.judgement, intent.judged_by) == ('通过', 'bob')
+
+
+def test_batch_review_by_items_writes_each_items_content(app, client):
+    file_id = upload(client, dataset(6, seed=46), filename='batch_items.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    ids = [i['id'] for i in client.get(f'/api/intents?file_id={file_id}&per_page=3').get_json()['data']['items']]
+
+    resp = client.post('/api/intents/batch', json={'action': 'review', 'judged_by': 'alice', 'items': [
+        {'id': ids[0], 'judgement': '需修改', 'modified_content': '改写后的内容'},
+        {'id': ids[1], 'judgement': '删除'},
+        {'id': 10 ** 9, 'judgement': '通过'},
+    ]})
+    assert resp.get_json()['data'] == {'updated': 2, 'conflicts': []}
+    with app.app_context():
+        rows = {i.id: i for i in Intent.query.filter(Intent.id.in_(ids))}
+        assert (rows[ids[0]].judgement, rows[ids[0]].modified_content) == ('需修改', '改写后的内容')
+        assert rows[ids[1]].judgement == '删除'
+        assert {rows[i].review_status for i in ids[:2]} == {'已核对'} and rows[ids[2]].review_status == '待核对'
+        assert {rows[i].version for i in ids[:2]} == {1}
+
+    resp = client.post('/api/intents/batch', json={'action': 'pass', 'judged_by': 'alice',
+                                                   'items': [{'id': ids[2]}]})
+    assert resp.get_json()['data']['updated'] == 1
+    with app.app_context():
+        intent = db.session.get(Intent, ids[2])
+        assert (intent.judgement, intent.review_status) == ('通过', '直接通过')
+
+
+def test_batch_review_by_filter_and_validation(app, client):
+    file_id = upload(client, dataset(20, seed=47), filename='batch_filter.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    with app.app_context():
+        category = db.session.scalars(db.select(Intent.category).where(Intent.file_id == file_id)).first()
+        expected = Intent.query.filter_by(file_id=file_id, category=category).count()
+
+    resp = client.post('/api/intents/batch', json={'action': 'review', 'judged_by': 'alice', 'judgement': '待定',
+                                                   'filter': {'file_id': file_id, 'category': category}})
+    assert resp.get_json()['data'] == {'updated': expected, 'conflicts': []}
+    with app.app_context():
+        assert {i.judgement for i in Intent.query.filter_by(file_id=file_id, category=category)} == {'待定'}
+        assert Intent.query.filter(Intent.file_id == file_id, Intent.category != category,
+                                   Intent.review_status != '待核对').count() == 0
+
+    bad = [
+        {'action': 'delete', 'items': [{'id': 1}]},
+        {'action': 'pass', 'items': [{'id': 1}], 'filter': {'file_id': file_id}},
+        {'action': 'pass', 'items': [{'judgement': '通过'}]},
+        {'action': 'pass', 'filter': {'stage': 'x'}},
+    ]
+    for body in bad:
+        assert client.post('/api/intents/batch', json=body).status_code == 400
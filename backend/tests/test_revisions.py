@@ -0,0 +1,62 @@
+import json
+from datetime import datetime
+
+from conftest import upload, wait_for_jobs
+from models import db, Intent
+
+
+def revision(stages):
+    """同一来源文件的一个版本，stages 为 {阶段名: [(意图ID, 内容), ...]}"""
+    content = {'metadata': {'source_file': 'merge_source.xlsx'}}
+    for stage, items in stages.items():
+        content[stage] = [{'id': intent_id, 'category': '需求', 'original_comment': comment, 'judgement': '',
+                           'judged_by': '', 'modified_content': '', 'judge_date': ''}
+                          for intent_id, comment in items]
+    return json.dumps(content, ensure_ascii=False).encode('utf-8')
+
+
+def review(app, file_id, intent_id, judgement, judged_by, judge_date):
+    with app.app_context():
+        for intent in Intent.query.filter_by(file_id=file_id, intent_id=intent_id):
+            intent.judgement, intent.judged_by, intent.judge_date = judgement, judged_by, judge_date
+            intent.review_status = '已核对'
+            judge_date = judge_date.replace(day=judge_date.day + 1)
+        db.session.commit()
+
+
+def test_merge_counts_and_carries_latest_review(app, client):
+    # 旧版本中 I1 出现两次（如跨阶段重复），各自有核对结果
+    old = upload(client, revision({
+        'Stage_A': [('I1', '内容一'), ('I2', '内容二'), ('I3', '内容三'), ('I4', '内容四'), ('I6', '内容六')],
+        'Stage_B': [('I1', '内容一')],
+    }), filename='merge_v1.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    review(app, old, 'I1', '需修改', 'alice', datetime(2024, 5, 1))
+    review(app, old, 'I2', '通过', 'alice', datetime(2024, 5, 1))
+    review(app, old, 'I3', '删除', 'alice', datetime(2024, 5, 1))
+    with app.app_context():
+        # 第一条 I1 之后又被重新核对，核对时间比第二条晚
+        later = Intent.query.filter_by(file_id=old, intent_id='I1').order_by(Intent.id).first()
+        later.judgement, later.judged_by, later.judge_date = '删除', 'bob', datetime(2024, 5, 3)
+        db.session.commit()
+
+    resp = upload(client, revision({
+        'Stage_A': [('I1', '内容一'), ('I2', '内容二'), ('I3', '内容三（改）'), ('I4', '内容四'), ('I5', '内容五')],
+    }), filename='merge_v2.json', mode='merge')
+    assert resp.status_code == 200
+    new = resp.get_json()['data']['id']
+    assert resp.get_json()['diff'] == {'previous_file_id': old, 'unchanged': 3, 'changed': 1, 'added': 1,
+                                       'removed': 1, 'carried_over': 2}
+    wait_for_jobs(app)
+
+    with app.app_context():
+        rows = {i.intent_id: i for i in Intent.query.filter_by(file_id=new)}
+        # 重复的 I1 沿用核对时间最晚的一条；未核对、内容变化和新增的意图保持待核对
+        assert (rows['I1'].judgement, rows['I1'].judged_by, rows['I1'].judge_date) == \
+            ('删除', 'bob', datetime(2024, 5, 3))
+        assert (rows['I2'].judgement, rows['I2'].review_status) == ('通过', '已核对')
+        assert {rows[i].review_status for i in ('I3', 'I4', 'I5')} == {'待核对'}
+        # 沿用与核对一样使行版本号加一
+        assert {i: rows[i].version for i in rows} == {'I1': 1, 'I2': 1, 'I3': 0, 'I4': 0, 'I5': 0}
+
+    assert upload(client, revision({'Stage_A': []}), filename='merge_bad.json', mode='replace').status_code == 400
@@ -0,0 +1,56 @@
+from config import Config
+from conftest import dataset, upload, wait_for_jobs
+
+
+def search(client, **params):
+    resp = client.get('/api/intents/search', query_string=params)
+    assert resp.status_code == 200
+    return resp.get_json()['data']
+
+
+def test_short_keyword_searches_across_files(app, client):
+    first = upload(client, dataset(5, seed=70), filename='search.json').get_json()['data']['id']
+    second = upload(client, dataset(5, seed=71), filename='search_2.json').get_json()['data']['id']
+    wait_for_jobs(app)
+
+    # 2个字符的关键词不指定 file_id 也可以跨文件搜索
+    items, cursor = [], ''
+    while cursor is not None:
+        data = search(client, q='#1', per_page=100, cursor=cursor)
+        items += data['items']
+        cursor = data['next_cursor']
+    assert {first, second} <= {i['file_id'] for i in items}
+    assert all('#1' in i['original_comment'] for i in items)
+
+    assert search(client, q='#1', file_id=first)['items']
+    assert search(client, q='需求来源') is not None
+    assert search(client, q='') is not None
+
+
+def test_short_keyword_scan_is_bounded_per_request(app, client, monkeypatch):
+    file_id = upload(client, dataset(30, seed=72), filename='search_bounded.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    stage = search(client, q='（#', file_id=file_id, per_page=1)['items'][0]['stage']
+    expected = [i['id'] for i in search(client, q='（#', file_id=file_id, stage=stage, per_page=100)['items']]
+    monkeypatch.setattr(Config, 'SEARCH_SCAN_ROWS', 7)
+
+    # 每次请求最多扫描7个ID，范围内不足一页时也返回游标，翻页接着扫描直到最后
+    pages, cursor = [], ''
+    while True:
+        data = search(client, q='（#', stage=stage, per_page=5, cursor=cursor)
+        assert len(data['items']) <= 5
+        pages.append(data)
+        if not data['next_cursor']:
+            break
+        cursor = data['next_cursor']
+    found = [i['id'] for page in pages for i in page['items'] if i['file_id'] == file_id]
+    assert found == expected
+    assert len(pages) > 2 and any(not page['items'] for page in pages)
+
+    # 从最后一页按上一页游标往回翻，同样逐段扫描，得到相同的结果
+    back, cursor = [], pages[-1]['prev_cursor']
+    while cursor:
+        data = search(client, q='（#', stage=stage, per_page=5, cursor=cursor)
+        back = data['items'] + back
+        cursor = data['prev_cursor']
+    assert [i['id'] for i in back + pages[-1]['items']] == [i['id'] for page in pages for i in page['items']]
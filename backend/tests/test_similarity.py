@@ -0,0 +1,57 @@
+import json
+import random
+
+from similarity import duplicate_clusters
+from conftest import upload, wait_for_jobs
+
+_CHARS = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经'
+
+
+def random_text(rng, length=30):
+    return ''.join(rng.choice(_CHARS) for _ in range(length))
+
+
+def intents_file(comments):
+    items = [{'id': f'INT-{n}', 'category': 'Fact', 'original_comment': comment, 'judgement': '',
+              'judged_by': '', 'modified_content': ''} for n, comment in enumerate(comments)]
+    return json.dumps({'metadata': {'source_file': 'dups.json'}, 'Stage_1': items}, ensure_ascii=False).encode('utf-8')
+
+
+def test_duplicate_clusters_groups_near_duplicates(app, client):
+    rng = random.Random(5)
+    comments, groups = [], []
+    for _ in range(20):
+        base = random_text(rng)
+        group = [len(comments), len(comments) + 1, len(comments) + 2]
+        comments += [base, base + '。', base[:-1] + '！']
+        groups.append(group)
+    comments += [random_text(rng) for _ in range(200)]
+    resp = upload(client, intents_file(comments), filename='dups.json')
+    file_id = resp.get_json()['data']['id']
+    wait_for_jobs(app)
+
+    with app.app_context():
+        ids = [i['id'] for i in client.get(f'/api/intents?file_id={file_id}&per_page=500').get_json()['data']['items']]
+        clusters = duplicate_clusters(file_id, 0.6)
+        expected = sorted(([ids[n] for n in group] for group in groups), key=lambda members: members[0])
+        assert sorted(clusters, key=lambda members: members[0]) == expected
+
+        # 其他文件中的相同内容在 scope=all 时并入同一簇，每个簇都包含本文件的意图
+        other = upload(client, intents_file(comments[:3] + [random_text(rng)]), filename='dups2.json')
+        other_ids = [i['id'] for i in client.get(
+            f"/api/intents?file_id={other.get_json()['data']['id']}").get_json()['data']['items']]
+        wait_for_jobs(app)
+        across = duplicate_clusters(file_id, 0.6, across_files=True)
+        assert len(across) == 20
+        assert sorted(ids[:3] + other_ids[:3]) in across
+        assert all(set(members) & set(ids) for members in across)
+
+
+
+def test_numpy_band_keys_match_pure_python():
+    import pytest
+    pytest.importorskip('numpy')
+    from similarity import _band_keys_numpy, _band_keys_python
+    rng = random.Random(7)
+    texts = [random_text(rng, rng.randrange(0, 50)) for _ in range(500)] + ['', None, 'a', 'ab', '，', 'A。b', '𠀀x']
+    assert _band_keys_numpy(texts) == _band_keys_python(texts)
@@ -0,0 +1,60 @@
+import fcntl
+import os
+
+import pytest
+
+import snapshots
+from snapshots import SnapshotBusy, build_snapshot, read_columns
+from models import db, UploadedFile
+from conftest import dataset, upload
+
+
+@pytest.fixture(autouse=True)
+def columns_format(monkeypatch):
+    # 不依赖是否安装 pyarrow，统一写列式JSON以便读取
+    monkeypatch.setattr(snapshots, 'pq', None)
+
+
+def snapshot_ids(folder, segment):
+    ids = set()
+    for chunk in read_columns(os.path.join(folder, segment['name'])):
+        ids.update(chunk['id'])
+    return ids
+
+
+def test_incremental_snapshot_includes_files_finished_importing(app, client, tmp_path):
+    folder = str(tmp_path)
+    file_id = upload(client, dataset(30, seed=20), filename='importing.json').get_json()['data']['id']
+    with app.app_context():
+        file = db.session.get(UploadedFile, file_id)
+        file.importing = True
+        db.session.commit()
+        intent_ids = {i.id for i in file.intents}
+
+        full = build_snapshot(folder)
+        assert not intent_ids & snapshot_ids(folder, full)
+
+        file.importing = False
+        db.session.commit()
+        incremental = build_snapshot(folder, incremental=True)
+        assert incremental['mode'] == 'incremental'
+        assert intent_ids <= snapshot_ids(folder, incremental)
+
+
+def test_stale_lock_file_does_not_block_snapshots(app, tmp_path):
+    folder = str(tmp_path)
+    # 之前的快照进程异常退出时遗留的锁文件
+    (tmp_path / '.lock').write_text('')
+    with app.app_context():
+        assert build_snapshot(folder)['mode'] == 'full'
+        assert build_snapshot(folder, incremental=True)['mode'] == 'incremental'
+
+
+def test_held_lock_raises_snapshot_busy(app, tmp_path):
+    folder = str(tmp_path)
+    with open(tmp_path / '.lock', 'w') as holder, app.app_context():
+        fcntl.flock(holder, fcntl.LOCK_EX)
+        with pytest.raises(SnapshotBusy):
+            build_snapshot(folder)
+        fcntl.flock(holder, fcntl.LOCK_UN)
+        assert build_snapshot(folder)['mode'] == 'full'
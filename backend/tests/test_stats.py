@@ -0,0 +1,52 @@
+from sqlalchemy import func, select
+
+from conftest import dataset, upload, wait_for_jobs
+from models import db, Intent
+
+
+def stats(client, file_id, **params):
+    query = ''.join(f'&{key}={value}' for key, value in params.items())
+    return client.get(f'/api/stats?file_id={file_id}{query}').get_json()['data']
+
+
+def grouped_from_intents(app, file_id):
+    """直接扫描意图表得到的 (stage, judgement, review_status) 分组计数，用于对照汇总表"""
+    with app.app_context():
+        rows = db.session.execute(
+            select(Intent.stage, Intent.judgement, Intent.review_status, func.count())
+            .where(Intent.file_id == file_id)
+            .group_by(Intent.stage, Intent.judgement, Intent.review_status)
+        ).all()
+    return sorted((stage, judgement or '', status or '', n) for stage, judgement, status, n in rows)
+
+
+def test_summary_table_follows_reviews_and_deletes(app, client):
+    file_id = upload(client, dataset(12, seed=100), filename='stats.json').get_json()['data']['id']
+    wait_for_jobs(app)
+    data = stats(client, file_id)
+    assert (data['total_items'], data['reviewed_items']) == (12, 0)
+    assert data['by_review_status'] == {'待核对': 12}
+
+    ids = [i['id'] for i in client.get(f'/api/intents?file_id={file_id}&per_page=3').get_json()['data']['items']]
+    client.post(f'/api/intents/{ids[0]}/review', json={'judgement': '需修改', 'judged_by': 'alice'})
+    client.post(f'/api/intents/{ids[1]}/pass', json={'judged_by': 'bob'})
+    client.post('/api/intents/batch', json={'action': 'review', 'judged_by': 'bob',
+                                            'items': [{'id': ids[2], 'judgement': '删除'}]})
+
+    data = stats(client, file_id)
+    assert (data['total_items'], data['reviewed_items']) == (12, 3)
+    assert data['by_review_status'] == {'待核对': 9, '已核对': 2, '直接通过': 1}
+    assert data['by_judgement'] == {'需修改': 1, '通过': 1, '删除': 1}
+    assert data['by_reviewer'] == {'alice': 1, 'bob': 2}
+
+    grouped = stats(client, file_id, group_by='stage,judgement,review_status')
+    assert sorted((g['stage'], g['judgement'], g['review_status'], g['count']) for g in grouped) == \
+        grouped_from_intents(app, file_id)
+
+    # 重建后与触发器维护的结果一致
+    assert client.post('/api/stats/rebuild').status_code == 200
+    assert stats(client, file_id) == data
+
+    assert client.delete(f'/api/files/{file_id}').status_code == 200
+    assert stats(client, file_id)['total_items'] == 0
+    assert client.get('/api/stats?group_by=color').status_code == 400
@@ -0,0 +1,93 @@
+import gzip
+import hashlib
+import os
+import time
+
+from config import Config
+from models import db, Intent, UploadedFile
+from conftest import dataset, upload, wait_for_jobs
+
+
+def wait_job(client, job_id, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/jobs/{job_id}').get_json()['data']
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'任务 {job_id} 超时')
+
+
+def test_review_succeeds_while_async_upload_in_progress(app, client, monkeypatch):
+    resp = upload(client, dataset(200, seed=1), filename='reviewed.json')
+    assert resp.status_code == 200, resp.get_json()
+    reviewed_file = resp.get_json()['data']['id']
+    with app.app_context():
+        intent_ids = [i for (i,) in db.session.query(Intent.id).filter_by(file_id=reviewed_file).order_by(Intent.id)]
+
+    # 小批量导入，让导入过程跨越多次提交
+    monkeypatch.setattr(Config, 'INGEST_BATCH_SIZE', 200)
+    resp = upload(client, dataset(20000, seed=2), filename='large.json', **{'async': '1'})
+    assert resp.status_code == 202, resp.get_json()
+    job_id = resp.get_json()['data']['job_id']
+    large_file = resp.get_json()['data']['file']['id']
+
+    statuses = []
+    seen_hidden = False
+    for intent_id in intent_ids:
+        job = client.get(f'/api/jobs/{job_id}').get_json()['data']
+        if job['status'] in ('succeeded', 'failed'):
+            break
+        files = [f['id'] for f in client.get('/api/files').get_json()['data']]
+        seen_hidden = seen_hidden or large_file not in files
+        statuses.append(client.post(f'/api/intents/{intent_id}/pass', json={'judged_by': 'tester'}).status_code)
+
+    job = wait_job(client, job_id)
+    assert job['status'] == 'succeeded', job
+    assert statuses, '导入在第一次核对之前已完成，无法验证并发'
+    assert set(statuses) == {200}
+    assert seen_hidden
+    files = {f['id']: f for f in client.get('/api/files').get_json()['data']}
+    assert files[large_file]['total_items'] == 20000
+
+
+def test_failed_upload_removes_committed_batches(app, client, monkeypatch):
+    monkeypatch.setattr(Config, 'INGEST_BATCH_SIZE', 50)
+    content = dataset(500, seed=3)
+    # 截断内容：前面的批次已提交后解析失败
+    resp = upload(client, content[:len(content) * 3 // 4], filename='broken.json')
+    assert resp.status_code in (400, 500)
+    with app.app_context():
+        from models import UploadedFile
+        assert UploadedFile.query.filter_by(original_filename='broken.json').count() == 0
+        orphans = db.session.query(Intent.id).outerjoin(UploadedFile, UploadedFile.id == Intent.file_id) \
+            .filter(UploadedFile.id.is_(None)).count()
+        assert orphans == 0
+
+
+def test_duplicate_content_is_rejected_or_linked(app, client):
+    content = dataset(5, seed=110)
+    first = upload(client, content, filename='dedupe.json').get_json()['data']
+    wait_for_jobs(app)
+    digest = hashlib.sha256(content).hexdigest()
+
+    # 原始字节按内容哈希 gzip 压缩保存一份
+    with app.app_context():
+        stored = db.session.get(UploadedFile, first['id']).filename
+    assert stored == f'{digest[:2]}/{digest}.json.gz'
+    with gzip.open(os.path.join(Config.UPLOAD_FOLDER, stored), 'rb') as f:
+        assert f.read() == content
+
+    rejected = upload(client, content, filename='dedupe_again.json')
+    assert rejected.status_code == 409
+    assert rejected.get_json()['duplicate'] and rejected.get_json()['data']['id'] == first['id']
+
+    linked = upload(client, content, filename='dedupe_again.json', on_duplicate='link')
+    assert linked.status_code == 200 and linked.get_json()['data']['id'] == first['id']
+    assert upload(client, content, filename='x.json', on_duplicate='copy').status_code == 400
+
+    # 删除后存储文件随之删除，同样的内容可以重新上传
+    assert client.delete(f"/api/files/{first['id']}").status_code == 200
+    assert not os.path.exists(os.path.join(Config.UPLOAD_FOLDER, stored))
+    assert upload(client, content, filename='dedupe.json').status_code == 200
+    wait_for_jobs(app)
@@ -1,10 +1,17 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import axios from 'axios';
 import './App.css';
 
 // API地址：优先使用环境变量，否则使用生产环境地址
 const API_BASE = process.env.REACT_APP_API_URL || 'https://ontology-label-rawu7rpj9-yangs-projects-51d59773.vercel.app/api';
 
+// 无法使用变更推送时轮询变更接口的间隔（毫秒）
+const CHANGE_POLL_MS = 5000;
+
+// 核对人名称保存在浏览器本地，提交核对和领取时作为 judged_by，服务端据此区分不同核对人
+const REVIEWER_KEY = 'reviewer';
+const DEFAULT_REVIEWER = 'user1';
+
 // Toast通知组件
 function Toast({ toasts, removeToast }) {
   return (
@@ -25,7 +32,6 @@ function Toast({ toasts, removeToast }) {
 function IntentRow({ intent, onReview, onPass, getCategoryClass, getStatusClass }) {
   const [editData, setEditData] = useState({
     judgement: intent.judgement || '',
-    judged_by: intent.judged_by || 'user1',
     modified_content: intent.modified_content || ''
   });
   const [isEditing, setIsEditing] = useState(false);
@@ -35,7 +41,6 @@ function IntentRow({ intent, onReview, onPass, getCategoryClass, getStatusClass
   useEffect(() => {
     setEditData({
       judgement: intent.judgement || '',
-      judged_by: intent.judged_by || 'user1',
       modified_content: intent.modified_content || ''
     });
     setShowModifyInput(intent.judgement === '需修改');
@@ -52,14 +57,13 @@ function IntentRow({ intent, onReview, onPass, getCategoryClass, getStatusClass
       alert('请选择核对结果');
       return;
     }
-    onReview(intent.id, editData);
+    onReview(intent, editData);
     setIsEditing(false);
   };
 
   const handleCancel = () => {
     setEditData({
       judgement: intent.judgement || '',
-      judged_by: intent.judged_by || 'user1',
       modified_content: intent.modified_content || ''
     });
     setShowModifyInput(intent.judgement === '需修改');
@@ -167,6 +171,13 @@ function App() {
   const [toasts, setToasts] = useState([]);
   const [dragOver, setDragOver] = useState(false);
   const [jumpPage, setJumpPage] = useState('');
+  const [reviewer, setReviewer] = useState(() => localStorage.getItem(REVIEWER_KEY) || DEFAULT_REVIEWER);
+
+  const saveReviewer = () => {
+    const name = reviewer.trim() || DEFAULT_REVIEWER;
+    setReviewer(name);
+    localStorage.setItem(REVIEWER_KEY, name);
+  };
 
   // Toast提示
   const showToast = useCallback((message, type = 'info') => {
@@ -259,6 +270,84 @@ function App() {
     }
   }, [selectedFile]); // eslint-disable-line react-hooks/exhaustive-deps
 
+  // 变更推送要求重新加载时使用最新的加载函数
+  const reloadRef = useRef(null);
+  reloadRef.current = () => {
+    fetchFiles();
+    fetchIntents(pagination.current_page);
+  };
+
+  // 根据变更接口返回的数据更新本地的文件列表和当前页意图，不重新拉取整页
+  const applyChanges = useCallback((data) => {
+    if (data.reset) {
+      reloadRef.current();
+      return;
+    }
+    if (data.files.length || data.deleted_files.length) {
+      const updated = new Map(data.files.map(f => [f.id, f]));
+      const deleted = new Set(data.deleted_files);
+      setFiles(prev => {
+        const known = new Set(prev.map(f => f.id));
+        const added = data.files.filter(f => !known.has(f.id) && f.step_type === selectedStep);
+        return [...added, ...prev.filter(f => !deleted.has(f.id)).map(f => updated.get(f.id) || f)];
+      });
+      setSelectedFile(prev => (prev && deleted.has(prev.id) ? null : (prev && updated.get(prev.id)) || prev));
+      setIntents(prev => prev.filter(i => !deleted.has(i.file_id)));
+    }
+    if (data.intents.length) {
+      const updated = new Map(data.intents.map(i => [i.id, i]));
+      setIntents(prev => prev.map(i => updated.get(i.id) || i));
+    }
+  }, [selectedStep]);
+
+  // 订阅当前文件的变更推送，其他人的核对结果和文件进度直接更新到本地（断开后浏览器自动重连并续传）。
+  // 推送连接已满（503）或浏览器不支持时改为定时轮询变更接口
+  const selectedFileId = selectedFile?.id;
+  useEffect(() => {
+    if (!selectedFileId) return undefined;
+    let source = null;
+    let timer = null;
+    let since = null;
+    let stopped = false;
+
+    const poll = () => {
+      timer = null;
+      axios.get(`${API_BASE}/changes`, { params: { since, file_id: selectedFileId } })
+        .then(res => {
+          if (stopped || !res.data.success) return false;
+          if (since !== null) applyChanges(res.data.data);
+          since = res.data.data.next;
+          return res.data.data.has_more;
+        })
+        .catch(err => {
+          console.error('获取变更失败:', err);
+          return false;
+        })
+        .then(hasMore => {
+          if (!stopped) timer = setTimeout(poll, hasMore ? 0 : CHANGE_POLL_MS);
+        });
+    };
+
+    if (typeof EventSource === 'undefined') {
+      poll();
+    } else {
+      source = new EventSource(`${API_BASE}/changes/stream?file_id=${selectedFileId}`);
+      source.addEventListener('changes', (e) => {
+        since = Number(e.lastEventId);
+        applyChanges(JSON.parse(e.data));
+      });
+      source.onerror = () => {
+        // 连接被拒绝时浏览器不再重连，其他错误由浏览器自动重连
+        if (source.readyState === EventSource.CLOSED && !stopped) poll();
+      };
+    }
+    return () => {
+      stopped = true;
+      if (source) source.close();
+      clearTimeout(timer);
+    };
+  }, [applyChanges, selectedFileId]);
+
   // 文件上传处理
   const handleFileUpload = async (file) => {
     if (!file) return;
@@ -317,17 +406,31 @@ function App() {
     }
   };
 
-  // 行内核对提交
-  const handleInlineReview = async (intentId, formData) => {
+  // 意图已被其他人修改或领取（409）时显示原因并更新为当前内容
+  const handleReviewError = (err, fallback) => {
+    if (err.response?.status === 409) {
+      showToast(err.response.data.message, 'error');
+      applyChanges({ files: [], deleted_files: [], intents: [err.response.data.data] });
+    } else {
+      showToast(fallback, 'error');
+    }
+  };
+
+  // 行内核对提交：带上读取时的版本号，意图在此期间被其他人修改时服务端返回409而不是覆盖
+  const handleInlineReview = async (intent, formData) => {
     try {
-      const res = await axios.post(`${API_BASE}/intents/${intentId}/review`, formData);
+      const res = await axios.post(`${API_BASE}/intents/${intent.id}/review`, {
+        ...formData,
+        judged_by: reviewer,
+        version: intent.version
+      });
       if (res.data.success) {
         showToast('核对成功', 'success');
-        fetchIntents(pagination.current_page);
-        fetchFiles();
+        // 文件进度由变更推送更新
+        applyChanges({ files: [], deleted_files: [], intents: [res.data.data] });
       }
     } catch (err) {
-      showToast('核对失败', 'error');
+      handleReviewError(err, '核对失败');
     }
   };
 
@@ -335,15 +438,15 @@ function App() {
   const handlePassIntent = async (intent) => {
     try {
       const res = await axios.post(`${API_BASE}/intents/${intent.id}/pass`, {
-        judged_by: 'user1'
+        judged_by: reviewer,
+        version: intent.version
       });
       if (res.data.success) {
         showToast('已标记为通过', 'success');
-        fetchIntents(pagination.current_page);
-        fetchFiles();
+        applyChanges({ files: [], deleted_files: [], intents: [res.data.data] });
       }
     } catch (err) {
-      showToast('操作失败', 'error');
+      handleReviewError(err, '操作失败');
     }
   };
 
@@ -423,8 +526,15 @@ function App() {
         
         <div className="header-right">
           <div className="user-info">
-            <div className="user-avatar">U1</div>
-            <span>user1</span>
+            <div className="user-avatar">{reviewer.slice(0, 2).toUpperCase()}</div>
+            <input
+              className="reviewer-input"
+              value={reviewer}
+              onChange={(e) => setReviewer(e.target.value)}
+              onBlur={saveReviewer}
+              placeholder="核对人"
+              title="核对人名称，用于区分领取和核对记录"
+            />
           </div>
         </div>
       </header>